@@ -0,0 +1,308 @@
+import asyncio
+import os
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Union
+
+import httpx
+import logfire
+from dotenv import load_dotenv
+from pydantic_ai import Agent
+from pydantic_ai.models.openai import OpenAIModel
+
+from utils.oai_client import get_client
+from utils.executors import (
+    DependencyCache, DockerContainerPool, ExecutionProfile, ExecutionResultCache, LocalKernelCodeExecutor,
+    VenvTemplate, close_docker_client
+)
+from utils.prompt_cache_stats import PromptCacheStats
+from utils.prompts import CHAT_HISTORY_SUMMARY_PROMPT
+from utils.markdown_browser import BingMarkdownSearch, DocumentCache, HttpCache, MarkdownConverter
+from agents.file_surfer import FileSurfer, FileToolDependencies
+from agents.web_surfer import WebSurfer
+from agents.coder_agent import (
+    CoderAgent, CoderDependencies, Executor, ExecutorDependencies,
+    DockerCodeExecutor, LocalCodeExecutor, CoderResult, coder_system_message
+)
+from agents.rag_agent import RAGAgent, RAGDependencies
+from orchestrator_agents import OrchestratorAgents
+
+load_dotenv()
+
+CODER_DESCRIPTION = "A helpful and general-purpose AI assistant that has strong language skills, Python skills, and Linux command line skills."
+EXECUTOR_SYSTEM_MESSAGE = "A computer terminal that performs no other action than running Python scripts or sh shell scripts. Always call the execute_code tool to execute the code and output the result."
+# The RAG agent description changes with the ingested data, so a few prompt variants are kept
+MAX_CACHED_ORCHESTRATOR_AGENTS = 4
+
+class RegistryInitializationError(Exception):
+    """Raised when the agent registry cannot be built"""
+    pass
+
+class AgentRegistry:
+    """Long-lived agents and tools shared by every orchestration task.
+
+    Everything held here is built once per process and must not carry
+    per-task state. Chat histories, stream outputs, browser positions and
+    code executors are created per task by the orchestrator.
+    """
+
+    def __init__(
+        self,
+        model: OpenAIModel,
+        file_surfer: FileSurfer,
+        coder_agent: CoderAgent,
+        executor_agent: Executor,
+        web_surfer: WebSurfer,
+        rag_agent: RAGAgent,
+        coder_deps: CoderDependencies,
+        container_pool: Optional[DockerContainerPool] = None,
+        dependency_cache: Optional[DependencyCache] = None,
+        venv_template: Optional[VenvTemplate] = None,
+        execution_profile: Optional[ExecutionProfile] = None,
+        result_cache: Optional[ExecutionResultCache] = None,
+        http_cache: Optional[HttpCache] = None,
+        document_cache: Optional[DocumentCache] = None,
+    ):
+        self.model = model
+        self.file_surfer = file_surfer
+        self.coder_agent = coder_agent
+        self.executor_agent = executor_agent
+        self.web_surfer = web_surfer
+        self.rag_agent = rag_agent
+        self.coder_deps = coder_deps
+        self.container_pool = container_pool
+        self.dependency_cache = dependency_cache
+        self.venv_template = venv_template
+        self._venv_template_task: Optional[asyncio.Task] = None
+        self.execution_profile = execution_profile
+        self.result_cache = result_cache
+        self.http_cache = http_cache
+        self.document_cache = document_cache
+        self.agents: List[Union[FileSurfer, CoderAgent, Executor, WebSurfer, RAGAgent]] = [
+            file_surfer, coder_agent, executor_agent, web_surfer, rag_agent
+        ]
+        self.prompt_cache_stats = PromptCacheStats()
+        # Folds older turns of the orchestrator chat histories into a rolling summary
+        self.history_summarizer = Agent(
+            model=model,
+            name="History Summarizer",
+            system_prompt=CHAT_HISTORY_SUMMARY_PROMPT
+        )
+        self._orchestrator_agents: "OrderedDict[str, OrchestratorAgents]" = OrderedDict()
+        self._orchestrator_agents_lock = threading.Lock()
+
+    @classmethod
+    def build(cls) -> "AgentRegistry":
+        """Build the model, agents and shared tools"""
+        try:
+            logfire.configure(
+                send_to_logfire='if-token-present',
+                token=os.getenv("LOGFIRE_TOKEN"),
+                scrubbing=False,
+            )
+            logfire.info("Building agent registry")
+
+            model = OpenAIModel(
+                model_name=os.environ.get("AGENTIC_BENCH_MODEL_NAME", "gpt-4o"),
+                openai_client=get_client()
+            )
+
+            # Pages fetched by any task are reused by the others
+            http_cache = None
+            if os.getenv("AGENTIC_BENCH_BROWSER_HTTP_CACHE", "true").lower() == "true":
+                http_cache = HttpCache.from_env()
+            # Conversions of files reopened by any task, keyed on their content
+            document_cache = None
+            if os.getenv("AGENTIC_BENCH_DOCUMENT_CACHE", "true").lower() == "true":
+                document_cache = DocumentCache.from_env()
+
+            # File Surfer shares one search engine, converter, HTTP connection pool,
+            # conversion worker pool and HTTP cache across all task browsers
+            file_surfer = FileSurfer(
+                agent=Agent(
+                    model=model,
+                    name="File Surfer Agent",
+                    deps_type=FileToolDependencies,
+                ),
+                viewport_size=1024 * 5,
+                downloads_folder="coding",
+                search_engine=BingMarkdownSearch(),
+                markdown_converter=MarkdownConverter(document_cache=document_cache),
+                http_client=httpx.AsyncClient(
+                    follow_redirects=True,
+                    timeout=float(os.getenv("AGENTIC_BENCH_BROWSER_TIMEOUT", "30")),
+                    limits=httpx.Limits(
+                        max_connections=int(os.getenv("AGENTIC_BENCH_BROWSER_MAX_CONNECTIONS", "20"))
+                    ),
+                ),
+                conversion_executor=ThreadPoolExecutor(
+                    max_workers=int(os.getenv("AGENTIC_BENCH_BROWSER_CONVERSION_WORKERS", "4")),
+                    thread_name_prefix="markdown-conversion",
+                ),
+                http_cache=http_cache,
+            )
+
+            coder_deps = CoderDependencies(
+                description=CODER_DESCRIPTION,
+                system_messages=coder_system_message,
+                request_terminate=False
+            )
+            coder_agent = CoderAgent(
+                agent=Agent(
+                    model=model,
+                    name="Coder Agent",
+                    deps_type=CoderDependencies,
+                    result_type=CoderResult
+                ),
+                system_prompt=coder_system_message
+            )
+
+            executor_agent = Executor(
+                agent=Agent(
+                    model=model,
+                    name="Executor Agent",
+                    deps_type=ExecutorDependencies,
+                ),
+                system_prompt=EXECUTOR_SYSTEM_MESSAGE
+            )
+
+            web_surfer = WebSurfer(api_url="http://localhost:8000/execute_task")
+
+            rag_agent = RAGAgent(
+                agent=Agent(
+                    model=model,
+                    name="RAG Agent",
+                    deps_type=RAGDependencies
+                )
+            )
+
+            # Warm sandbox containers are only kept when code runs in Docker
+            dependency_cache = None
+            if os.getenv("AGENTIC_BENCH_DEPENDENCY_CACHE", "true").lower() == "true":
+                dependency_cache = DependencyCache.from_env()
+
+            container_pool = None
+            if os.environ.get("AGENTIC_BENCH_EXECUTOR") == "Docker" and int(os.getenv("AGENTIC_BENCH_DOCKER_POOL_SIZE", "2")) > 0:
+                container_pool = DockerContainerPool.from_env(dependency_cache=dependency_cache)
+
+            venv_template = None
+            if os.environ.get("AGENTIC_BENCH_EXECUTOR") == "Local" and os.getenv("AGENTIC_BENCH_VENV_TEMPLATE", "true").lower() == "true":
+                venv_template = VenvTemplate.from_env()
+
+            execution_profile = None
+            if os.getenv("AGENTIC_BENCH_EXECUTOR_RESOURCE_LIMITS", "true").lower() == "true":
+                execution_profile = ExecutionProfile.from_env()
+
+            result_cache = None
+            if os.getenv("AGENTIC_BENCH_RESULT_CACHE", "false").lower() == "true":
+                result_cache = ExecutionResultCache.from_env()
+
+            registry = cls(
+                model=model,
+                file_surfer=file_surfer,
+                coder_agent=coder_agent,
+                executor_agent=executor_agent,
+                web_surfer=web_surfer,
+                rag_agent=rag_agent,
+                coder_deps=coder_deps,
+                container_pool=container_pool,
+                dependency_cache=dependency_cache,
+                venv_template=venv_template,
+                execution_profile=execution_profile,
+                result_cache=result_cache,
+                http_cache=http_cache,
+                document_cache=document_cache,
+            )
+            logfire.info(f"Agent registry ready with agents: {[agent.name for agent in registry.agents]}")
+            return registry
+
+        except Exception as e:
+            error_msg = f"Failed to build agent registry: {str(e)}\n{traceback.format_exc()}"
+            logfire.error(error_msg)
+            raise RegistryInitializationError(error_msg)
+
+    def agent_descriptions(self) -> str:
+        return "\n".join(f"Name: {agent.name}\nDescription: {agent.description}\n" for agent in self.agents)
+
+    def get_orchestrator_agents(self) -> OrchestratorAgents:
+        """Return the planner, selector and critique agents for the current agent descriptions"""
+        agent_descriptions = self.agent_descriptions()
+        with self._orchestrator_agents_lock:
+            orchestrator_agents = self._orchestrator_agents.get(agent_descriptions)
+            if orchestrator_agents is None:
+                orchestrator_agents = OrchestratorAgents(self.model, agent_descriptions)
+                self._orchestrator_agents[agent_descriptions] = orchestrator_agents
+                if len(self._orchestrator_agents) > MAX_CACHED_ORCHESTRATOR_AGENTS:
+                    self._orchestrator_agents.popitem(last=False)
+            else:
+                self._orchestrator_agents.move_to_end(agent_descriptions)
+            return orchestrator_agents
+
+    def create_executor_deps(self) -> Optional[ExecutorDependencies]:
+        """Create the per-task executor dependencies, including a fresh code executor"""
+        executor_type = os.environ.get("AGENTIC_BENCH_EXECUTOR")
+        logfire.info(f"Executor type from env : {executor_type}")
+        if not executor_type or executor_type not in os.environ.get("AGENTIC_BENCH_SUPPORTED_EXECUTORS", ""):
+            return None
+
+        if executor_type == "Docker":
+            executor = DockerCodeExecutor(container_pool=self.container_pool, dependency_cache=self.dependency_cache)
+        else:
+            # The kernel executor keeps a Python interpreter, and its state, for the whole task
+            kernel_mode = os.getenv("AGENTIC_BENCH_EXECUTOR_KERNEL", "false").lower() == "true"
+            executor_class = LocalKernelCodeExecutor if kernel_mode else LocalCodeExecutor
+            executor = executor_class(
+                dependency_cache=self.dependency_cache,
+                venv_template=self.venv_template,
+                execution_profile=self.execution_profile,
+            )
+        return ExecutorDependencies(
+            executor=executor,
+            confirm_execution="ACCEPT_ALL",
+            description="Executor to execute the generated code",
+            system_message=EXECUTOR_SYSTEM_MESSAGE,
+            content=None,
+            check_last_n_message=5,
+            result_cache=self.result_cache
+        )
+
+    async def release_executor_deps(self, executor_deps: Optional[ExecutorDependencies]) -> None:
+        """Stop the task's code executor, handing leased containers and dependency environments back"""
+        if executor_deps is not None and isinstance(executor_deps.executor, (DockerCodeExecutor, LocalCodeExecutor)):
+            await executor_deps.executor.stop()
+
+    async def start(self) -> None:
+        """Start the background resources, such as warming the container pool"""
+        if self.container_pool is not None:
+            await self.container_pool.start()
+        if self.venv_template is not None:
+            # Built in the background, the first task needing it waits for it
+            self._venv_template_task = asyncio.create_task(self._build_venv_template())
+
+    async def _build_venv_template(self) -> None:
+        try:
+            await self.venv_template.ensure()
+        except Exception as e:
+            logfire.error(f"Failed to build the venv template: {str(e)}")
+
+    async def close(self) -> None:
+        if self._venv_template_task is not None:
+            self._venv_template_task.cancel()
+        if self.container_pool is not None:
+            await self.container_pool.close()
+        close_docker_client()
+        await self.file_surfer.close()
+
+_registry: Optional[AgentRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_agent_registry() -> AgentRegistry:
+    """Return the process-wide agent registry, building it on first use"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = AgentRegistry.build()
+    return _registry
@@ -1,14 +1,13 @@
 import asyncio
-from dataclasses import dataclass,asdict
+from dataclasses import dataclass
 from dotenv import load_dotenv
 import logfire
 import os
 import re
-import json
 import time
 from pydantic import Field, BaseModel
 from pydantic_ai import Agent, RunContext
-from pydantic_ai.messages import ModelMessage
+from pydantic_ai.messages import ModelMessage, ModelRequest, ModelResponse, TextPart, UserPromptPart
 from pydantic_ai.models.openai import OpenAIModel
 from fastapi import WebSocket
 from pydantic_ai.tools import AgentDeps
@@ -19,6 +18,7 @@ from utils.stream_response_format import StreamResponse
 from utils import CancellationToken
 from utils.executors.executor_utils import CodeBlock
 from utils.executors import LocalCommandLineCodeExecutor as LocalCodeExecutor
+from utils.executors import ExecutionResultCache
 from utils.executors import DockerCommandLineCodeExecutor as DockerCodeExecutor
 from utils.executors.executor_utils._base import CodeExecutor
 from utils.oai_client import get_client
@@ -53,6 +53,29 @@ class CoderResult(BaseModel):
         description="All the packages name that has to be installed before the code execution"
     )
     content: str = Field(description="Response content in the form of code")
+    deterministic: bool = Field(
+        default=False,
+        description="Whether the code is a pure computation whose output only depends on the code and its input: "
+        "it does not read or write files, use the network, the current time or unseeded randomness"
+    )
+
+def render_coder_result(result: CoderResult) -> str:
+    """Render a coder result as the text handed to the other agents"""
+    return f"terminated={result.terminated} dependencies={result.dependencies} content='{result.content}'"
+
+# Code reading command line arguments or user input needs the Executor agent to supply them
+_RUNTIME_INPUT_PATTERNS = {
+    "python": re.compile(r"\binput\s*\(|\bsys\.argv\b|\bsys\.stdin\b|\bargparse\b|\bgetpass\s*\(|\bimport click\b|\bfrom click\b"),
+    "sh": re.compile(r"\$[1-9@*#]|\$\{[1-9@*#]|\bread\s"),
+}
+
+def requires_runtime_input(language: str, code: str) -> bool:
+    """Whether the code may read command line arguments or input when run"""
+    pattern = _RUNTIME_INPUT_PATTERNS.get(language)
+    if pattern is None:
+        # Unknown languages always go through the Executor agent
+        return True
+    return pattern.search(code) is not None
 
 class ExecutorDependencies(BaseModel):
     executor: CodeExecutor
@@ -62,7 +85,13 @@ class ExecutorDependencies(BaseModel):
     description: str
     system_message: str
     check_last_n_message: int
+    # CoderResult with the code to execute
     content: Any
+    websocket: Optional[WebSocket] = None
+    stream_output: Optional[StreamResponse] = None
+    cancellation_token: Optional[CancellationToken] = None
+    # Shared cache of the results of deterministic code blocks, None when disabled
+    result_cache: Optional[ExecutionResultCache] = None
 
     class Config:
         arbitrary_types_allowed = True
@@ -80,8 +109,6 @@ class CoderAgent:
             self.name = "Coder Agent"
             self.description = "An agent that can write code and has strong Python and Linux command line skills."
             self._system_prompt = system_prompt
-            self.websocket:Optional[WebSocket]=None
-            self.stream_output: Optional[StreamResponse] = None
             self.add_system_message()
         except Exception as e:
             logfire.error(f"Failed to initialize CoderAgent: {e}")
@@ -93,11 +120,12 @@ class CoderAgent:
             # Use raw string to prevent escape character issues
             return self._system_prompt
 
-    async def is_python_code(self,content):
+    async def is_python_code(self, content, websocket: Optional[WebSocket] = None, stream_output: Optional[StreamResponse] = None):
         try:
-            if self.stream_output and self.websocket:
-                self.stream_output.steps.append("Verifying if the code is a python based code")
-                await self.websocket.send_text(json.dumps(asdict(self.stream_output)))
+            if stream_output and websocket:
+                await stream_output.add_step(
+                    websocket, "Verifying if the code is a python based code"
+                )
             tokens = tokenize.generate_tokens(StringIO(content).readline)
             for _ in tokens:
                 pass  # Simply iterate through the tokens
@@ -105,14 +133,16 @@ class CoderAgent:
         except tokenize.TokenError:
             return False
     
-    async def ensure_code_block_format(self, code_content: str) -> str:
+    async def ensure_code_block_format(
+        self, code_content: str, websocket: Optional[WebSocket] = None, stream_output: Optional[StreamResponse] = None
+    ) -> str:
         """Ensure code is properly wrapped in markdown code block markers"""
         # Remove existing markers if present
         if("```python" in code_content):
             return code_content
 
         # Check if it's a proper Python code (has imports or typical Python syntax)
-        if await self.is_python_code(code_content):
+        if await self.is_python_code(code_content, websocket, stream_output):
             return f"```python\n{code_content}\n```"
         return code_content
 
@@ -121,41 +151,38 @@ class CoderAgent:
                     stream_output:StreamResponse
     ) -> Tuple[bool, str, List[ModelMessage]]:
         """Generate reply from the coder agent"""
+        success, _, response, messages = await self.generate_code(user_message, deps, websocket, stream_output)
+        return success, response, messages
+
+    async def generate_code(
+        self, user_message: str, deps: CoderDependencies, websocket: WebSocket,
+                    stream_output: StreamResponse
+    ) -> Tuple[bool, Optional[CoderResult], str, List[ModelMessage]]:
+        """Generate code, returning the typed result along with its rendered text"""
         try:
-            self.websocket = websocket
-            self.stream_output = stream_output
             print(f"\nInside generate reply message (Coder Agent)")
             print(f"User message: {user_message}")
             print(f"Dependencies: {deps}\n")
-            if self.stream_output and self.websocket:
-                self.stream_output.steps.append("Generating the code...")
-                await self.websocket.send_text(json.dumps(asdict(self.stream_output)))
+            if stream_output and websocket:
+                await stream_output.add_step(websocket, "Generating the code...")
             result = await self._agent.run(user_message, deps=deps)
             if hasattr(result, "data"):
+                if stream_output and websocket:
+                    await stream_output.add_step(
+                        websocket, "Ensuring code is properly formatted"
+                    )
+
                 # Ensure code is properly formatted
-                content = (
-                    str(result.data.content)
-                    if hasattr(result.data, "content")
-                    else str(result.data)
+                coder_result = result.data.model_copy(
+                    update={"content": await self.ensure_code_block_format(result.data.content, websocket, stream_output)}
                 )
-                if self.stream_output and self.websocket:
-                    self.stream_output.steps.append("Ensuring code is properly formatted")
-                    await self.websocket.send_text(json.dumps(asdict(self.stream_output)))
-                
-                formatted_content = await self.ensure_code_block_format(content)
-
-                # Build properly formatted response
-                response = f"terminated={getattr(result.data, 'terminated', True)} "
-                response += f"dependencies={getattr(result.data, 'dependencies', [])} "
-                response += f"content='{formatted_content}'"
-
-                return True, response, result.all_messages()
+                return True, coder_result, render_coder_result(coder_result), result.all_messages()
             else:
-                return False, "No data in result", []
+                return False, None, "No data in result", []
 
         except Exception as e:
             logfire.error(f"Failed to generate coder reply: {e}")
-            return False, str(e), []
+            return False, None, str(e), []
 
 class Executor:
     def __init__(
@@ -166,8 +193,8 @@ class Executor:
             self._system_prompt = system_prompt
             self.name = "Executor Agent"
             self.description = "A computer terminal that performs no other action than running Python scripts or sh shell scripts"
-            self.websocket:Optional[WebSocket]=None
-            self.stream_output: Optional[StreamResponse] = None
+            # Run code that needs no arguments or input without the Executor LLM call
+            self.direct_execution = os.getenv("AGENTIC_BENCH_EXECUTOR_DIRECT_EXECUTION", "true").lower() == "true"
             self.add_system_message()
             self.register_tool()
         except Exception as e:
@@ -186,62 +213,93 @@ class Executor:
             """Executes the code and returns the result. Takes in a list of human input or command line arguments."""
             try:
                 print("human_input_or_command_line_args", human_input_or_command_line_args)
-                # Now content is directly the dict we need
-                response_block = ctx.deps.content
-                print()
-                print(f"Response block inside execute code: {response_block}")
-                print()
-                code = self.extract_execution_request(response_block["content"])
-                print()
-                print(f"Code block inside execute code: {code}")
-                print()
-                if code is not None:
-                    code_lang = code[0]
-                    code_block = code[1]
-                    if code_lang == "py":
-                        code_lang = "python"
-
-                    execution_requests = [
-                        CodeBlock(
-                            code=code_block,
-                            packages=response_block["dependencies"],
-                            language=code_lang,
-                            human_input_or_command_line_args=human_input_or_command_line_args if human_input_or_command_line_args else ""
-                        )
-                    ]
-
-                    if (
-                        ctx.deps.confirm_execution == "ACCEPT_ALL"
-                        or await ctx.deps.confirm_execution(execution_requests[0])
-                    ):
-                        result = await ctx.deps.executor.execute_code_blocks(
-                            execution_requests,self.websocket,self.stream_output, cancellation_token=CancellationToken()
-                        )
-
-                        if result.output.strip() == "":
-                            return (
-                                False,
-                                f"The script ran but produced no output to console. The Unix exit code was: {result.exit_code}. If you were expecting output, consider revising the script to ensure content is printed to stdout.",
-                            )
-                        else:
-                            return (
-                                True,
-                                f"The script ran, then exited with Unix exit code: {result.exit_code}\nIts output was:\n{result.output}",
-                            )
-                    else:
-                        return (
-                            False,
-                            "The code block was not confirmed by the user and so was not run.",
-                        )
-                return (
-                    False,
-                    "No code block detected in the content. Please provide a markdown-encoded code block to execute for the original task.",
-                )
+                return await self.run_code(ctx.deps, human_input_or_command_line_args)
 
             except Exception as e:
                 print(f"Error details: {str(e)}")
                 raise e
 
+    def _code_block(self, code_result: CoderResult, human_input_or_command_line_args: Any = "") -> Optional[CodeBlock]:
+        code = self.extract_execution_request(code_result.content)
+        if code is None:
+            return None
+        code_lang, code_block = code
+        logfire.debug(f"Code block to execute ({code_lang}): {code_block}")
+        if code_lang == "py":
+            code_lang = "python"
+        return CodeBlock(
+            code=code_block,
+            packages=code_result.dependencies,
+            language=code_lang,
+            human_input_or_command_line_args=human_input_or_command_line_args if human_input_or_command_line_args else "",
+            deterministic=code_result.deterministic
+        )
+
+    async def run_code(
+        self, deps: ExecutorDependencies, human_input_or_command_line_args: Any = "", code_block: Optional[CodeBlock] = None
+    ) -> Tuple[bool, str]:
+        """Execute the code of the coder result in deps.content, or `code_block` if it was already extracted"""
+        if code_block is None and isinstance(deps.content, CoderResult):
+            code_block = self._code_block(deps.content, human_input_or_command_line_args)
+        if code_block is None:
+            return (
+                False,
+                "No code block detected in the content. Please provide a markdown-encoded code block to execute for the original task.",
+            )
+
+        if not (
+            deps.confirm_execution == "ACCEPT_ALL"
+            or await deps.confirm_execution(code_block)
+        ):
+            return (
+                False,
+                "The code block was not confirmed by the user and so was not run.",
+            )
+
+        cache_key = None
+        result = None
+        scope = getattr(deps.executor, "result_cache_scope", None)
+        if deps.result_cache is not None and code_block.deterministic and scope is not None:
+            cache_key = deps.result_cache.key(code_block, scope)
+            result = deps.result_cache.get(cache_key)
+        if result is not None:
+            logfire.info("Reusing the cached result of an identical code block")
+            if deps.stream_output and deps.websocket:
+                await deps.stream_output.add_step(
+                    deps.websocket, "Reused the result of an earlier run of the same code"
+                )
+        else:
+            result = await deps.executor.execute_code_blocks(
+                [code_block], deps.websocket, deps.stream_output,
+                cancellation_token=deps.cancellation_token or CancellationToken()
+            )
+            if cache_key is not None:
+                deps.result_cache.put(cache_key, result)
+        if getattr(result, "wall_time", None) is not None:
+            logfire.info(
+                f"Code execution used wall time {result.wall_time:.2f}s, CPU time {result.cpu_time}s, "
+                f"peak RSS {result.peak_rss_bytes} bytes"
+            )
+
+        if result.output.strip() == "":
+            return (
+                False,
+                f"The script ran but produced no output to console. The Unix exit code was: {result.exit_code}. If you were expecting output, consider revising the script to ensure content is printed to stdout.",
+            )
+        return (
+            True,
+            f"The script ran, then exited with Unix exit code: {result.exit_code}\nIts output was:\n{result.output}",
+        )
+
+    def direct_code_block(self, deps: ExecutorDependencies) -> Optional[CodeBlock]:
+        """The code block to run, if it can run without the LLM choosing its arguments or input"""
+        if not isinstance(deps.content, CoderResult):
+            return None
+        code_block = self._code_block(deps.content)
+        if code_block is None or requires_runtime_input(code_block.language, code_block.code):
+            return None
+        return code_block
+
     def extract_execution_request(
         self, markdown_text: str
     ) -> Union[Tuple[str, str], None]:
@@ -254,8 +312,19 @@ class Executor:
     async def generate_reply(
         self, user_message: str, deps: ExecutorDependencies,websocket: WebSocket, stream_output: StreamResponse) -> Tuple[bool, str, List[ModelMessage]]:
         try:
-            self.websocket = websocket
-            self.stream_output = stream_output
+            deps.websocket = websocket
+            deps.stream_output = stream_output
+            code_block = self.direct_code_block(deps) if self.direct_execution else None
+            if code_block is not None:
+                # Nothing for the LLM to decide, so skip its round trip and run the code as is
+                logfire.info("Executing the code directly, without the Executor agent")
+                _, response = await self.run_code(deps, code_block=code_block)
+                messages: List[ModelMessage] = [
+                    ModelRequest(parts=[UserPromptPart(content=user_message)]),
+                    ModelResponse(parts=[TextPart(content=response)]),
+                ]
+                return True, response, messages
+
             result = await self._agent.run(user_message, deps=deps)
             print(
                 f"Executor result (Inside executor agent generate reply): {result.data}"
@@ -300,10 +369,12 @@ if __name__ == "__main__":
         ),
     )
     coder_agent = CoderAgent(agent=agent, system_prompt=system_message)
-    coder_result = asyncio.run(
-        coder_agent.generate_reply(
+    _, coder_result, _, _ = asyncio.run(
+        coder_agent.generate_code(
             "Write a python program to create an api with fastapi which takes a number as input in arguments and returns its square.",
             deps=coder_deps,
+            websocket=None,
+            stream_output=None,
         )
     )
     # print(coder_result)
@@ -328,6 +399,6 @@ if __name__ == "__main__":
     )
     executor_agent = Executor(agent=agent, system_prompt=executor_system_message)  # type: ignore
     executor_result = asyncio.run(
-        executor_agent.generate_reply("Execute the code", deps=executor_deps)
+        executor_agent.generate_reply("Execute the code", deps=executor_deps, websocket=None, stream_output=None)
     )
     print(executor_result)
@@ -1,14 +1,21 @@
-import json
 import os
 import time
 import logfire
 import asyncio
 import logging
+from concurrent.futures import Executor as ConversionExecutor, ThreadPoolExecutor
 from typing import List, Optional, Tuple, Dict, Any
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from functools import wraps
+import httpx
 from utils.oai_client import get_client
-from utils.markdown_browser import RequestsMarkdownBrowser
+from utils.markdown_browser import (
+    AbstractMarkdownSearch,
+    AsyncRequestsMarkdownBrowser,
+    BingMarkdownSearch,
+    HttpCache,
+    MarkdownConverter,
+)
 from pydantic_ai import Agent, RunContext
 from pydantic_ai.messages import (
     SystemPromptPart,
@@ -19,7 +26,6 @@ from pydantic_ai.messages import (
 )
 from pydantic_ai.models.openai import OpenAIModel
 from fastapi import WebSocket
-from dataclasses import asdict
 from utils.stream_response_format import StreamResponse
 
 from dotenv import load_dotenv
@@ -71,10 +77,16 @@ def error_handler(func):
 
 @dataclass
 class FileToolDependencies:
-    browser: RequestsMarkdownBrowser
+    browser: AsyncRequestsMarkdownBrowser
     websocket: Optional[WebSocket]
     stream_output: Optional[StreamResponse]
 
+@dataclass
+class FileSurferState:
+    """Per-task File Surfer state: the browser position and the agent's chat history"""
+    browser: AsyncRequestsMarkdownBrowser
+    chat_history: List[ModelMessage] = field(default_factory=list)
+
 class FileSurfer:
     """An agent that uses tools to read and navigate local files with robust error handling."""
 
@@ -82,20 +94,32 @@ class FileSurfer:
         self,
         agent: Agent,
         name: str = "File Surfer Agent",
-        browser: Optional[RequestsMarkdownBrowser] = None,
         system_prompt: str = "You are a helpful AI Assistant. When given a user query, use available functions to help the user with their request.",
         viewport_size: int = 1024 * 5,
         downloads_folder: str = "coding",
+        search_engine: Optional[AbstractMarkdownSearch] = None,
+        markdown_converter: Optional[MarkdownConverter] = None,
+        http_client: Optional[httpx.AsyncClient] = None,
+        conversion_executor: Optional[ConversionExecutor] = None,
+        http_cache: Optional[HttpCache] = None,
     ) -> None:
         """
         Initialize FileSurfer with error handling.
 
+        The FileSurfer itself holds no per-task state, so a single instance can
+        serve many tasks. Each task gets its own browser and chat history through
+        `new_state`.
+
         Args:
             agent: The AI agent to use
-            browser: Optional browser instance
             system_prompt: System prompt for the agent
             viewport_size: Size of the viewport
             downloads_folder: Folder for downloads
+            search_engine: Search engine shared by every browser created by `new_state`
+            markdown_converter: Markdown converter shared by every browser created by `new_state`
+            http_client: Pooled HTTP client shared by every browser created by `new_state`
+            conversion_executor: Worker pool running the browsers' page conversions off the event loop
+            http_cache: Cache of fetched pages shared by every browser created by `new_state`, None to always fetch
 
         Raises:
             FileSurferError: If initialization fails
@@ -104,21 +128,41 @@ class FileSurfer:
             self._agent: Agent = agent
             self._name: str = name
             self.description = "An agent that uses tools to read and navigate local files with robust error handling."
-            self._browser: RequestsMarkdownBrowser = browser or RequestsMarkdownBrowser(
-                viewport_size=viewport_size, downloads_folder=downloads_folder
-            )
-            self._chat_history: List[ModelMessage] = []
             self._system_prompt = system_prompt
             self._viewport_size = viewport_size
             self._downloads_folder = downloads_folder
-            self.websocket: Optional[WebSocket] = None
-            self.stream_output: Optional[StreamResponse] = None
+            self._search_engine = search_engine or BingMarkdownSearch()
+            self._markdown_converter = markdown_converter or MarkdownConverter()
+            self._http_client = http_client or httpx.AsyncClient(follow_redirects=True)
+            self._conversion_executor = conversion_executor or ThreadPoolExecutor(
+                thread_name_prefix="markdown-conversion"
+            )
+            self._http_cache = http_cache
             self._register_tools()
             logger.info("FileSurfer initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize FileSurfer: {str(e)}", exc_info=True)
             raise FileSurferError(f"Failed to initialize FileSurfer: {str(e)}")
 
+    def new_state(self) -> FileSurferState:
+        """Create the browser and chat history for a new task"""
+        return FileSurferState(
+            browser=AsyncRequestsMarkdownBrowser(
+                viewport_size=self._viewport_size,
+                downloads_folder=self._downloads_folder,
+                search_engine=self._search_engine,
+                markdown_converter=self._markdown_converter,
+                http_client=self._http_client,
+                conversion_executor=self._conversion_executor,
+                http_cache=self._http_cache,
+            )
+        )
+
+    async def close(self) -> None:
+        """Close the shared HTTP client and conversion workers"""
+        await self._http_client.aclose()
+        self._conversion_executor.shutdown(wait=False, cancel_futures=True)
+
     @property
     def name(self) -> str:
         """Get the agent's name"""
@@ -149,20 +193,14 @@ class FileSurfer:
         ) -> str:
             """Open a local file with error handling"""
             try:
-                ctx.deps.browser.open_local_file(path)
-                header, content = self._get_browser_state()
+                await ctx.deps.browser.open_local_file(path)
+                header, content = self._get_browser_state(ctx.deps.browser)
                 if ctx.deps.stream_output and ctx.deps.websocket:
-                    ctx.deps.stream_output.steps.append(
-                        f"Opening local file: {path} ..."
+                    await ctx.deps.stream_output.add_step(
+                        ctx.deps.websocket, f"Opening local file: {path} ..."
                     )
-                    await ctx.deps.websocket.send_text(
-                        json.dumps(asdict(self.stream_output))
-                    )
-                    ctx.deps.stream_output.steps.append(
-                        f"{header.strip()}"
-                    )
-                    await ctx.deps.websocket.send_text(
-                        json.dumps(asdict(self.stream_output))
+                    await ctx.deps.stream_output.add_step(
+                        ctx.deps.websocket, f"{header.strip()}"
                     )
                 return f"{header.strip()}\n=======================\n{content}"
             except Exception as e:
@@ -177,19 +215,13 @@ class FileSurfer:
             """Scroll viewport up with error handling"""
             try:
                 ctx.deps.browser.page_up()
-                header, content = self._get_browser_state()
+                header, content = self._get_browser_state(ctx.deps.browser)
                 if ctx.deps.stream_output and ctx.deps.websocket:
-                    ctx.deps.stream_output.steps.append(
-                        f"Scrolling up..."
-                    )
-                    await ctx.deps.websocket.send_text(
-                        json.dumps(asdict(self.stream_output))
+                    await ctx.deps.stream_output.add_step(
+                        ctx.deps.websocket, f"Scrolling up..."
                     )
-                    ctx.deps.stream_output.steps.append(
-                        f"{header.strip()}"
-                    )
-                    await ctx.deps.websocket.send_text(
-                        json.dumps(asdict(self.stream_output))
+                    await ctx.deps.stream_output.add_step(
+                        ctx.deps.websocket, f"{header.strip()}"
                     )
                 return f"{header.strip()}\n=======================\n{content}"
             except Exception as e:
@@ -204,19 +236,13 @@ class FileSurfer:
             """Scroll viewport down with error handling"""
             try:
                 ctx.deps.browser.page_down()
-                header, content = self._get_browser_state()
+                header, content = self._get_browser_state(ctx.deps.browser)
                 if ctx.deps.stream_output and ctx.deps.websocket:
-                    ctx.deps.stream_output.steps.append(
-                        f"Scrolling down..."
-                    )
-                    await ctx.deps.websocket.send_text(
-                        json.dumps(asdict(self.stream_output))
-                    )
-                    ctx.deps.stream_output.steps.append(
-                        f"{header.strip()}"
+                    await ctx.deps.stream_output.add_step(
+                        ctx.deps.websocket, f"Scrolling down..."
                     )
-                    await ctx.deps.websocket.send_text(
-                        json.dumps(asdict(self.stream_output))
+                    await ctx.deps.stream_output.add_step(
+                        ctx.deps.websocket, f"{header.strip()}"
                     )
                 return f"{header.strip()}\n=======================\n{content}"
             except Exception as e:
@@ -235,19 +261,13 @@ class FileSurfer:
             """Search on page with error handling"""
             try:
                 ctx.deps.browser.find_on_page(search_string)
-                header, content = self._get_browser_state()
+                header, content = self._get_browser_state(ctx.deps.browser)
                 if ctx.deps.stream_output and ctx.deps.websocket:
-                    ctx.deps.stream_output.steps.append(
-                        f"Searching for '{search_string}'..."
+                    await ctx.deps.stream_output.add_step(
+                        ctx.deps.websocket, f"Searching for '{search_string}'..."
                     )
-                    await ctx.deps.websocket.send_text(
-                        json.dumps(asdict(self.stream_output))
-                    )
-                    ctx.deps.stream_output.steps.append(
-                        f"{header.strip()}"
-                    )
-                    await ctx.deps.websocket.send_text(
-                        json.dumps(asdict(self.stream_output))
+                    await ctx.deps.stream_output.add_step(
+                        ctx.deps.websocket, f"{header.strip()}"
                     )
                 return f"{header.strip()}\n=======================\n{content}"
             except Exception as e:
@@ -265,26 +285,20 @@ class FileSurfer:
             """Find next occurrence with error handling"""
             try:
                 ctx.deps.browser.find_next()
-                header, content = self._get_browser_state()
+                header, content = self._get_browser_state(ctx.deps.browser)
                 if ctx.deps.stream_output and ctx.deps.websocket:
-                    ctx.deps.stream_output.steps.append(
-                        f"Finding next occurence..."
-                    )
-                    await ctx.deps.websocket.send_text(
-                        json.dumps(asdict(self.stream_output))
+                    await ctx.deps.stream_output.add_step(
+                        ctx.deps.websocket, f"Finding next occurence..."
                     )
-                    ctx.deps.stream_output.steps.append(
-                        f"{header.strip()}"
-                    )
-                    await ctx.deps.websocket.send_text(
-                        json.dumps(asdict(self.stream_output))
+                    await ctx.deps.stream_output.add_step(
+                        ctx.deps.websocket, f"{header.strip()}"
                     )
                 return f"{header.strip()}\n=======================\n{content}"
             except Exception as e:
                 logger.error(f"Error finding next occurrence: {str(e)}", exc_info=True)
                 raise NavigationError(f"Failed to find next occurrence: {str(e)}")
 
-    def _get_browser_state(self) -> Tuple[str, str]:
+    def _get_browser_state(self, browser: AsyncRequestsMarkdownBrowser) -> Tuple[str, str]:
         """
         Get browser state with error handling
 
@@ -295,38 +309,35 @@ class FileSurfer:
             BrowserNotInitializedError: If browser is not initialized
         """
         try:
-            if self._browser is None:
-                self._browser = RequestsMarkdownBrowser(
-                    viewport_size=self._viewport_size,
-                    downloads_folder=self._downloads_folder,
-                )
+            if browser is None:
+                raise BrowserNotInitializedError("Browser is not initialized")
 
-            header = self._generate_header()
-            return (header, self._browser.viewport)
+            header = self._generate_header(browser)
+            return (header, browser.viewport)
         except Exception as e:
             logger.error(f"Failed to get browser state: {str(e)}", exc_info=True)
             raise BrowserNotInitializedError(f"Failed to get browser state: {str(e)}")
 
-    def _generate_header(self) -> str:
+    def _generate_header(self, browser: AsyncRequestsMarkdownBrowser) -> str:
         """Generate browser header with error handling"""
         try:
-            header = [f"Address: {self._browser.address}"]
+            header = [f"Address: {browser.address}"]
 
-            if self._browser.page_title:
-                header.append(f"Title: {self._browser.page_title}")
+            if browser.page_title:
+                header.append(f"Title: {browser.page_title}")
 
-            current_page = self._browser.viewport_current_page
-            total_pages = len(self._browser.viewport_pages)
+            current_page = browser.viewport_current_page
+            total_pages = len(browser.viewport_pages)
             header.append(
                 f"Viewport position: Showing page {current_page+1} of {total_pages}."
             )
 
             # Add history information
-            address = self._browser.address
-            for i in range(len(self._browser.history) - 2, -1, -1):
-                if self._browser.history[i][0] == address:
+            address = browser.address
+            for i in range(len(browser.history) - 2, -1, -1):
+                if browser.history[i][0] == address:
                     header.append(
-                        f"You previously visited this page {round(time.time() - self._browser.history[i][1])} seconds ago."
+                        f"You previously visited this page {round(time.time() - browser.history[i][1])} seconds ago."
                     )
                     break
 
@@ -337,13 +348,18 @@ class FileSurfer:
 
     @error_handler
     async def generate_reply(
-        self, user_message: str, websocket: WebSocket, stream_output: StreamResponse
+        self,
+        user_message: str,
+        websocket: WebSocket,
+        stream_output: StreamResponse,
+        state: FileSurferState,
     ) -> Tuple[bool, str, List[ModelMessage]]:
         """
         Generate reply to user message with error handling
 
         Args:
             user_message: User's input message
+            state: The task's browser and chat history, updated in place
 
         Returns:
             Tuple[bool, str]: Success status and response
@@ -352,27 +368,20 @@ class FileSurfer:
             FileSurferError: If reply generation fails
         """
         try:
-            self.websocket = websocket
-            self.stream_output = stream_output
-        
-            if self._browser is None:
-                self._browser = RequestsMarkdownBrowser(
-                    viewport_size=self._viewport_size,
-                    downloads_folder=self._downloads_folder,
-                )
+            browser = state.browser
 
             context_message = UserPromptPart(
-                content=f"Your browser is currently open to the page '{self._browser.page_title}' at the address '{self._browser.address}'.",
+                content=f"Your browser is currently open to the page '{browser.page_title}' at the address '{browser.address}'.",
             )
 
-            message_history = self._build_message_history(context_message)
-            deps = FileToolDependencies(browser=self._browser, websocket=self.websocket, stream_output=self.stream_output)
+            message_history = self._build_message_history(context_message, state.chat_history)
+            deps = FileToolDependencies(browser=browser, websocket=websocket, stream_output=stream_output)
 
             response = await self._agent.run(
                 user_prompt=user_message, message_history=message_history, deps=deps
             )
 
-            self._chat_history = response.all_messages()
+            state.chat_history = response.all_messages()
             logger.info("Successfully generated reply")
 
             # Convert response.data to the expected tuple format
@@ -387,11 +396,11 @@ class FileSurfer:
             return False, str(e), []  # Return failure status and error message
 
     def _build_message_history(
-        self, context_message: UserPromptPart
+        self, context_message: UserPromptPart, chat_history: List[ModelMessage]
     ) -> List[ModelMessage]:
         """Build message history with error handling"""
         try:
-            if not self._chat_history:
+            if not chat_history:
                 system_message = SystemPromptPart(content=self._system_prompt)
                 return [
                     ModelRequest(
@@ -400,7 +409,7 @@ class FileSurfer:
                 ]
 
             message_history = []
-            for message in self._chat_history:
+            for message in chat_history:
                 if message.kind == "request":
                     message_history.append(
                         ModelRequest(parts=message.parts, kind=message.kind)
@@ -435,12 +444,8 @@ if __name__ == "__main__":
 
         # Initialize agent and file surfer
         agent = Agent(model, deps_type=FileToolDependencies)
-        file_surfer = FileSurfer(
-            agent=agent,
-            browser=RequestsMarkdownBrowser(
-                viewport_size=1024 * 5, downloads_folder="coding"
-            ),
-        )
+        file_surfer = FileSurfer(agent=agent)
+        state = file_surfer.new_state()
 
         # Main interaction loop
         while True:
@@ -450,7 +455,12 @@ if __name__ == "__main__":
                     break
 
                 result = asyncio.run(
-                    file_surfer.generate_reply(user_message=user_message)
+                    file_surfer.generate_reply(
+                        user_message=user_message,
+                        websocket=None,
+                        stream_output=None,
+                        state=state,
+                    )
                 )
                 print("Response:", result)
 
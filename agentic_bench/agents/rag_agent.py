@@ -4,15 +4,10 @@ from typing import List, Tuple, Any,  Optional
 from pydantic import Field, BaseModel
 from fastapi import WebSocket
 from utils.stream_response_format import StreamResponse
-from dataclasses import asdict
-import json
 import asyncio
 import logfire
 import tracemalloc
 import os
-from fastapi import WebSocket
-from dataclasses import asdict
-from utils.stream_response_format import StreamResponse
 from utils.initializers.rag_constants import PDF_DIRECTORY
 from utils.initializers.graph_initializer import GraphInitializer
 from utils.initializers.rag_constants import DOMAIN, EXAMPLE_QUERIES, ENTITY_TYPES, WORKING_DIR, PDF_DIRECTORY, rag_system_prompt
@@ -54,15 +49,30 @@ class RAGAgent:
             self._agent: Agent = agent
             self.name = "RAG Agent"
             # self._system_prompt = system_prompt
-            self.websocket: Optional[WebSocket] = None
-            self.stream_output: Optional[StreamResponse] = None
-            self.description = get_rag_agent_dynamic_description()
+            # The graph is built on first use and shared by every later task
+            self._graph_initializer: Optional[GraphInitializer] = None
+            self._ingestion_lock = asyncio.Lock()
 
             self.register_tool()
         except Exception as e:
             logfire.error(f"Failed to initialize RAGAgent: {e}")
             raise
 
+    @property
+    def description(self) -> str:
+        """Describe the agent with the files currently available for querying"""
+        return get_rag_agent_dynamic_description()
+
+    def _get_graph_initializer(self) -> GraphInitializer:
+        if self._graph_initializer is None:
+            self._graph_initializer = GraphInitializer(
+                working_dir=WORKING_DIR,
+                domain=DOMAIN,
+                example_queries=EXAMPLE_QUERIES,
+                entity_types=ENTITY_TYPES,
+            )
+        return self._graph_initializer
+
     # def add_system_message(self):
     #     @self._agent.system_prompt
     #     def add_system_messages(ctx: RunContext[RAGDependencies]) -> str:
@@ -74,8 +84,9 @@ class RAGAgent:
             """Query the GraphRAG instance and return the parsed response."""
 
             if ctx.deps.stream_output and ctx.deps.websocket:
-                ctx.deps.stream_output.steps.append(f"Querying RAG system with: {query}")
-                await ctx.deps.websocket.send_text(json.dumps(asdict(ctx.deps.stream_output)))
+                await ctx.deps.stream_output.add_step(
+                    ctx.deps.websocket, f"Querying RAG system with: {query}"
+                )
 
             response = await ctx.deps.graph_rag.query(query)
 
@@ -89,8 +100,9 @@ class RAGAgent:
             ]
 
             if ctx.deps.stream_output and ctx.deps.websocket:
-                ctx.deps.stream_output.steps.append(f"Found {len(chunks)} relevant chunks")
-                await ctx.deps.websocket.send_text(json.dumps(asdict(ctx.deps.stream_output)))
+                await ctx.deps.stream_output.add_step(
+                    ctx.deps.websocket, f"Found {len(chunks)} relevant chunks"
+                )
 
             relationships = []
             for item in response.context.relationships:
@@ -113,33 +125,25 @@ class RAGAgent:
     ) -> Tuple[bool, str, List]:
         """Generate reply from the RAG agent"""
         try:
-            self.websocket = websocket
-            self.stream_output = stream_output
-
-            graph_initializer = GraphInitializer(
-                working_dir=WORKING_DIR,
-                domain=DOMAIN,
-                example_queries=EXAMPLE_QUERIES,
-                entity_types=ENTITY_TYPES,
-            )
+            graph_initializer = self._get_graph_initializer()
 
-            ingestion_status = await graph_initializer.ingest_data(pdf_dir=PDF_DIRECTORY)
+            # Ingestion swaps the underlying graph, so only one task may run it at a time
+            async with self._ingestion_lock:
+                ingestion_status = await graph_initializer.ingest_data(pdf_dir=PDF_DIRECTORY)
             logfire.info(f"Graph memory initialization status: {ingestion_status}")
 
             rag_deps = RAGDependencies(
                 graph_rag=graph_initializer,
                 description=AGENT_DESCRIPTION_FINANCE,
                 system_message=rag_system_prompt,
-                websocket=self.websocket,
-                stream_output=self.stream_output
+                websocket=websocket,
+                stream_output=stream_output
             )
 
-            if self.stream_output and self.websocket:
-                self.stream_output.steps.append("Data Ingestion in Progress")
-                await self.websocket.send_text(json.dumps(asdict(self.stream_output)))
+            if stream_output and websocket:
+                await stream_output.add_step(websocket, "Data Ingestion in Progress")
 
-                self.stream_output.steps.append("Creating Knowledge Graph")
-                await self.websocket.send_text(json.dumps(asdict(self.stream_output)))
+                await stream_output.add_step(websocket, "Creating Knowledge Graph")
 
             response = await self._agent.run(user_message, deps=rag_deps)
 
@@ -147,8 +151,8 @@ class RAGAgent:
 
         except Exception as e:
             logfire.error(f"Failed to generate RAG reply: {e}")
-            if self.stream_output and self.websocket:
-                self.stream_output.status_code = 500
-                self.stream_output.output = str(e)
-                await self.websocket.send_text(json.dumps(asdict(self.stream_output)))
+            if stream_output and websocket:
+                stream_output.status_code = 500
+                stream_output.output = str(e)
+                await stream_output.send(websocket)
             return False, str(e), []
\ No newline at end of file
@@ -12,7 +12,6 @@ from pydantic_ai.messages import (
     ArgsJson,
 )
 from fastapi import WebSocket
-from dataclasses import asdict
 
 from utils.stream_response_format import StreamResponse
 
@@ -23,11 +22,12 @@ class WebSurfer:
         self.api_url = api_url
         self.name = "Web Surfer Agent"
         self.description = "An agent that is a websurfer and a webscraper that  can access any web-page to extract information or perform actions."
-        self.websocket: Optional[WebSocket] = None
-        self.stream_output: Optional[StreamResponse] = None
 
     async def _make_api_call(
-        self, instruction: str
+        self,
+        instruction: str,
+        websocket: Optional[WebSocket] = None,
+        stream_output: Optional[StreamResponse] = None,
     ) -> Tuple[int, List[Dict[str, Any]]]:
         """Make API call to the web scraping service"""
         session_timeout = aiohttp.ClientTimeout(total=None,sock_connect=TIMEOUT,sock_read=TIMEOUT)
@@ -53,12 +53,9 @@ class WebSurfer:
                                     5:
                                 ].strip()  # Remove the data keyword in the beginning for all
                                 event_data = json.loads(line)
-                                if self.stream_output and self.websocket:
-                                    self.stream_output.steps.append(
-                                        event_data["message"]
-                                    )
-                                    await self.websocket.send_text(
-                                        json.dumps(asdict(self.stream_output))
+                                if stream_output and websocket:
+                                    await stream_output.add_step(
+                                        websocket, event_data["message"]
                                     )
                                 final_json_response.append(event_data)
 
@@ -76,9 +73,9 @@ class WebSurfer:
         """Generate a reply based on the instruction by making an API call"""
         try:
             # Make API call to get web content
-            self.websocket = websocket
-            self.stream_output = stream_output
-            status_code, api_response = await self._make_api_call(instruction)
+            status_code, api_response = await self._make_api_call(
+                instruction, websocket, stream_output
+            )
 
             # Check if the API call was successful
             if status_code != 200:
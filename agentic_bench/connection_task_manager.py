@@ -0,0 +1,175 @@
+import asyncio
+import json
+import os
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import logfire
+from fastapi import WebSocket, WebSocketDisconnect
+
+from utils import CancellationToken
+
+# Handler running one task: (task, channel, cancellation_token, priority) -> result
+TaskHandler = Callable[[str, "TaskChannel", CancellationToken, int], Awaitable[Any]]
+
+DEFAULT_MAX_TASKS_PER_CONNECTION = 4
+
+class TaskChannel:
+    """The view of a shared websocket given to a single task.
+
+    It is passed to the orchestrator in place of the websocket. Every stream
+    message sent through it is tagged with the task id (see
+    StreamResponse.send), and sends from concurrent tasks are serialized.
+    """
+
+    def __init__(self, websocket: WebSocket, task_id: str, send_lock: asyncio.Lock):
+        self._websocket = websocket
+        self.task_id = task_id
+        self._send_lock = send_lock
+
+    @property
+    def client_state(self):
+        return self._websocket.client_state
+
+    async def send_text(self, data: str) -> None:
+        async with self._send_lock:
+            await self._websocket.send_text(data)
+
+    async def close(self) -> None:
+        # The connection is shared with other tasks and outlives this one
+        pass
+
+class ConnectionTaskManager:
+    """Runs the tasks received on one websocket connection concurrently.
+
+    Messages from the client are either plain text, which starts a task, or
+    JSON objects:
+        {"type": "task", "task": "...", "task_id": "optional id", "priority": 0}
+        {"type": "cancel", "task_id": "..."}
+        {"type": "ping"}
+
+    The manager answers with "task_started", "task_finished", "pong" and
+    "error" messages. Stream messages of a task carry its "task_id".
+
+    Args:
+        websocket: The accepted websocket connection.
+        handler: Coroutine function running a single task.
+        max_tasks: Maximum number of tasks running at once on this connection.
+    """
+
+    def __init__(self, websocket: WebSocket, handler: TaskHandler, max_tasks: Optional[int] = None):
+        self._websocket = websocket
+        self._handler = handler
+        self._max_tasks = max_tasks or int(
+            os.getenv("AGENTIC_BENCH_MAX_TASKS_PER_CONNECTION", str(DEFAULT_MAX_TASKS_PER_CONNECTION))
+        )
+        self._send_lock = asyncio.Lock()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._tokens: Dict[str, CancellationToken] = {}
+
+    async def _send(self, message: Dict[str, Any]) -> None:
+        try:
+            async with self._send_lock:
+                await self._websocket.send_text(json.dumps(message))
+        except Exception as e:
+            logfire.error(f"WebSocket send failed: {str(e)}")
+
+    async def run(self) -> None:
+        """Receive messages until the client disconnects, then cancel its tasks"""
+        try:
+            while True:
+                data = await self._websocket.receive_text()
+                await self._handle_message(data)
+        except WebSocketDisconnect:
+            logfire.info("WebSocket disconnected")
+        finally:
+            await self.cancel_all()
+
+    async def _handle_message(self, data: str) -> None:
+        try:
+            message = json.loads(data)
+        except ValueError:
+            message = None
+        if not isinstance(message, dict) or "type" not in message:
+            # Plain text messages are tasks
+            await self.start_task(data)
+            return
+
+        message_type = message["type"]
+        if message_type == "task":
+            task = message.get("task")
+            if not isinstance(task, str) or not task.strip():
+                await self._send({"type": "error", "message": "Task message without a task"})
+                return
+            try:
+                priority = int(message.get("priority", 0))
+            except (TypeError, ValueError):
+                await self._send({"type": "error", "message": "Task priority must be an integer"})
+                return
+            await self.start_task(task, message.get("task_id"), priority)
+        elif message_type == "cancel":
+            task_id = message.get("task_id")
+            if task_id is not None:
+                task_id = str(task_id)
+            if not self.cancel(task_id):
+                await self._send({"type": "error", "task_id": task_id, "message": f"Unknown task id: {task_id}"})
+        elif message_type == "ping":
+            await self._send({"type": "pong"})
+        else:
+            await self._send({"type": "error", "message": f"Unknown message type: {message_type}"})
+
+    async def start_task(self, task: str, task_id: Optional[str] = None, priority: int = 0) -> Optional[str]:
+        """Start a task in the background and return its id, or None if it was rejected"""
+        if len(self._tasks) >= self._max_tasks:
+            await self._send({
+                "type": "error",
+                "task_id": task_id,
+                "message": f"Too many running tasks on this connection (max {self._max_tasks})",
+            })
+            return None
+
+        task_id = str(task_id) if task_id else uuid.uuid4().hex
+        if task_id in self._tasks:
+            await self._send({"type": "error", "task_id": task_id, "message": f"Task {task_id} is already running"})
+            return None
+
+        token = CancellationToken()
+        channel = TaskChannel(self._websocket, task_id, self._send_lock)
+        self._tokens[task_id] = token
+        self._tasks[task_id] = asyncio.create_task(self._run_task(task_id, task, channel, token, priority))
+        return task_id
+
+    async def _run_task(self, task_id: str, task: str, channel: TaskChannel,
+                        token: CancellationToken, priority: int) -> None:
+        finished: Dict[str, Any] = {"type": "task_finished", "task_id": task_id, "status": "completed"}
+        try:
+            await self._send({"type": "task_started", "task_id": task_id, "task": task})
+            await self._handler(task, channel, token, priority)
+        except asyncio.CancelledError:
+            finished["status"] = "cancelled"
+        except Exception as e:
+            finished["status"] = "failed"
+            finished["error"] = str(e)
+            logfire.error(f"Task {task_id} failed: {str(e)}")
+        finally:
+            self._tasks.pop(task_id, None)
+            self._tokens.pop(task_id, None)
+        await self._send(finished)
+
+    def cancel(self, task_id: Optional[str]) -> bool:
+        """Cancel a running task. Returns False if there is no such task"""
+        task = self._tasks.get(task_id)
+        if task is None:
+            return False
+        # The token stops running code executions, cancelling the task stops the orchestration
+        self._tokens[task_id].cancel()
+        task.cancel()
+        return True
+
+    async def cancel_all(self) -> None:
+        """Cancel every running task and wait for them to finish"""
+        tasks = list(self._tasks.values())
+        for task_id in list(self._tasks):
+            self.cancel(task_id)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
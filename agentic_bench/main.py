@@ -1,22 +1,73 @@
-from fastapi import FastAPI, WebSocket
-from typing import Optional, List
+import json
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, WebSocket
+from typing import Any, Dict, Optional, List
 
+from agent_registry import get_agent_registry
+from connection_task_manager import ConnectionTaskManager
 from orchestrator import SystemOrchestrator
+from run_scheduler import RunScheduler, SchedulerFullError
+from utils import CancellationToken
+from utils.oai_client import close_client
 
-app: FastAPI = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the shared agents once, before the first task arrives
+    app.state.agent_registry = get_agent_registry()
+    app.state.run_scheduler = RunScheduler.from_env()
+    await app.state.agent_registry.start()
+    yield
+    await app.state.agent_registry.close()
+    await close_client()
 
-async def generate_response(task: str, websocket: Optional[WebSocket] = None):
-    orchestrator: SystemOrchestrator = SystemOrchestrator()
-    return await orchestrator.run(task, websocket)
+app: FastAPI = FastAPI(lifespan=lifespan)
+
+async def generate_response(task: str, websocket: Optional[WebSocket] = None,
+                            cancellation_token: Optional[CancellationToken] = None, priority: int = 0):
+    async def report_queue_position(position: int) -> None:
+        await websocket.send_text(json.dumps({
+            "type": "queue_position",
+            "task_id": getattr(websocket, "task_id", None),
+            "position": position,
+        }))
+
+    # Runs beyond the server-wide concurrency limit wait here for a free slot
+    async with app.state.run_scheduler.admit(priority, report_queue_position if websocket else None):
+        orchestrator: SystemOrchestrator = SystemOrchestrator(app.state.agent_registry)
+        return await orchestrator.run(task, websocket, cancellation_token)
 
 @app.get("/agent/chat")
-async def agent_chat(task: str) -> List:
-    final_agent_response = await generate_response(task)
+async def agent_chat(task: str, priority: int = 0) -> List:
+    try:
+        final_agent_response = await generate_response(task, priority=priority)
+    except SchedulerFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
     return final_agent_response
 
+@app.get("/agent/stats")
+async def agent_stats() -> Dict[str, Any]:
+    run_scheduler: RunScheduler = app.state.run_scheduler
+    container_pool = app.state.agent_registry.container_pool
+    dependency_cache = app.state.agent_registry.dependency_cache
+    result_cache = app.state.agent_registry.result_cache
+    http_cache = app.state.agent_registry.http_cache
+    document_cache = app.state.agent_registry.document_cache
+    return {
+        "prompt_cache": app.state.agent_registry.prompt_cache_stats.snapshot(),
+        "scheduler": {
+            "running": run_scheduler.running,
+            "queued": run_scheduler.queued,
+        },
+        "docker_pool": container_pool.stats() if container_pool else None,
+        "dependency_cache": dependency_cache.stats() if dependency_cache else None,
+        "result_cache": result_cache.stats() if result_cache else None,
+        "browser_http_cache": http_cache.stats() if http_cache else None,
+        "document_cache": document_cache.stats() if document_cache else None,
+    }
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
-    while True:
-        data = await websocket.receive_text()
-        await generate_response(data, websocket)
+    # Tasks run in the background so the socket keeps reading cancel and ping messages
+    task_manager = ConnectionTaskManager(websocket, generate_response)
+    await task_manager.run()
@@ -1,5 +1,5 @@
+import asyncio
 import os
-import json
 import traceback
 from typing import List, Optional, Dict, Any, Union, Tuple
 from datetime import datetime
@@ -11,43 +11,26 @@ from dotenv import load_dotenv
 from pydantic_ai.messages import ModelMessage
 from pydantic_ai.models.openai import OpenAIModel
 from pydantic_ai import Agent
-from utils.oai_client import get_client
+from utils import CancellationToken
 from utils.stream_response_format import StreamResponse
+from utils.chat_history import ChatHistoryManager
+from utils.execution_digest import ExecutionDigest
 from utils.prompts import (
     ORCHESTRATOR_PLAN_PROMPT,
     ORCHESTRATOR_GET_FINAL_ANSWER,
 )
-from agents.file_surfer import FileSurfer, FileToolDependencies, RequestsMarkdownBrowser
+from agents.file_surfer import FileSurfer, FileSurferState
 from agents.web_surfer import WebSurfer
-from agents.coder_agent import (
-    CoderAgent, CoderDependencies, Executor, ExecutorDependencies,
-    DockerCodeExecutor, LocalCodeExecutor, CoderResult, coder_system_message
+from agents.coder_agent import CoderAgent, CoderResult, Executor, ExecutorDependencies
+from agents.rag_agent import RAGAgent
+from agent_registry import AgentRegistry, get_agent_registry
+from orchestrator_agents import (
+    OrchestratorAgents, PlanModel, PlanStep, DagPlan, AgentSelectorOutput, CritiqueOutput, StepDecision
 )
-from agents.rag_agent import RAGAgent, RAGDependencies
-from openai import AsyncOpenAI
-from utils.initializers.rag_constants import rag_system_prompt
 
 load_dotenv()
 
 # Base Models
-class PlanModel(BaseModel):
-    """Model for the planning stage output"""
-    plan: str
-    metadata: Optional[Dict[str, Any]] = None
-
-class AgentSelectorOutput(BaseModel):
-    """Model for the agent selection output"""
-    next_speaker: str
-    instruction: str
-    explanation: str
-
-class CritiqueOutput(BaseModel):
-    """Model for critique stage output"""
-    feedback: str
-    terminate: bool
-    final_response: Optional[str] = None
-    retry_count: Optional[int] = 0
-
 class AgentExecutionResult(BaseModel):
     """Model for storing agent execution results"""
     success: bool
@@ -76,41 +59,43 @@ class WebSocketError(OrchestrationError):
 # Context Management
 class OrchestrationContext:
     """Maintains the context throughout the orchestration process"""
-    def __init__(self):
+    def __init__(self, history_summarizer: Optional[Agent] = None):
         self.current_plan: Optional[str] = None
         self.execution_history: List[AgentExecutionResult] = []
+        # Bounded view of execution_history for the critique, updated alongside it
+        self.execution_digest = ExecutionDigest()
         self.retry_counts: Dict[str, int] = {}
         self.max_retries: int = 3
-        self.chat_history: List[ModelMessage] = []
-        self.agent_selector_chat_history: List[ModelMessage] = []
-        self.last_code_block: Optional[Dict[str, Any]] = None
+        self.chat_history = ChatHistoryManager("Agents", summarizer=history_summarizer)
+        self.agent_selector_chat_history = ChatHistoryManager("Agent Selector", summarizer=history_summarizer)
+        self.last_code_block: Optional[CoderResult] = None
+        self.file_surfer_state: Optional[FileSurferState] = None
+        self.executor_deps: Optional[ExecutorDependencies] = None
+        self.orchestrator_agents: Optional[OrchestratorAgents] = None
 
 # Main Orchestrator Class
 class SystemOrchestrator:
-    def __init__(self):
+    def __init__(self, registry: Optional[AgentRegistry] = None):
+        # Agents and the model are shared across tasks; everything else here is per task
+        self.registry: AgentRegistry = registry or get_agent_registry()
         self.agents: List[Union[FileSurfer, CoderAgent, Executor, WebSurfer, RAGAgent]] = []
-        self.model: Optional[OpenAIModel] = None
+        self.model: OpenAIModel = self.registry.model
         self.websocket: Optional[WebSocket] = None
+        self.cancellation_token: Optional[CancellationToken] = None
         self.stream_output: Optional[StreamResponse] = None
         self.orchestrator_response: List[StreamResponse] = []
-        self.context = OrchestrationContext()
-        self.coder_deps = None
-        self.executor_deps = None
-        self._setup_logging()
-
-    def _setup_logging(self) -> None:
-        """Configure logging with proper formatting"""
-        logfire.configure(
-            send_to_logfire='if-token-present',
-            token=os.getenv("LOGFIRE_TOKEN"),
-            scrubbing=False,
-        )
-
-    async def _safe_websocket_send(self, message: Any) -> bool:
-        """Safely send message through websocket with error handling"""
+        self.context = OrchestrationContext(self.registry.history_summarizer)
+        self.coder_deps = self.registry.coder_deps
+        # Critique the last step and select the next agent in one model call instead of two
+        self.merged_step_decision: bool = os.getenv("AGENTIC_BENCH_MERGED_STEP_DECISION", "false").lower() == "true"
+        # Plan steps with dependencies and run independent steps concurrently
+        self.dag_mode: bool = os.getenv("AGENTIC_BENCH_DAG_MODE", "false").lower() == "true"
+
+    async def _safe_websocket_send(self, message: StreamResponse, final: bool = False) -> bool:
+        """Safely stream the changes of a message through websocket with error handling"""
         try:
             if self.websocket and self.websocket.client_state.CONNECTED:
-                await self.websocket.send_text(json.dumps(asdict(message)))
+                await message.send(self.websocket, final=final)
                 return True
             return False
         except Exception as e:
@@ -118,95 +103,14 @@ class SystemOrchestrator:
             return False
 
     async def initialize_agents(self) -> List[Union[FileSurfer, CoderAgent, Executor, WebSurfer, RAGAgent]]:
-        """Initialize all required agents with error handling"""
+        """Attach the shared agents and create the per-task agent state"""
         try:
             logfire.info("Initializing agents")
 
-            # Initialize OpenAI model
-            self.model = OpenAIModel(
-                model_name=os.environ.get("AGENTIC_BENCH_MODEL_NAME", "gpt-4o"),
-                openai_client=get_client()
-            )
-
-            # Initialize File Surfer
-            file_surfer = Agent(
-                model=self.model,
-                name="File Surfer Agent",
-                deps_type=FileToolDependencies,
-            )
-            file_surfer_agent = FileSurfer(
-                agent=file_surfer,
-                browser=RequestsMarkdownBrowser(
-                    viewport_size=1024 * 5,
-                    downloads_folder="coding"
-                )
-            )
-
-            # Initialize Coder Agent
-            coder_description = "A helpful and general-purpose AI assistant that has strong language skills, Python skills, and Linux command line skills."
-            
-            self.coder_deps = CoderDependencies(
-                description=coder_description,
-                system_messages=coder_system_message,
-                request_terminate=False
-            )
-
-            cod_agent = Agent(
-                model=self.model,
-                name="Coder Agent",
-                deps_type=CoderDependencies,
-                result_type=CoderResult
-            )
-            coder_agent = CoderAgent(
-                agent=cod_agent,
-                system_prompt=coder_system_message
-            )
-
-            # Initialize Executor
-            executor_system_message = "A computer terminal that performs no other action than running Python scripts or sh shell scripts. Always call the execute_code tool to execute the code and output the result."
-            
-            executor_type = os.environ.get("AGENTIC_BENCH_EXECUTOR")
-            print()
-            print(f"Executor type from env : {executor_type}")
-            if executor_type in os.environ.get("AGENTIC_BENCH_SUPPORTED_EXECUTORS", []):
-                print(f"Executor type in supported executors from env:  {executor_type}")
-                executor = DockerCodeExecutor() if executor_type == "Docker" else LocalCodeExecutor()
-                
-                self.executor_deps = ExecutorDependencies(
-                    executor=executor,
-                    confirm_execution="ACCEPT_ALL",
-                    description="Executor to execute the generated code",
-                    system_message=executor_system_message,
-                    content=None,
-                    check_last_n_message=5
-                )
-
-            exec_agent = Agent(
-                model=self.model,
-                name="Executor Agent",
-                deps_type=ExecutorDependencies,
-            )
-            executor_agent = Executor(
-                agent=exec_agent,
-                system_prompt=executor_system_message
-            )
-
-            # Initialize Web Surfer
-            web_surfer_agent = WebSurfer(api_url="http://localhost:8000/execute_task")
-
-            rag_agent = Agent(
-                model=self.model,
-                name="RAG Agent",
-                deps_type=RAGDependencies
-            )
-
-            # Initialize RAG agent instance without description parameter
-            rag_agent_instance = RAGAgent(
-                agent=rag_agent
-            )
-
-            # Combine all agents
-            self.agents = [file_surfer_agent, coder_agent, executor_agent, web_surfer_agent, rag_agent_instance]
+            self.agents = self.registry.agents
+            self.context.file_surfer_state = self.registry.file_surfer.new_state()
+            self.context.executor_deps = self.registry.create_executor_deps()
+            self.context.orchestrator_agents = self.registry.get_orchestrator_agents()
 
             logfire.info(f"Successfully initialized {len(self.agents)} agents")
             logfire.info(f"Agents: {[agent.name for agent in self.agents]}")
@@ -221,47 +125,11 @@ class SystemOrchestrator:
     async def generate_plan(self, task: str) -> Tuple[bool, str, Optional[str]]:
         """Generate initial plan with error handling"""
         try:
-            agent_descriptions = "\n".join(f"Name: {agent.name}\nDescription: {agent.description}\n" for agent in self.agents)
-            planner_prompt = f"""You only need to answer in a string format. Never perform any tool calls for any agents, Just make a plan (string format) based on the information you have.
-
-            Based on the team composition, and known and unknown facts, please devise a short bullet-point plan for addressing the original request. Remember, there is no requirement to involve all team members -- a team member's particular expertise may not be needed for this task.
-
-            <rules>
-                <input_processing> 
-                    - You are provided with a team description that contains information about the team members and their expertise.
-                    - These team members receive the plan generated by you but cannot follow direct orders like tool calls from you, so you are strictly restricted to only making a plan.
-                    - You do not have access to any tools, just a string input and a string reply.
-                </input_processing> 
-
-                <output_processing>
-                    - You need to provide a plan in a string format.
-                    - The agents in the team are not directly under you so you cannot give any tool calls since you have no access to any tools whatsoever. 
-                    - You need to plan in such a way that a combination of team members can be used if needed to handle and solve the task at hand.
-                </output_processing>
-
-                <critical>
-                    - You always need to generate a plan that satisfies the request strictly using the agents that we have.
-                     - Never ever try to answer the question yourself no matter how simple it is actually.
-                    - If there are any weblinks/ file paths then never omit them from the plan. Include them as provided by the user, without any modification.
-                    - If there are any instructions in the original question, include them in the plan as is, dont try to deviate from the user provided instructions and try to craft something new in the plan.
-                    - Dont try to add agents unnecessarily to the plan. Use only the agents that are absolutely necessary to solve the task.
-                </critical>
-            </rules>
-            
-            Available agents and their descriptions: 
-
-            {agent_descriptions}
-            """
-
-            planner_agent = Agent(
-                model=self.model,
-                name="Planner Agent",
-                system_prompt=planner_prompt
-            )
-            
             start_time = datetime.now()
+            planner_agent = self.context.orchestrator_agents.planner
             plan_result = await planner_agent.run(task)
             execution_time = (datetime.now() - start_time).total_seconds()
+            self.registry.prompt_cache_stats.record(planner_agent.name, plan_result.usage())
 
             logfire.info(f"Plan generation completed in {execution_time}s")
             logfire.info(f"Planner agent new messages : {plan_result.new_messages()}")
@@ -273,49 +141,41 @@ class SystemOrchestrator:
             logfire.error(error_msg)
             return False, "", error_msg
 
-    async def select_next_agent(self, plan: str) -> Tuple[bool, Optional[AgentSelectorOutput], Optional[str]]:
-        """Select next agent with comprehensive error handling"""
+    async def generate_dag_plan(self, task: str) -> Tuple[bool, Optional[DagPlan], Optional[str]]:
+        """Generate a plan whose steps declare the steps they depend on"""
         try:
-            agent_descriptions = "\n".join(f"Name: {agent.name}\nDescription: {agent.description}\n" for agent in self.agents)
-            selector_prompt = f"""
-            
-            You are a selector agent. Your job is to look at the conversation flow and the agents at hand and then correctly decided which agent should speak next. Also when you decide which agent should speak next, you need to provide the instruction that the agent should follow.
+            start_time = datetime.now()
+            dag_planner = self.context.orchestrator_agents.dag_planner
+            plan_result = await dag_planner.run(task)
+            execution_time = (datetime.now() - start_time).total_seconds()
+            self.registry.prompt_cache_stats.record(dag_planner.name, plan_result.usage())
 
-            Available agents and their descriptions :  
+            logfire.info(f"DAG plan generation completed in {execution_time}s")
+            logfire.info(f"DAG planner agent new messages : {plan_result.new_messages()}")
 
-            {agent_descriptions}
-            
-            <rules>
-                <input_processing>
-                    - You have been provided with the current plan that we are supposed to execute and complete in order to satisfy the request.
-                    - You need to look at the conversation and then decide which agent should speak next.
-                </input_processing>
-
-                <output_processing>
-                    - You need to output a JSON with keys "next_speaker", "instruction", and "explanation".
-                    - The "next_speaker" key should contain the name of the agent that you think should speak next.
-                    - The "instruction" key should contain the instruction that the agent should follow.
-                    - The "explanation" key should contain the reasoning behind your decision.
-
-                </output_processing>
-
-                <critical>
-                    - You always need to generate a plan that satisfies the request strictly using the agents that we have.
-                    - If there are any weblinks/ file paths then never omit them from the instructions. Include them as provided by the user, without any modification.
-                    - If there are any instructions in the original question, include them in the instruction as is, dont try to deviate from the user provided instruction and try to craft something new.
-                </critical>
-            </rules>
-            
-            """
+            dag_plan = plan_result.data
+            error = dag_plan.validation_error()
+            if error is None:
+                unknown_agents = [step.agent for step in dag_plan.steps if self._get_agent_by_name(step.agent) is None]
+                if unknown_agents:
+                    error = f"Unknown agents in plan: {unknown_agents}"
+            if error is not None:
+                return False, None, error
 
-            selector_agent = Agent(
-                model=self.model,
-                name="Agent Selector",
-                system_prompt=selector_prompt,
-                result_type=AgentSelectorOutput
-            )
+            return True, dag_plan, None
 
-            result = await selector_agent.run(user_prompt=plan, message_history=self.context.agent_selector_chat_history)
+        except Exception as e:
+            error_msg = f"DAG plan generation failed: {str(e)}\n{traceback.format_exc()}"
+            logfire.error(error_msg)
+            return False, None, error_msg
+
+    async def select_next_agent(self, plan: str) -> Tuple[bool, Optional[AgentSelectorOutput], Optional[str]]:
+        """Select next agent with comprehensive error handling"""
+        try:
+            selector_agent = self.context.orchestrator_agents.selector
+            message_history = await self.context.agent_selector_chat_history.get_messages()
+            result = await selector_agent.run(user_prompt=plan, message_history=message_history)
+            self.registry.prompt_cache_stats.record(selector_agent.name, result.usage())
             logfire.info(f"Agent selection completed: {result.data}")
             logfire.info(f"Selector agent new messages : {result.new_messages()}")
             self.context.agent_selector_chat_history.extend(result.new_messages())
@@ -328,6 +188,19 @@ class SystemOrchestrator:
 
     async def execute_agent_instruction(self, agent: Union[FileSurfer, CoderAgent, Executor, WebSurfer, RAGAgent], instruction: str) -> AgentExecutionResult:
         """Execute agent instruction with robust error handling using generate_reply"""
+        result, messages, stream_output = await self._run_agent_instruction(agent, instruction)
+        self._record_agent_execution(result, messages, stream_output)
+        return result
+
+    def _record_agent_execution(self, result: AgentExecutionResult, messages: List[ModelMessage], stream_output: StreamResponse) -> None:
+        """Add an agent execution to the chat history and the orchestrator response"""
+        if result.success:
+            self.context.chat_history.extend(messages)
+        if result.error_message is None:
+            self.orchestrator_response.append(stream_output)
+
+    async def _run_agent_instruction(self, agent: Union[FileSurfer, CoderAgent, Executor, WebSurfer, RAGAgent], instruction: str) -> Tuple[AgentExecutionResult, List[ModelMessage], StreamResponse]:
+        """Run an agent with its own stream output, without touching the shared histories"""
         start_time = datetime.now()
         result = AgentExecutionResult(
             success=False,
@@ -336,49 +209,32 @@ class SystemOrchestrator:
             execution_time=0.0,
             agent_name=agent.name
         )
+        messages: List[ModelMessage] = []
+        # Each agent run streams separately, so concurrent runs do not share a stream output
+        stream_output = StreamResponse(
+            agent_name=agent.name,
+            instructions=instruction,
+            steps=[],
+            output="",
+            status_code=0
+        )
+        self.stream_output = stream_output
 
         try:
             # Update stream output for WebSocket
-            self.stream_output = StreamResponse(
-                agent_name=agent.name,
-                instructions=instruction,
-                steps=[],
-                output="",
-                status_code=0
-            )
-            await self._safe_websocket_send(self.stream_output)
+            await self._safe_websocket_send(stream_output)
 
             # Prepare agent-specific kwargs based on agent type
             if isinstance(agent, CoderAgent):
-                success, response, messages = await agent.generate_reply(
+                success, coder_result, response, messages = await agent.generate_code(
                     user_message=instruction,
                     deps=self.coder_deps,websocket=self.websocket,
-                    stream_output=self.stream_output
+                    stream_output=stream_output
                 )
 
-                # Parse the response to extract code block info
+                # Store the typed result in context for the Executor to use
                 if success:
-                    # Extract dependencies and content from response string
-                    response_parts = response.split(" dependencies=")
-                    if len(response_parts) > 1:
-                        dependencies_content = response_parts[1].split(" content=", 1)
-                        if dependencies_content:
-                            try:
-                                # Parse dependencies list from string
-                                dependencies = eval(dependencies_content[0])  # Convert string to actual list
-
-                                content_split = dependencies_content[1]
-                                if len(content_split) > 1:
-                                    content = content_split.strip("'")
-                                    
-                                    # Store in context for Executor to use
-                                    self.context.last_code_block = {
-                                        "dependencies": dependencies,
-                                        "content": content
-                                    }
-                                    print("response block to send to executor", self.context.last_code_block)
-                            except Exception as e:
-                                logfire.error(f"Failed to parse coder response: {e}")
+                    self.context.last_code_block = coder_result
 
                 print()
                 print(f"Response from Coder Agent : {response}")
@@ -387,29 +243,30 @@ class SystemOrchestrator:
             elif isinstance(agent, Executor):
                 # Use the stored code block from context
                 if self.context.last_code_block:
-                    self.executor_deps.content = self.context.last_code_block
+                    self.context.executor_deps.content = self.context.last_code_block
                 success, response, messages = await agent.generate_reply(
                     user_message=instruction,
-                    deps=self.executor_deps,websocket=self.websocket,
-                    stream_output=self.stream_output
+                    deps=self.context.executor_deps,websocket=self.websocket,
+                    stream_output=stream_output
                 )
             elif isinstance(agent, FileSurfer):
                 success, response, messages = await agent.generate_reply(
                     user_message=instruction,
                     websocket=self.websocket,
-                    stream_output=self.stream_output
+                    stream_output=stream_output,
+                    state=self.context.file_surfer_state
                 )
             elif isinstance(agent, WebSurfer):
                 success, response, messages = await agent.generate_reply(
                     instruction=instruction,
                     websocket=self.websocket,
-                    stream_output=self.stream_output
+                    stream_output=stream_output
                 )
             elif isinstance(agent, RAGAgent): # RAG Agent
                 success, response, messages = await agent.generate_reply(
                     user_message=instruction,
                     websocket=self.websocket,
-                    stream_output=self.stream_output
+                    stream_output=stream_output
                 )
 
             else:  # FileSurfer
@@ -423,83 +280,133 @@ class SystemOrchestrator:
             result.output = response
             result.execution_time = execution_time
             
-            # Update chat history
-            if success:
-                self.context.chat_history.extend(messages)
-            
             # Update stream output
-            if self.stream_output:
-                self.stream_output.output = response
-                self.stream_output.status_code = 200 if success else 500
-                self.orchestrator_response.append(self.stream_output)
-                await self._safe_websocket_send(self.stream_output)
+            stream_output.output = response
+            stream_output.status_code = 200 if success else 500
+            await self._safe_websocket_send(stream_output, final=True)
 
         except Exception as e:
             error_msg = f"Agent execution failed: {str(e)}\n{traceback.format_exc()}"
             logfire.error(error_msg)
             result.error_message = error_msg
             
-            if self.stream_output:
-                self.stream_output.status_code = 500
-                self.stream_output.output = error_msg
-                await self._safe_websocket_send(self.stream_output)
+            stream_output.status_code = 500
+            stream_output.output = error_msg
+            await self._safe_websocket_send(stream_output, final=True)
+
+        return result, messages, stream_output
+
+    def _dag_step_instruction(self, step: PlanStep, results: Dict[str, AgentExecutionResult]) -> str:
+        """The step instruction followed by the results of the steps it depends on"""
+        if not step.depends_on:
+            return step.instruction
+        dependency_results = "\n".join(
+            f"Step {dependency} ({results[dependency].agent_name}): {results[dependency].output}"
+            for dependency in step.depends_on
+        )
+        return f"{step.instruction}\n\nResults of the previous steps:\n{dependency_results}"
+
+    async def execute_plan_dag(self, dag_plan: DagPlan, stream_output: StreamResponse) -> Optional[AgentExecutionResult]:
+        """Run the plan in waves of steps whose dependencies are done, concurrently within a wave.
+
+        An agent runs at most one step per wave since its per-task state is
+        shared. Coder and Executor steps never share a wave, and each Executor
+        step runs the code of the latest Coder step it depends on. Results are
+        merged into the execution history in plan order, whatever order the
+        steps finish in. Returns the last successful result in plan order, if
+        any.
+        """
+        results: Dict[str, AgentExecutionResult] = {}
+        pending: List[PlanStep] = list(dag_plan.steps)
+        last_result: Optional[AgentExecutionResult] = None
+        # Code written by each Coder step, handed to the Executor steps depending on it
+        code_blocks: Dict[str, Any] = {}
+
+        while pending:
+            if self.cancellation_token.is_cancelled():
+                raise asyncio.CancelledError()
+
+            wave: List[PlanStep] = []
+            busy_agents = set()
+            for step in pending:
+                if any(dependency in results and not results[dependency].success for dependency in step.depends_on):
+                    # Dependents of a failed step cannot run, and fail in turn
+                    results[step.id] = AgentExecutionResult(
+                        success=False,
+                        output="",
+                        error_message="Skipped because a step it depends on failed",
+                        execution_time=0.0,
+                        agent_name=step.agent
+                    )
+                    stream_output.steps.append(f"Skipped step {step.id} because a step it depends on failed")
+                elif (
+                    all(dependency in results for dependency in step.depends_on)
+                    and step.agent not in busy_agents
+                    and not self._shares_code_block(step, wave)
+                ):
+                    wave.append(step)
+                    busy_agents.add(step.agent)
+            pending = [step for step in pending if step.id not in results and step not in wave]
+            if not wave:
+                continue
+
+            for step in wave:
+                if step.agent == DagPlan.EXECUTOR_AGENT:
+                    self.context.last_code_block = code_blocks.get(dag_plan.code_step(step))
+
+            stream_output.steps.append(
+                f"Running {', '.join(f'step {step.id} with {step.agent}' for step in wave)}"
+                + (" in parallel" if len(wave) > 1 else "")
+            )
+            await self._safe_websocket_send(stream_output)
 
-        return result
+            # asyncio.gather rather than TaskGroup, the server still runs on Python 3.10
+            outcomes = await asyncio.gather(*(
+                self._run_agent_instruction(self._get_agent_by_name(step.agent), self._dag_step_instruction(step, results))
+                for step in wave
+            ))
+
+            for step, (result, messages, step_stream_output) in zip(wave, outcomes):
+                self._record_agent_execution(result, messages, step_stream_output)
+                self.context.execution_history.append(result)
+                self.context.execution_digest.add(result)
+                results[step.id] = result
+                if result.success:
+                    last_result = result
+                    if step.agent == DagPlan.CODER_AGENT:
+                        code_blocks[step.id] = self.context.last_code_block
+                stream_output.steps.append(
+                    f"Completed step {step.id} with {step.agent}" if result.success else f"Step {step.id} with {step.agent} failed"
+                )
+            await self._safe_websocket_send(stream_output)
+
+        return last_result
+
+    @staticmethod
+    def _shares_code_block(step: PlanStep, wave: List[PlanStep]) -> bool:
+        """Whether the step would run alongside a step of the wave through the context's last code block
+
+        The Coder writes it and the Executor reads it, so their steps never run in the same wave.
+        """
+        code_agents = (DagPlan.CODER_AGENT, DagPlan.EXECUTOR_AGENT)
+        return step.agent in code_agents and any(
+            other.agent in code_agents and other.agent != step.agent for other in wave
+        )
+
+    def _critique_context(self, task: str, output: str, plan: str, execution_history: List[AgentExecutionResult]) -> str:
+        digest = self.context.execution_digest
+        if len(digest) != len(execution_history):
+            digest = ExecutionDigest.from_results(execution_history)
+        previous_execution_results = digest.render(exclude_last=True)
+        return f"Task: {task}\nPlan: {plan}\nLatest Output:{output}\nPrevious Execution Results: {previous_execution_results}"
 
     async def critique_execution(self, task: str, output: str, plan: str, execution_history: List[AgentExecutionResult]) -> Tuple[bool, Optional[CritiqueOutput], Optional[str]]:
         """Critique agent execution and determine next steps"""
         try:
-            critique_prompt = """You are a critique agent. Your job is to critique the output of the agent that just executed, take into consideration the previous outputs of other agents also and then decide if the task is complete or if we need to continue with the next agent.
-
-            <rules>
-
-                <input_processing>
-                    - You have been provided with the task description, the current plan to be followed, the output of the latest agent that executed and the output execution history of the previous agents that have finished execution.
-                    - You have to look at the plan and decide firstly what is our progress currently relative to the plan.
-                    - You have to decide if the task is complete or if we need to continue with the next agent.
-                    - You have to provide feedback on the output of the agent that just executed.
-                </input_processing>
-
-                <output_processing>
-                    - You need to output a JSON with keys "feedback", "terminate", and optionally "final_response".
-
-                    <feedback> 
-                        - You need to provide feedback on the output of the agent that just executed.
-                        - The feedback should be verbose and should contain all the necessary details.
-                        - The main goal with this feedback is that we should be able to understand what went wrong and what went right with the output.
-                        - Highlight things that were done correctly and things that were done incorrectly.
-                        - You also need to provide feedback on the progress of the task relative to the plan inside the feedback key itself in the output JSON. When giving progress feedback, you need to compare the current state with the plan and then provide feedback. Maybe compare the number of steps completed with the total number of steps in the plan. Take into consideration the execution history of previous agents while comparing with the plan.
-                    </feedback>
-
-                    <terminate>
-                        - The "terminate" key should be a boolean value.
-                        - If the task is complete and we do not need to continue with any other agents, then the value should be True.
-                        - If the task is not complete and we need to continue with the next agent, then the value should be False.
-                        - If terminate is True then you have to provide the final_response key in the output. This is a super critical key and should contain the final response to the original request.
-                        - If terminate is False then you do not need to provide the final_response key.
-                        - The final response key is the actual answer and so you need to output the content in the same manner inside the final_response key as you would output the final answer.
-                    </terminate>
-
-                </output_processing>
-
-            </rules>
-            
-            Output JSON with 'feedback', 'terminate', and optional 'final_response' keys."""
-
-            previous_execution_results = "\n".join(
-                f"Agent: {result.agent_name}\nOutput: {result.output if result.success else result.error_message}\n"
-                for result in execution_history[:-1]  # Exclude the last element
-            )
-
-            critique_agent = Agent(
-                model=self.model,
-                name="Critique Agent",
-                system_prompt=critique_prompt,
-                result_type=CritiqueOutput
-            )
-            
-            context = f"Task: {task}\nPlan: {plan}\nLatest Output:{output}\nPrevious Execution Results: {previous_execution_results}"
+            context = self._critique_context(task, output, plan, execution_history)
+            critique_agent = self.context.orchestrator_agents.critique
             result = await critique_agent.run(user_prompt=context)
+            self.registry.prompt_cache_stats.record(critique_agent.name, result.usage())
             logfire.info(f"Critique completed: {result.data}")
             logfire.info(f"Critique agent new messages : {result.new_messages()}")
             
@@ -510,6 +417,36 @@ class SystemOrchestrator:
             logfire.error(error_msg)
             return False, None, error_msg
 
+    async def decide_next_step(self, task: str, output: str, plan: str, execution_history: List[AgentExecutionResult]) -> Tuple[bool, Optional[StepDecision], Optional[str]]:
+        """Critique agent execution and select the next agent in a single call"""
+        try:
+            context = self._critique_context(task, output, plan, execution_history)
+            step_decider = self.context.orchestrator_agents.step_decider
+            result = await step_decider.run(user_prompt=context)
+            self.registry.prompt_cache_stats.record(step_decider.name, result.usage())
+            logfire.info(f"Step decision completed: {result.data}")
+            logfire.info(f"Step decision agent new messages : {result.new_messages()}")
+
+            return True, result.data, None
+
+        except Exception as e:
+            error_msg = f"Step decision failed: {str(e)}\n{traceback.format_exc()}"
+            logfire.error(error_msg)
+            return False, None, error_msg
+
+    async def _critique_step(self, task: str, output: str, plan: str) -> Tuple[bool, Optional[CritiqueOutput], Optional[str]]:
+        """Critique the latest step, together with the next agent selection in merged mode"""
+        if self.merged_step_decision:
+            return await self.decide_next_step(task, output, plan, self.context.execution_history)
+        return await self.critique_execution(task, output, plan, self.context.execution_history)
+
+    async def _complete_task(self, task: str, stream_output: StreamResponse, critique_result: CritiqueOutput) -> None:
+        final_answer = critique_result.final_response or await self.prepare_final_answer(task)
+        stream_output.output = final_answer
+        stream_output.status_code = 200
+        self.orchestrator_response.append(stream_output)
+        await self._safe_websocket_send(stream_output, final=True)
+
     async def prepare_final_answer(self, task: str) -> str:
         """Prepare final answer when task is complete"""
         try:
@@ -521,7 +458,8 @@ class SystemOrchestrator:
                 system_prompt=""
             )
             
-            result = await final_agent.run(final_message, message_history=self.context.chat_history)
+            message_history = await self.context.chat_history.get_messages()
+            result = await final_agent.run(final_message, message_history=message_history)
             return result.data
 
         except Exception as e:
@@ -529,9 +467,11 @@ class SystemOrchestrator:
             logfire.error(error_msg)
             return f"Task completed but failed to generate final answer: {error_msg}"
 
-    async def run(self, task: str, websocket: WebSocket) -> List[Dict[str, Any]]:
+    async def run(self, task: str, websocket: WebSocket,
+                  cancellation_token: Optional[CancellationToken] = None) -> List[Dict[str, Any]]:
         """Main orchestration loop with comprehensive error handling"""
         self.websocket = websocket
+        self.cancellation_token = cancellation_token or CancellationToken()
         stream_output = StreamResponse(
             agent_name="Orchestrator",
             instructions=task,
@@ -544,26 +484,61 @@ class SystemOrchestrator:
             # Initialize system
             await self._safe_websocket_send(stream_output)
             self.agents = await self.initialize_agents()
+            if self.context.executor_deps:
+                self.context.executor_deps.cancellation_token = self.cancellation_token
             stream_output.steps.append("Agents initialized successfully")
             await self._safe_websocket_send(stream_output)
 
             # Generate initial plan
             logfire.info("Generating the Plan")
-            success, plan, error = await self.generate_plan(task)
+            dag_plan: Optional[DagPlan] = None
+            if self.dag_mode:
+                success, dag_plan, error = await self.generate_dag_plan(task)
+                if not success:
+                    stream_output.steps.append(f"Dependency plan generation failed, planning sequentially: {error}")
+            if dag_plan is not None:
+                plan = dag_plan.render()
+            else:
+                success, plan, error = await self.generate_plan(task)
             logfire.info(f"Generated Plan: {plan}")
             if not success:
                 stream_output.steps.append(f"Plan generation failed: {error}")
                 stream_output.status_code = 500
+                await self._safe_websocket_send(stream_output, final=True)
                 return [asdict(stream_output)]
 
             self.context.current_plan = plan
+            # Next agent chosen by the previous merged step decision, if any
+            next_selection: Optional[AgentSelectorOutput] = None
+            task_complete = False
+
+            if dag_plan is not None:
+                # Run the planned steps, then continue step by step only if the critique asks for more
+                result = await self.execute_plan_dag(dag_plan, stream_output)
+                if result is not None:
+                    critique_success, critique_result, critique_error = await self._critique_step(task, result.output, plan)
+                    if not critique_success:
+                        stream_output.steps.append(f"Critique failed: {critique_error}")
+                    elif critique_result.terminate:
+                        await self._complete_task(task, stream_output, critique_result)
+                        task_complete = True
+                    else:
+                        plan = result.output
+                        if self.merged_step_decision:
+                            next_selection = critique_result.to_selector_output()
+
+            while not task_complete:
+                if self.cancellation_token.is_cancelled():
+                    raise asyncio.CancelledError()
 
-            while True:
                 # Select next agent
-                success, selector_output, error = await self.select_next_agent(plan)
-                if not success:
-                    stream_output.steps.append(f"Agent selection failed: {error}")
-                    continue
+                if next_selection is not None:
+                    selector_output, next_selection = next_selection, None
+                else:
+                    success, selector_output, error = await self.select_next_agent(plan)
+                    if not success:
+                        stream_output.steps.append(f"Agent selection failed: {error}")
+                        continue
 
                 # Find appropriate agent instance
                 selected_agent = next(
@@ -581,6 +556,7 @@ class SystemOrchestrator:
                     selector_output.instruction
                 )
                 self.context.execution_history.append(result)
+                self.context.execution_digest.add(result)
 
                 if not result.success:
                     # Handle retry logic
@@ -596,25 +572,22 @@ class SystemOrchestrator:
                         # Continue with next agent instead of failing completely
                         continue
 
-                # Critique execution
-                critique_success, critique_result, critique_error = await self.critique_execution(
-                    task, result.output, plan, self.context.execution_history
-                )
+                # Critique execution, together with the next agent selection in merged mode
+                critique_success, critique_result, critique_error = await self._critique_step(task, result.output, plan)
 
                 if not critique_success:
                     stream_output.steps.append(f"Critique failed: {critique_error}")
                     continue
 
                 if critique_result.terminate:
-                    final_answer = critique_result.final_response or await self.prepare_final_answer(task)
-                    stream_output.output = final_answer
-                    stream_output.status_code = 200
-                    self.orchestrator_response.append(stream_output)
-                    await self._safe_websocket_send(stream_output)
+                    await self._complete_task(task, stream_output, critique_result)
                     break
 
                 plan = result.output
-                
+                if self.merged_step_decision:
+                    # Falls back to the selector when the decision names no next agent
+                    next_selection = critique_result.to_selector_output()
+
                 # Update stream output with progress
                 stream_output.steps.append(f"Completed step with {selected_agent.name}")
                 await self._safe_websocket_send(stream_output)
@@ -622,6 +595,14 @@ class SystemOrchestrator:
             logfire.info("Task completed successfully")
             return [asdict(i) for i in self.orchestrator_response]
 
+        except asyncio.CancelledError:
+            logfire.info("Task cancelled")
+            stream_output.output = "Task cancelled"
+            stream_output.status_code = 499
+            self.orchestrator_response.append(stream_output)
+            await self._safe_websocket_send(stream_output, final=True)
+            raise
+
         except Exception as e:
             error_msg = f"Critical orchestration error: {str(e)}\n{traceback.format_exc()}"
             logfire.error(error_msg)
@@ -630,15 +611,19 @@ class SystemOrchestrator:
                 stream_output.output = error_msg
                 stream_output.status_code = 500
                 self.orchestrator_response.append(stream_output)
-                await self._safe_websocket_send(stream_output)
+                await self._safe_websocket_send(stream_output, final=True)
             
             # Even in case of critical error, return what we have
             return [asdict(i) for i in self.orchestrator_response]
 
         finally:
             logfire.info("Orchestration process complete")
+            try:
+                await self.registry.release_executor_deps(self.context.executor_deps)
+            except Exception as e:
+                logfire.error(f"Failed to stop the code executor: {str(e)}")
             # Clear any sensitive data
-            self.context = OrchestrationContext()  
+            self.context = OrchestrationContext(self.registry.history_summarizer)  
             
     def _get_agent_by_name(self, name: str) -> Optional[Union[FileSurfer, CoderAgent, Executor, WebSurfer, RAGAgent]]:
         """Helper method to find agent by name"""
@@ -655,7 +640,7 @@ class SystemOrchestrator:
             self.orchestrator_response = []
             
             # Reset context
-            self.context = OrchestrationContext()
+            self.context = OrchestrationContext(self.registry.history_summarizer)
             
             logfire.info("Orchestrator shutdown complete")
             
@@ -0,0 +1,145 @@
+from typing import Any, ClassVar, Dict, List, Optional
+
+from pydantic import BaseModel
+from pydantic_ai import Agent
+from pydantic_ai.models.openai import OpenAIModel
+
+from utils.prompts import (
+    ORCHESTRATOR_PLANNER_SYSTEM_PROMPT,
+    ORCHESTRATOR_SELECTOR_SYSTEM_PROMPT,
+    ORCHESTRATOR_CRITIQUE_SYSTEM_PROMPT,
+    ORCHESTRATOR_STEP_DECISION_SYSTEM_PROMPT,
+    ORCHESTRATOR_DAG_PLANNER_SYSTEM_PROMPT,
+)
+
+# Base Models
+class PlanModel(BaseModel):
+    """Model for the planning stage output"""
+    plan: str
+    metadata: Optional[Dict[str, Any]] = None
+
+class PlanStep(BaseModel):
+    """A step of a dependency-aware plan"""
+    id: str
+    agent: str
+    instruction: str
+    depends_on: List[str] = []
+
+class DagPlan(BaseModel):
+    """Model for the dependency-aware planning stage output"""
+    steps: List[PlanStep]
+
+    # The Executor runs the code written by the Coder, it has no instruction of its own to act on
+    CODER_AGENT: ClassVar[str] = "Coder Agent"
+    EXECUTOR_AGENT: ClassVar[str] = "Executor Agent"
+
+    def validation_error(self) -> Optional[str]:
+        """Describe why the plan cannot be run, or None if it is valid"""
+        if not self.steps:
+            return "The plan has no steps"
+        seen = set()
+        for step in self.steps:
+            if step.id in seen:
+                return f"Duplicate step id: {step.id}"
+            # Dependencies on later steps could form cycles, so they are rejected
+            unknown = [dependency for dependency in step.depends_on if dependency not in seen]
+            if unknown:
+                return f"Step {step.id} depends on unknown or later steps: {unknown}"
+            seen.add(step.id)
+        for step in self.steps:
+            if step.agent == self.EXECUTOR_AGENT and self.code_step(step) is None:
+                return f"Step {step.id} runs code but does not depend on a {self.CODER_AGENT} step"
+        return None
+
+    def code_step(self, step: PlanStep) -> Optional[str]:
+        """The id of the Coder step whose code an Executor step runs: the latest one in plan order it depends on, directly or not"""
+        ids = [plan_step.id for plan_step in self.steps]
+        depends_on = {plan_step.id: plan_step.depends_on for plan_step in self.steps}
+        agents = {plan_step.id: plan_step.agent for plan_step in self.steps}
+        ancestors = set()
+        stack = list(step.depends_on)
+        while stack:
+            step_id = stack.pop()
+            if step_id not in ancestors and step_id in depends_on:
+                ancestors.add(step_id)
+                stack.extend(depends_on[step_id])
+        coder_steps = [step_id for step_id in ancestors if agents[step_id] == self.CODER_AGENT]
+        return max(coder_steps, key=ids.index, default=None)
+
+    def render(self) -> str:
+        """Render the plan as bullet points for the other orchestrator agents"""
+        lines = []
+        for step in self.steps:
+            after = f" (after steps {', '.join(step.depends_on)})" if step.depends_on else ""
+            lines.append(f"- Step {step.id}{after}: {step.agent} - {step.instruction}")
+        return "\n".join(lines)
+
+class AgentSelectorOutput(BaseModel):
+    """Model for the agent selection output"""
+    next_speaker: str
+    instruction: str
+    explanation: str
+
+class CritiqueOutput(BaseModel):
+    """Model for critique stage output"""
+    feedback: str
+    terminate: bool
+    final_response: Optional[str] = None
+    retry_count: Optional[int] = 0
+
+class StepDecision(CritiqueOutput):
+    """Model for the merged critique and next agent selection output"""
+    next_speaker: Optional[str] = None
+    instruction: Optional[str] = None
+    explanation: Optional[str] = None
+
+    def to_selector_output(self) -> Optional[AgentSelectorOutput]:
+        """The selection part of the decision, or None if no next agent was chosen"""
+        if self.terminate or not self.next_speaker or not self.instruction:
+            return None
+        return AgentSelectorOutput(
+            next_speaker=self.next_speaker,
+            instruction=self.instruction,
+            explanation=self.explanation or ""
+        )
+
+class OrchestratorAgents:
+    """The planning, selector, critique and step decision agents of the orchestrator.
+
+    Their system prompts are fixed for a given set of agent descriptions, so
+    they are built once and reused by every task.
+    """
+
+    def __init__(self, model: OpenAIModel, agent_descriptions: str):
+        self.agent_descriptions = agent_descriptions
+        self.planner = Agent(
+            model=model,
+            name="Planner Agent",
+            system_prompt=ORCHESTRATOR_PLANNER_SYSTEM_PROMPT.format(agent_descriptions=agent_descriptions)
+        )
+        self.selector = Agent(
+            model=model,
+            name="Agent Selector",
+            system_prompt=ORCHESTRATOR_SELECTOR_SYSTEM_PROMPT.format(agent_descriptions=agent_descriptions),
+            result_type=AgentSelectorOutput
+        )
+        self.critique = Agent(
+            model=model,
+            name="Critique Agent",
+            system_prompt=ORCHESTRATOR_CRITIQUE_SYSTEM_PROMPT,
+            result_type=CritiqueOutput
+        )
+        # Plans with step dependencies, used when DAG mode is enabled
+        self.dag_planner = Agent(
+            model=model,
+            name="DAG Planner Agent",
+            system_prompt=ORCHESTRATOR_DAG_PLANNER_SYSTEM_PROMPT.format(agent_descriptions=agent_descriptions),
+            result_type=DagPlan
+        )
+        # Critique and next agent selection in a single call, used when merged step decisions are enabled
+        self.step_decider = Agent(
+            model=model,
+            name="Step Decision Agent",
+            system_prompt=ORCHESTRATOR_STEP_DECISION_SYSTEM_PROMPT.format(agent_descriptions=agent_descriptions),
+            result_type=StepDecision
+        )
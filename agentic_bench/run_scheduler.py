@@ -0,0 +1,127 @@
+import asyncio
+import heapq
+import itertools
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+
+import logfire
+
+# Called with the 1-based queue position of a waiting run whenever it changes
+PositionCallback = Callable[[int], Awaitable[None]]
+
+DEFAULT_MAX_CONCURRENT_RUNS = 4
+DEFAULT_MAX_QUEUED_RUNS = 32
+
+class SchedulerFullError(Exception):
+    """Raised when a run is submitted while the queue is full"""
+    pass
+
+class _Ticket:
+    """A run waiting for admission"""
+
+    def __init__(self, priority: int, seq: int):
+        self.priority = priority
+        self.seq = seq
+        self.admitted = False
+        self.changed = asyncio.Event()
+
+    def __lt__(self, other: "_Ticket") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+class RunScheduler:
+    """Admission control for orchestrator runs, shared by the whole server.
+
+    At most `max_concurrent_runs` runs execute at once. Further runs wait in
+    a queue ordered by priority (lower runs first) and then by arrival, and
+    are told their position whenever it changes. Once `max_queued_runs` runs
+    are waiting, new runs are rejected with SchedulerFullError.
+
+    Args:
+        max_concurrent_runs: Maximum number of runs executing at once.
+        max_queued_runs: Maximum number of runs waiting for admission.
+    """
+
+    def __init__(self, max_concurrent_runs: int = DEFAULT_MAX_CONCURRENT_RUNS,
+                 max_queued_runs: int = DEFAULT_MAX_QUEUED_RUNS):
+        if max_concurrent_runs < 1:
+            raise ValueError("max_concurrent_runs must be at least 1")
+        self.max_concurrent_runs = max_concurrent_runs
+        self.max_queued_runs = max_queued_runs
+        self._running = 0
+        self._queue: List[_Ticket] = []
+        self._seq = itertools.count()
+
+    @classmethod
+    def from_env(cls) -> "RunScheduler":
+        return cls(
+            max_concurrent_runs=int(os.getenv("AGENTIC_BENCH_MAX_CONCURRENT_RUNS", str(DEFAULT_MAX_CONCURRENT_RUNS))),
+            max_queued_runs=int(os.getenv("AGENTIC_BENCH_MAX_QUEUED_RUNS", str(DEFAULT_MAX_QUEUED_RUNS))),
+        )
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    def _position(self, ticket: _Ticket) -> int:
+        return 1 + sum(1 for other in self._queue if other < ticket)
+
+    def _notify_queue(self) -> None:
+        for ticket in self._queue:
+            ticket.changed.set()
+
+    def _release(self) -> None:
+        self._running -= 1
+        if self._queue and self._running < self.max_concurrent_runs:
+            ticket = heapq.heappop(self._queue)
+            ticket.admitted = True
+            self._running += 1
+            ticket.changed.set()
+        self._notify_queue()
+
+    async def _wait(self, ticket: _Ticket, on_position: Optional[PositionCallback]) -> None:
+        while not ticket.admitted:
+            await ticket.changed.wait()
+            ticket.changed.clear()
+            if ticket.admitted or on_position is None:
+                continue
+            try:
+                await on_position(self._position(ticket))
+            except Exception as e:
+                logfire.error(f"Failed to report queue position: {str(e)}")
+
+    @asynccontextmanager
+    async def admit(self, priority: int = 0, on_position: Optional[PositionCallback] = None) -> AsyncIterator[None]:
+        """Wait until the run may start and hold its slot for the duration of the block"""
+        if self._running < self.max_concurrent_runs and not self._queue:
+            self._running += 1
+        else:
+            if len(self._queue) >= self.max_queued_runs:
+                raise SchedulerFullError(
+                    f"Too many queued runs ({len(self._queue)}/{self.max_queued_runs}), try again later"
+                )
+            ticket = _Ticket(priority, next(self._seq))
+            heapq.heappush(self._queue, ticket)
+            # A higher priority run moves the runs behind it back
+            self._notify_queue()
+            logfire.info(f"Run queued at position {self._position(ticket)}")
+            try:
+                await self._wait(ticket, on_position)
+            except BaseException:
+                if ticket.admitted:
+                    # Admitted just as the waiter was cancelled, pass the slot on
+                    self._release()
+                else:
+                    self._queue.remove(ticket)
+                    heapq.heapify(self._queue)
+                    self._notify_queue()
+                raise
+
+        try:
+            yield
+        finally:
+            self._release()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The server imports its modules from agentic_bench/, as in `from utils import ...`
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,43 @@
+import asyncio
+import sys
+
+import pytest
+
+from utils import CancellationToken
+from utils.executors import ExecutionProfile
+from utils.executors.executor_utils import CodeBlock
+from utils.executors.kernel_code_executor import LocalKernelCodeExecutor
+
+# Spins for the given CPU seconds
+BUSY = """
+import time
+start = time.process_time()
+while time.process_time() - start < {seconds}:
+    pass
+"""
+
+def python_block(code: str) -> CodeBlock:
+    return CodeBlock(code=code, packages=[], language="python", human_input_or_command_line_args=[])
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Resource limits need POSIX")
+def test_cpu_limit_applies_per_block(tmp_path):
+    profile = ExecutionProfile(cpu_seconds=2, use_cgroup=False)
+    executor = LocalKernelCodeExecutor(timeout=30, work_dir=tmp_path, execution_profile=profile)
+
+    async def run():
+        try:
+            first = await executor.execute_code_blocks(
+                [python_block("kept = 42" + BUSY.format(seconds=1.5))], None, None, CancellationToken()
+            )
+            # Together with the first block, past the 2 seconds allowed to a single block
+            second = await executor.execute_code_blocks(
+                [python_block(BUSY.format(seconds=1.5) + "print(kept)")], None, None, CancellationToken()
+            )
+            return first, second
+        finally:
+            await executor.stop()
+
+    first, second = asyncio.run(run())
+    assert first.exit_code == 0, first.output
+    assert second.exit_code == 0, second.output
+    assert "42" in second.output
@@ -31,6 +31,14 @@ class CancellationToken:
             else:
                 self._callbacks.append(callback)
 
+    def remove_callback(self, callback: Callable[[], None]) -> None:
+        """Detach a callback attached with add_callback, once the call it cancels is over"""
+        with self._lock:
+            try:
+                self._callbacks.remove(callback)
+            except ValueError:
+                pass
+
     def link_future(self, future: Future[Any]) -> Future[Any]:
         """Link a pending async call to a token to allow its cancellation"""
         with self._lock:
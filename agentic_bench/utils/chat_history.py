@@ -0,0 +1,177 @@
+import os
+from dataclasses import replace
+from typing import List, Optional
+
+import logfire
+from pydantic_ai import Agent
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    RetryPromptPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+
+# Rough token estimate used for budgeting, close enough for English text and code
+CHARS_PER_TOKEN = 4
+
+DEFAULT_TOKEN_BUDGET = 12000
+DEFAULT_WINDOW_TOKENS = 4000
+DEFAULT_MAX_TOOL_RETURN_CHARS = 2000
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+def estimate_tokens(messages: List[ModelMessage]) -> int:
+    """Approximate the number of tokens the messages take in a prompt"""
+    chars = 0
+    for message in messages:
+        for part in message.parts:
+            if isinstance(part, ToolCallPart):
+                chars += len(part.tool_name) + len(part.args_as_json_str())
+            else:
+                content = getattr(part, "content", "")
+                chars += len(content) if isinstance(content, str) else len(str(content))
+    return chars // CHARS_PER_TOKEN
+
+def _is_turn_start(message: ModelMessage) -> bool:
+    """Whether the history can start at this message without orphaning tool results"""
+    return isinstance(message, ModelRequest) and not any(
+        isinstance(part, (ToolReturnPart, RetryPromptPart)) for part in message.parts
+    )
+
+def _render_transcript(messages: List[ModelMessage]) -> str:
+    lines = []
+    for message in messages:
+        for part in message.parts:
+            if isinstance(part, ToolCallPart):
+                lines.append(f"[tool call] {part.tool_name}({part.args_as_json_str()})")
+            elif isinstance(part, ToolReturnPart):
+                lines.append(f"[tool result] {part.tool_name}: {part.model_response_str()}")
+            elif isinstance(part, UserPromptPart):
+                lines.append(f"[user] {part.content}")
+            elif isinstance(message, ModelResponse):
+                lines.append(f"[assistant] {getattr(part, 'content', '')}")
+    return "\n".join(lines)
+
+class ChatHistoryManager:
+    """Keeps a chat history within a token budget.
+
+    The first message, which carries the system prompt, is always kept. When
+    the history grows past `token_budget`, the oldest turns are folded into a
+    rolling summary and only a window of the most recent turns of about
+    `window_tokens` is kept verbatim. Long tool results, such as raw pages
+    dumped by the File Surfer, are truncated as they are added.
+
+    Args:
+        name: Name used when logging token counts.
+        summarizer: Agent turning a transcript into a summary. Without one, older turns are dropped.
+        token_budget: Approximate number of tokens the history may take.
+        window_tokens: Approximate number of tokens of recent turns kept verbatim on compaction.
+        max_tool_return_chars: Tool results longer than this are truncated.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        summarizer: Optional[Agent] = None,
+        token_budget: Optional[int] = None,
+        window_tokens: Optional[int] = None,
+        max_tool_return_chars: Optional[int] = None,
+    ):
+        self.name = name
+        self._summarizer = summarizer
+        self.token_budget = token_budget or int(
+            os.getenv("AGENTIC_BENCH_HISTORY_TOKEN_BUDGET", str(DEFAULT_TOKEN_BUDGET))
+        )
+        self.window_tokens = window_tokens or int(
+            os.getenv("AGENTIC_BENCH_HISTORY_WINDOW_TOKENS", str(DEFAULT_WINDOW_TOKENS))
+        )
+        self.max_tool_return_chars = max_tool_return_chars or int(
+            os.getenv("AGENTIC_BENCH_HISTORY_MAX_TOOL_RETURN_CHARS", str(DEFAULT_MAX_TOOL_RETURN_CHARS))
+        )
+        self._messages: List[ModelMessage] = []
+        self._summary: Optional[str] = None
+        # Estimated tokens of the history returned by the last get_messages call
+        self.last_token_count: int = 0
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def _trim_tool_returns(self, message: ModelMessage) -> ModelMessage:
+        if not isinstance(message, ModelRequest):
+            return message
+        parts = []
+        for part in message.parts:
+            if (
+                isinstance(part, ToolReturnPart)
+                and isinstance(part.content, str)
+                and len(part.content) > self.max_tool_return_chars
+            ):
+                dropped = len(part.content) - self.max_tool_return_chars
+                part = replace(
+                    part,
+                    content=f"{part.content[:self.max_tool_return_chars]}\n... [{dropped} characters truncated]",
+                )
+            parts.append(part)
+        return replace(message, parts=parts)
+
+    def extend(self, messages: List[ModelMessage]) -> None:
+        self._messages.extend(self._trim_tool_returns(message) for message in messages)
+
+    def _window_start(self) -> Optional[int]:
+        """Index of the first message kept verbatim, or None if nothing can be folded"""
+        start = None
+        tokens = 0
+        for index in range(len(self._messages) - 1, 0, -1):
+            tokens += estimate_tokens([self._messages[index]])
+            if _is_turn_start(self._messages[index]):
+                if start is not None and tokens > self.window_tokens:
+                    break
+                start = index
+        # Only fold when there is something between the head and the window
+        if start is None or start <= 1:
+            return None
+        return start
+
+    def _view(self, messages: List[ModelMessage]) -> List[ModelMessage]:
+        if not self._summary:
+            return messages
+        summary = ModelRequest(parts=[UserPromptPart(content=f"{SUMMARY_PREFIX}{self._summary}")])
+        return messages[:1] + [summary] + messages[1:]
+
+    async def _summarize(self, messages: List[ModelMessage]) -> Optional[str]:
+        transcript = _render_transcript(messages)
+        if self._summary:
+            transcript = f"{SUMMARY_PREFIX}{self._summary}\n\nLater conversation:\n{transcript}"
+        try:
+            result = await self._summarizer.run(transcript)
+            return result.data
+        except Exception as e:
+            logfire.error(f"{self.name} history summarization failed: {str(e)}")
+            return None
+
+    async def get_messages(self) -> List[ModelMessage]:
+        """Return the history to send to the model, compacting it first if it is over budget"""
+        history = self._view(self._messages)
+        tokens = estimate_tokens(history)
+        if tokens > self.token_budget:
+            start = self._window_start()
+            if start is not None:
+                folded = self._messages[1:start]
+                summary = await self._summarize(folded) if self._summarizer else None
+                if summary is not None or self._summarizer is None:
+                    self._summary = summary or self._summary
+                    self._messages = self._messages[:1] + self._messages[start:]
+                    history = self._view(self._messages)
+                else:
+                    # The summary failed, leave the older turns out of this call only and retry next time
+                    history = self._view(self._messages[:1] + self._messages[start:])
+                compacted_tokens = estimate_tokens(history)
+                logfire.info(f"{self.name} history compacted from ~{tokens} to ~{compacted_tokens} tokens")
+                tokens = compacted_tokens
+
+        self.last_token_count = tokens
+        logfire.info(f"{self.name} history: {len(history)} messages, ~{tokens} tokens")
+        return history
@@ -0,0 +1,107 @@
+import hashlib
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+DEFAULT_MAX_ENTRY_CHARS = 1500
+DEFAULT_MAX_TOTAL_CHARS = 8000
+
+@dataclass
+class _DigestEntry:
+    agent_name: str
+    output_hash: str
+    text: str
+    # Step number (1-based) of the first identical output, if this one is a repeat
+    repeat_of: Optional[int] = None
+    compact: bool = False
+
+    def render(self, step: int) -> str:
+        if self.repeat_of is not None:
+            return f"Step {step} - Agent: {self.agent_name}\nOutput: same as step {self.repeat_of} (sha256 {self.output_hash})\n"
+        if self.compact:
+            return f"Step {step} - Agent: {self.agent_name}\nOutput: omitted to save space (sha256 {self.output_hash})\n"
+        return f"Step {step} - Agent: {self.agent_name}\nOutput (sha256 {self.output_hash}): {self.text}\n"
+
+class ExecutionDigest:
+    """Size-capped summary of the agent execution history, maintained as results arrive.
+
+    Each output is truncated to `max_entry_chars` and tagged with a short hash
+    of its full text. Exact repeats only reference the earlier step, so loops
+    remain visible without repeating the text. Once the digest grows past
+    `max_total_chars`, the oldest outputs are reduced to their hash.
+
+    Args:
+        max_entry_chars: Maximum characters kept of each output.
+        max_total_chars: Approximate maximum size of the rendered digest.
+    """
+
+    def __init__(self, max_entry_chars: Optional[int] = None, max_total_chars: Optional[int] = None):
+        self.max_entry_chars = max_entry_chars or int(
+            os.getenv("AGENTIC_BENCH_DIGEST_MAX_ENTRY_CHARS", str(DEFAULT_MAX_ENTRY_CHARS))
+        )
+        self.max_total_chars = max_total_chars or int(
+            os.getenv("AGENTIC_BENCH_DIGEST_MAX_TOTAL_CHARS", str(DEFAULT_MAX_TOTAL_CHARS))
+        )
+        self._entries: List[_DigestEntry] = []
+        self._rendered: List[str] = []
+        self._first_step_by_hash: Dict[str, int] = {}
+        self._total_chars = 0
+        # Number of oldest steps left out of the rendered digest entirely
+        self._dropped = 0
+
+    @classmethod
+    def from_results(cls, results: List) -> "ExecutionDigest":
+        digest = cls()
+        for result in results:
+            digest.add(result)
+        return digest
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, result) -> None:
+        """Add an AgentExecutionResult"""
+        output = result.output if result.success else (result.error_message or "")
+        output_hash = hashlib.sha256(f"{result.agent_name}\n{output}".encode("utf-8")).hexdigest()[:12]
+        step = len(self._entries) + 1
+
+        repeat_of = self._first_step_by_hash.get(output_hash)
+        if repeat_of is None:
+            self._first_step_by_hash[output_hash] = step
+        text = output
+        if repeat_of is None and len(text) > self.max_entry_chars:
+            text = f"{text[:self.max_entry_chars]}... [{len(output) - self.max_entry_chars} characters truncated]"
+
+        entry = _DigestEntry(agent_name=result.agent_name, output_hash=output_hash, text=text, repeat_of=repeat_of)
+        self._entries.append(entry)
+        rendered = entry.render(step)
+        self._rendered.append(rendered)
+        self._total_chars += len(rendered)
+        self._enforce_cap()
+
+    def _enforce_cap(self) -> None:
+        # The latest step is never reduced
+        for index in range(self._dropped, len(self._entries) - 1):
+            if self._total_chars <= self.max_total_chars:
+                return
+            entry = self._entries[index]
+            if entry.compact or entry.repeat_of is not None:
+                continue
+            entry.compact = True
+            rendered = entry.render(index + 1)
+            self._total_chars += len(rendered) - len(self._rendered[index])
+            self._rendered[index] = rendered
+
+        # Still too large with every older output reduced to its hash, leave the oldest steps out
+        while self._total_chars > self.max_total_chars and self._dropped < len(self._entries) - 1:
+            self._total_chars -= len(self._rendered[self._dropped])
+            self._dropped += 1
+
+    def render(self, exclude_last: bool = False) -> str:
+        """Render the digest, optionally without the latest result"""
+        rendered = self._rendered[self._dropped:]
+        if exclude_last:
+            rendered = rendered[:-1]
+        if self._dropped:
+            rendered = [f"({self._dropped} earlier steps omitted)\n"] + rendered
+        return "\n".join(rendered)
@@ -1,4 +1,22 @@
+from .dependency_cache import DependencyCache
+from .docker_client import close_docker_client, get_docker_client
 from .docker_code_executor import DockerCommandLineCodeExecutor
+from .docker_container_pool import DockerContainerPool
+from .execution_profile import ExecutionProfile
+from .kernel_code_executor import LocalKernelCodeExecutor
 from .local_code_executor import LocalCommandLineCodeExecutor
+from .result_cache import ExecutionResultCache
+from .venv_template import VenvTemplate
 
-__all__ = ["DockerCommandLineCodeExecutor", "LocalCommandLineCodeExecutor"]
+__all__ = [
+    "DependencyCache",
+    "DockerCommandLineCodeExecutor",
+    "DockerContainerPool",
+    "ExecutionProfile",
+    "ExecutionResultCache",
+    "LocalCommandLineCodeExecutor",
+    "LocalKernelCodeExecutor",
+    "VenvTemplate",
+    "close_docker_client",
+    "get_docker_client",
+]
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import re
+import shutil
+import time
+from hashlib import sha256
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 5 * 1024 ** 3
+
+# Where Docker sandbox containers see the cache
+DEPENDENCY_CACHE_MOUNT = "/dependency_cache"
+
+# Written into a built environment once it is complete, holding its size in bytes
+_COMPLETE_MARKER = ".complete"
+
+# Builds an environment: (packages, wheelhouse dir, target dir) -> None, raising on failure
+EnvironmentBuilder = Callable[[List[str], Path, Path], Awaitable[None]]
+
+def normalize_packages(packages: Iterable[str]) -> List[str]:
+    """Sorted, de-duplicated requirements with PEP 503 normalized project names"""
+    normalized = set()
+    for package in packages:
+        requirement = "".join(package.split()).lower()
+        if not requirement:
+            continue
+        match = re.match(r"[a-z0-9._-]+", requirement)
+        if match:
+            name = re.sub(r"[-_.]+", "-", match.group(0))
+            requirement = name + requirement[match.end():]
+        normalized.add(requirement)
+    return sorted(normalized)
+
+def _dir_size(path: Path) -> int:
+    return sum(file.stat().st_size for file in path.rglob("*") if file.is_file() and not file.is_symlink())
+
+class DependencyCache:
+    """Content-addressed cache of installed package sets, shared by the code executors.
+
+    An environment is a directory the packages were installed into with
+    `pip install --target`, keyed on the normalized package set and a tag for
+    the interpreter it was built for. Code sees it through PYTHONPATH. Wheels
+    are kept in a shared wheelhouse, so building a new set only downloads and
+    builds the wheels that are missing. Concurrent requests for the same set
+    share one build. Once the environments grow past `max_bytes`, the least
+    recently used ones that are not leased are evicted.
+
+    Args:
+        root: Directory holding the wheelhouse and the environments.
+        max_bytes: Disk space the environments may take.
+    """
+
+    def __init__(self, root: Union[Path, str] = Path("./dependency_cache"), max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = Path(root)
+        self.wheelhouse = self.root / "wheels"
+        self.envs_dir = self.root / "envs"
+        self.wheelhouse.mkdir(parents=True, exist_ok=True)
+        self.envs_dir.mkdir(parents=True, exist_ok=True)
+        self._max_bytes = max_bytes
+
+        # Key -> (build task, builder it runs)
+        self._builds: Dict[str, Tuple[asyncio.Task, EnvironmentBuilder]] = {}
+        self._leases: Dict[str, int] = {}
+
+        self._hits = 0
+        self._misses = 0
+        self._failures = 0
+        self._evictions = 0
+
+    @classmethod
+    def from_env(cls) -> "DependencyCache":
+        return cls(
+            root=os.getenv("AGENTIC_BENCH_DEPENDENCY_CACHE_DIR", "./dependency_cache"),
+            max_bytes=int(os.getenv("AGENTIC_BENCH_DEPENDENCY_CACHE_MAX_BYTES", str(DEFAULT_MAX_BYTES))),
+        )
+
+    @staticmethod
+    def key(packages: Iterable[str], tag: str) -> str:
+        content = "\n".join([tag, *normalize_packages(packages)])
+        return sha256(content.encode("utf-8")).hexdigest()[:24]
+
+    async def acquire(self, packages: Iterable[str], tag: str, build: EnvironmentBuilder) -> Path:
+        """Return the environment of the package set, building it on a miss.
+
+        The environment is leased and is not evicted until `release` is called with it.
+        """
+        key = self.key(packages, tag)
+        env_dir = self.envs_dir / key
+        self._leases[key] = self._leases.get(key, 0) + 1
+        try:
+            marker = env_dir / _COMPLETE_MARKER
+            if marker.exists():
+                self._hits += 1
+                # The marker's modification time orders environments for eviction
+                marker.touch()
+                return env_dir
+
+            self._misses += 1
+            # The first requester's builder runs the shared build. It may depend on that requester's
+            # container or interpreter, so if it fails the others retry once with their own builder.
+            retried = False
+            while True:
+                if key not in self._builds:
+                    self._builds[key] = (
+                        asyncio.create_task(self._build(key, normalize_packages(packages), build)), build
+                    )
+                task, owner = self._builds[key]
+                try:
+                    # A cancelled task stops waiting, the shared build carries on for the others
+                    await asyncio.shield(task)
+                    return env_dir
+                except Exception:
+                    if owner is build or retried:
+                        raise
+                    retried = True
+                    logger.info(f"Shared build of dependency environment {key} failed, building it again")
+        except BaseException:
+            self.release(env_dir)
+            raise
+
+    def volume(self) -> Dict[str, Dict[str, str]]:
+        """Docker volume binding of the cache at DEPENDENCY_CACHE_MOUNT"""
+        return {str(self.root.resolve()): {"bind": DEPENDENCY_CACHE_MOUNT, "mode": "rw"}}
+
+    def release(self, env_dir: Path) -> None:
+        key = env_dir.name
+        if key in self._leases:
+            self._leases[key] -= 1
+            if self._leases[key] <= 0:
+                del self._leases[key]
+
+    async def _build(self, key: str, packages: List[str], build: EnvironmentBuilder) -> None:
+        env_dir = self.envs_dir / key
+        staging_dir = self.envs_dir / f"{key}.{os.getpid()}.{time.monotonic_ns()}.tmp"
+        try:
+            await build(packages, self.wheelhouse, staging_dir)
+            size = await asyncio.to_thread(_dir_size, staging_dir)
+            (staging_dir / _COMPLETE_MARKER).write_text(str(size))
+            await asyncio.to_thread(shutil.rmtree, env_dir, True)
+            staging_dir.rename(env_dir)
+            logger.info(f"Built dependency environment {key} for {packages} ({size} bytes)")
+        except BaseException:
+            self._failures += 1
+            await asyncio.to_thread(shutil.rmtree, staging_dir, True)
+            raise
+        finally:
+            self._builds.pop(key, None)
+        await asyncio.to_thread(self._evict)
+
+    def _evict(self) -> None:
+        environments = []
+        total = 0
+        for marker in self.envs_dir.glob(f"*/{_COMPLETE_MARKER}"):
+            try:
+                size = int(marker.read_text() or 0)
+                environments.append((marker.stat().st_mtime, size, marker.parent))
+            except (OSError, ValueError):
+                continue
+            total += size
+        for _, size, env_dir in sorted(environments):
+            if total <= self._max_bytes:
+                break
+            if env_dir.name in self._leases:
+                continue
+            shutil.rmtree(env_dir, ignore_errors=True)
+            if env_dir.exists():
+                logger.warning(f"Failed to evict dependency environment {env_dir.name}")
+                continue
+            total -= size
+            self._evictions += 1
+            logger.info(f"Evicted dependency environment {env_dir.name} ({size} bytes)")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._hits + self._misses
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / lookups if lookups else 0.0,
+            "build_failures": self._failures,
+            "evictions": self._evictions,
+            "building": len(self._builds),
+            "leased": len(self._leases),
+        }
+
+async def _run_pip(python_executable: str, *args: str) -> None:
+    proc = await asyncio.create_subprocess_exec(
+        python_executable, "-m", "pip", *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, stderr = await proc.communicate()
+    if proc.returncode != 0:
+        raise ValueError(f"Pip {args[0]} failed. {stdout.decode()}, {stderr.decode()}")
+
+def local_environment_builder(python_executable: str) -> EnvironmentBuilder:
+    """Build environments on this machine with the given interpreter"""
+
+    async def build(packages: List[str], wheelhouse: Path, target: Path) -> None:
+        # Only the wheels missing from the wheelhouse are downloaded or built
+        await _run_pip(python_executable, "wheel", "--quiet", "--wheel-dir", str(wheelhouse),
+                       "--find-links", str(wheelhouse), *packages)
+        await _run_pip(python_executable, "install", "--quiet", "--no-index", "--find-links", str(wheelhouse),
+                       "--target", str(target), *packages)
+
+    return build
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import Any, Optional
+
+DEFAULT_READY_TIMEOUT = 60.0
+
+_client: Optional[Any] = None
+_client_lock = threading.Lock()
+
+def get_docker_client() -> Any:
+    """Return the process-wide Docker client, connecting on first use.
+
+    The client is thread-safe and keeps a pool of API connections, so every
+    executor and the container pool share it instead of reconnecting.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                try:
+                    import docker
+                    from docker.errors import DockerException
+                except ImportError as e:
+                    raise RuntimeError("Missing dependecies for DockerCommandLineCodeExecutor.") from e
+
+                try:
+                    _client = docker.from_env()
+                except DockerException as e:
+                    if "FileNotFoundError" in str(e):
+                        raise RuntimeError(
+                            "Failed to connect to Docker. Please ensure Docker is installed and running."
+                        ) from e
+                    raise
+                except Exception as e:
+                    raise RuntimeError(f"Unexpected error while connecting to Docker: {str(e)}") from e
+    return _client
+
+def close_docker_client() -> None:
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is not None:
+        client.close()
+
+async def wait_for_container_running(container: Any, timeout: float = DEFAULT_READY_TIMEOUT) -> None:
+    """Wait until the container runs, following Docker's events instead of polling.
+
+    Raises ValueError if the container dies or is not running within `timeout` seconds.
+    """
+    client = get_docker_client()
+    # Subscribe before checking the state, so a start in between is not missed
+    events = await asyncio.to_thread(
+        client.events, decode=True, filters={"container": container.id, "event": ["start", "die"]}
+    )
+
+    def next_state() -> Optional[str]:
+        for event in events:
+            return event.get("status") or event.get("Action")
+        return None
+
+    try:
+        await asyncio.to_thread(container.reload)
+        if container.status == "running":
+            return
+        state = await asyncio.wait_for(asyncio.to_thread(next_state), timeout=timeout)
+    except asyncio.TimeoutError:
+        raise ValueError(f"Container failed to start within {timeout} seconds")
+    finally:
+        # Closing the stream also unblocks a reader left behind by the timeout
+        events.close()
+
+    await asyncio.to_thread(container.reload)
+    if state != "start" or container.status != "running":
+        raise ValueError("Container failed to start")
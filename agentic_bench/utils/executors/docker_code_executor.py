@@ -2,19 +2,23 @@ from __future__ import annotations
 
 import asyncio
 import logging
+import os
 import shlex
 import sys
+import time
 import uuid
 from collections.abc import Sequence
+from functools import partial
 from hashlib import sha256
 from pathlib import Path
 from types import TracebackType
 from typing import Any, Callable, ClassVar, List, Optional, ParamSpec, Type, Union
-from dataclasses import asdict
-import json
 from utils.stream_response_format import StreamResponse
 from fastapi import WebSocket
 from utils import CancellationToken
+from .docker_client import get_docker_client, wait_for_container_running
+from .docker_container_pool import DockerContainerPool, PooledContainer
+from .dependency_cache import DEPENDENCY_CACHE_MOUNT, DependencyCache
 from .executor_utils import (
     CodeBlock,
     CodeExecutor,
@@ -22,6 +26,7 @@ from .executor_utils import (
     FunctionWithRequirementsStr,
 )
 from utils.executors.executor_utils.extract_command_line_args import extract_command_line_args
+from .executor_utils.output_buffer import OutputBuffer, OutputStreamer, max_output_bytes_from_env
 from .executor_utils._common import (
     CommandLineCodeResult,
     build_python_functions_file,
@@ -35,17 +40,8 @@ if sys.version_info >= (3, 11):
 else:
     from typing_extensions import Self
 
-async def _wait_for_ready(
-    container: Any, timeout: int = 60, stop_time: float = 0.1
-) -> None:
-    elapsed_time = 0.0
-    while container.status != "running" and elapsed_time < timeout:
-        await asyncio.sleep(stop_time)
-        elapsed_time += stop_time
-        await asyncio.to_thread(container.reload)
-        continue
-    if container.status != "running":
-        raise ValueError("Container failed to start")
+async def _wait_for_ready(container: Any, timeout: int = 60) -> None:
+    await wait_for_container_running(container, timeout=timeout)
 
 A = ParamSpec("A")
 
@@ -78,6 +74,13 @@ class DockerCommandLineCodeExecutor(CodeExecutor):
             the Python process exits with atext. Defaults to True.
         functions (List[Union[FunctionWithRequirements[Any, A], Callable[..., Any]]]): A list of functions that are available to the code executor. Default is an empty list.
         functions_module (str, optional): The name of the module that will be created to store the functions. Defaults to "functions".
+        container_pool (Optional[DockerContainerPool], optional): Pool to lease a warm container from instead of
+            creating one. The container and its working directory are handed back to the pool on stop. Defaults to None.
+        dependency_cache (Optional[DependencyCache], optional): Cache of installed package sets, mounted in the
+            container. When given, the required packages are taken from it and added to PYTHONPATH instead of
+            being installed in the container. Defaults to None.
+        max_output_bytes (Optional[int], optional): Maximum bytes of output kept per code block, split between its
+            beginning and its end, the middle is discarded. Defaults to the AGENTIC_BENCH_EXECUTOR_MAX_OUTPUT_BYTES environment variable or 1 MB.
     """
 
     SUPPORTED_LANGUAGES: ClassVar[List[str]] = [
@@ -116,6 +119,9 @@ $functions"""
             ]
         ] = [],
         functions_module: str = "functions",
+        container_pool: Optional[DockerContainerPool] = None,
+        dependency_cache: Optional[DependencyCache] = None,
+        max_output_bytes: Optional[int] = None,
     ):
         if timeout < 1:
             raise ValueError("Timeout must be greater than or equal to 1.")
@@ -151,6 +157,14 @@ $functions"""
         self._setup_functions_complete = False
         self.websocket:Optional[WebSocket]= None
         self.stream_output:Optional[StreamResponse] = None
+        self._container_pool = container_pool
+        self._lease: Optional[PooledContainer] = None
+        # Set once the container was changed beyond its working directory, so the pool recycles it
+        self._dirty = False
+        self._dependency_cache = dependency_cache
+        # Leased environment of the required packages, added to PYTHONPATH
+        self._dependency_env: Optional[Path] = None
+        self._max_output_bytes = max_output_bytes or max_output_bytes_from_env()
         # else:
         #     self._setup_functions_complete = True
 
@@ -179,18 +193,54 @@ $functions"""
         """(Experimental) The binding directory for the code execution container."""
         return self._bind_dir
 
+    def _container_cache_path(self, path: Path) -> str:
+        """Path inside the container of a path under the mounted dependency cache"""
+        return str(Path(DEPENDENCY_CACHE_MOUNT) / path.relative_to(self._dependency_cache.root))
+
+    async def _build_dependency_env(self, packages: List[str], wheelhouse: Path, target: Path) -> None:
+        # Built inside the container, so the wheels match its interpreter
+        wheelhouse_path = self._container_cache_path(wheelhouse)
+        commands = [
+            ["python", "-m", "pip", "wheel", "--quiet", "--wheel-dir", wheelhouse_path,
+             "--find-links", wheelhouse_path, *packages],
+            ["python", "-m", "pip", "install", "--quiet", "--no-index", "--find-links", wheelhouse_path,
+             "--target", self._container_cache_path(target), *packages],
+        ]
+        # Run as the server's user, so the server can mark the environment complete and evict it later
+        user = f"{os.getuid()}:{os.getgid()}" if hasattr(os, "getuid") else ""
+        for command in commands:
+            exit_code, output = await asyncio.to_thread(
+                self._container.exec_run, command, user=user, environment={"HOME": "/tmp"}
+            )
+            if exit_code != 0:
+                raise ValueError(f"Pip {command[3]} failed. {output.decode('utf-8', errors='replace')}")
+
+    @property
+    def result_cache_scope(self) -> Optional[str]:
+        """What results of this executor depend on besides the code block, None if they cannot be cached"""
+        return f"docker-{self._image}"
+
     async def install_packages(self, packages):
-        import docker
-        client = docker.from_env()
+        if self._dependency_cache is not None:
+            if self.stream_output and self.websocket:
+                await self.stream_output.add_step(
+                    self.websocket, "Loading the code dependencies from the dependency cache"
+                )
+            try:
+                self._dependency_env = await self._dependency_cache.acquire(
+                    packages, f"docker-{self._image}", self._build_dependency_env
+                )
+                return
+            except Exception as e:
+                logging.warning(f"Dependency cache failed, installing the packages in the container: {e}")
+
         command = f"pip install {' '.join(packages)}"
         if self.stream_output and self.websocket:
-            self.stream_output.steps.append(
-                "Installing the code dependencies in your docker environment before the code execution"
-            )
-            await self.websocket.send_text(
-                json.dumps(asdict(self.stream_output))
+            await self.stream_output.add_step(
+                self.websocket, "Installing the code dependencies in your docker environment before the code execution"
             )
-        exit_code, output = self._container.exec_run(command)
+        self._dirty = True
+        exit_code, output = await asyncio.to_thread(self._container.exec_run, command)
         if exit_code == 0:
             print("packages installed successfully")
         else:
@@ -205,12 +255,7 @@ $functions"""
             log="Ensuring packages are installed in executor."
             logging.info(log)
             if self.stream_output and self.websocket:
-                self.stream_output.steps.append(
-                    log
-                )
-                await self.websocket.send_text(
-                    json.dumps(asdict(self.stream_output))
-                )
+                await self.stream_output.add_step(self.websocket, log)
 
 
             packages = shlex.join(required_packages)
@@ -248,6 +293,7 @@ $functions"""
             raise ValueError("No code blocks to execute.")
 
         outputs: List[str] = []
+        wall_time = 0.0
         files: List[Path] = []
         last_exit_code = 0
         for code_block in code_blocks:
@@ -261,11 +307,8 @@ $functions"""
                 last_exit_code = 1
                 break
             if self.stream_output and self.websocket:
-                self.stream_output.steps.append(
-                    f"Saving the code in a file under the directory: {self._work_dir}"
-                )
-                await self.websocket.send_text(
-                    json.dumps(asdict(self.stream_output))
+                await self.stream_output.add_step(
+                    self.websocket, f"Saving the code in a file under the directory: {self._work_dir}"
                 )
             if not filename:
                 filename = f"tmp_code_{sha256(code.encode()).hexdigest()}.{lang}"
@@ -282,15 +325,12 @@ $functions"""
 
             command = ["timeout", str(self._timeout), lang_to_cmd(lang), filename, *command_line_args]
             if self.stream_output and self.websocket:
-                self.stream_output.steps.append(
-                    "Executing the generated code in your safe environment"
+                await self.stream_output.add_step(
+                    self.websocket, "Executing the generated code in your safe environment"
                 )
-                await self.websocket.send_text(
-                    json.dumps(asdict(self.stream_output))
-                )
-            result = await asyncio.to_thread(self._container.exec_run, command)  # type: ignore
-            exit_code = result.exit_code
-            output = result.output.decode("utf-8")
+            start_time = time.monotonic()
+            exit_code, output = await self._exec_streaming(command, cancellation_token)
+            wall_time += time.monotonic() - start_time
             if exit_code == 124:
                 output += "\n Timeout"
             outputs.append(output)
@@ -305,9 +345,84 @@ $functions"""
         print("logs all", "".join(outputs))
         
         return CommandLineCodeResult(
-            exit_code=last_exit_code, output="".join(outputs), code_file=code_file
+            exit_code=last_exit_code, output="".join(outputs), code_file=code_file, wall_time=wall_time
         )
 
+    async def _exec_streaming(
+        self, command: List[str], cancellation_token: CancellationToken
+    ) -> tuple[int, str]:
+        """Run a command in the container, streaming its output as it is produced.
+
+        The beginning and the end of the output are kept, up to
+        `max_output_bytes`, and the beginning is streamed. On
+        cancellation the process is killed inside the container and
+        asyncio.CancelledError is raised.
+        """
+        api = self._container.client.api  # type: ignore
+        # The shell records the pid of the command, so it can be signalled later, and removes it once it exits
+        pid_file = f"/tmp/agentic_bench_exec_{uuid.uuid4().hex}.pid"
+        script = f'"$@" & echo $! > {pid_file}; wait $!; code=$?; rm -f {pid_file}; exit $code'
+        wrapped = ["sh", "-c", script, "sh", *command]
+        environment = {}
+        if self._dependency_env is not None:
+            environment["PYTHONPATH"] = self._container_cache_path(self._dependency_env)
+        exec_id = (await asyncio.to_thread(
+            api.exec_create, self._container.id, wrapped, workdir="/code_files", environment=environment
+        ))["Id"]  # type: ignore
+
+        loop = asyncio.get_running_loop()
+        chunks: asyncio.Queue[Optional[tuple[str, bytes]]] = asyncio.Queue()
+
+        def pump() -> None:
+            # Blocking reads of the demuxed (stdout, stderr) frames, handed over to the event loop
+            try:
+                for stdout, stderr in api.exec_start(exec_id, stream=True, demux=True):
+                    if stdout:
+                        loop.call_soon_threadsafe(chunks.put_nowait, ("stdout", stdout))
+                    if stderr:
+                        loop.call_soon_threadsafe(chunks.put_nowait, ("stderr", stderr))
+            finally:
+                loop.call_soon_threadsafe(chunks.put_nowait, None)
+
+        reader = asyncio.ensure_future(asyncio.to_thread(pump))
+
+        def kill() -> None:
+            loop.call_soon_threadsafe(lambda: asyncio.ensure_future(self._kill_exec(pid_file)))
+
+        cancellation_token.add_callback(kill)
+
+        send = None
+        if self.stream_output and self.websocket:
+            send = partial(self.stream_output.send_output_chunk, self.websocket)
+        streamer = OutputStreamer(OutputBuffer(self._max_output_bytes), send)
+        try:
+            while (chunk := await chunks.get()) is not None:
+                await streamer.write(*chunk)
+            await reader
+            await streamer.close()
+        except asyncio.CancelledError:
+            streamer.cancel()
+            await asyncio.shield(self._kill_exec(pid_file))
+            raise
+        finally:
+            cancellation_token.remove_callback(kill)
+
+        if cancellation_token.is_cancelled():
+            raise asyncio.CancelledError()
+
+        exit_code = (await asyncio.to_thread(api.exec_inspect, exec_id))["ExitCode"]
+        return exit_code, streamer.buffer.getvalue()
+
+    async def _kill_exec(self, pid_file: str) -> None:
+        """Stop a command started by _exec_streaming, the timeout wrapper forwards the signal to it"""
+        if self._container is None:
+            return
+        script = f'[ -f {pid_file} ] && kill -TERM "$(cat {pid_file})" 2>/dev/null; sleep 1; [ -f {pid_file} ] && kill -KILL "$(cat {pid_file})" 2>/dev/null; rm -f {pid_file}'
+        try:
+            await asyncio.to_thread(self._container.exec_run, ["sh", "-c", script])
+        except Exception as e:
+            logging.warning(f"Failed to kill the running command: {e}")
+
     async def execute_code_blocks(
         self, code_blocks: List[CodeBlock], 
         websocket:WebSocket,stream_output:StreamResponse, cancellation_token: CancellationToken
@@ -321,11 +436,6 @@ $functions"""
             CommandlineCodeResult: The result of the code execution."""
         self.websocket=websocket
         self.stream_output=stream_output
-        def raise_not_implemented() -> None:
-            raise NotImplementedError(
-                "Cancellation is not yet supported for DockerCommandLineCodeExecutor"
-            )
-        cancellation_token.add_callback(lambda: raise_not_implemented())
 
         if not self._setup_functions_complete:
             await self._setup_functions(code_blocks, cancellation_token)
@@ -351,18 +461,29 @@ $functions"""
     async def stop(self) -> None:
         """(Experimental) Stop the code executor."""
 
+        if self._dependency_env is not None:
+            self._dependency_cache.release(self._dependency_env)
+            self._dependency_env = None
+
         if not self._running:
             return
 
+        if self._lease is not None:
+            lease, self._lease = self._lease, None
+            self._container = None
+            self._running = False
+            self._setup_functions_complete = False
+            await self._container_pool.release(lease, dirty=self._dirty)
+            return
+
         try:
-            import docker
             from docker.errors import NotFound
         except ImportError as e:
             raise RuntimeError(
                 "Missing dependecies for DockerCommandLineCodeExecutor."
             ) from e
 
-        client = docker.from_env()
+        client = get_docker_client()
         try:
             container = await asyncio.to_thread(
                 client.containers.get, self.container_name
@@ -374,28 +495,28 @@ $functions"""
             self._running = False
 
     async def start(self) -> None:
+        if self._container_pool is not None:
+            # A warm container comes with its own working directory bound to /code_files
+            self._lease = await self._container_pool.lease()
+            self._container = self._lease.container
+            self.container_name = self._lease.name
+            self._work_dir = self._lease.work_dir
+            self._bind_dir = self._lease.work_dir
+            self._image = self._container_pool.image
+            self._dirty = False
+            self._running = True
+            return
+
         try:
             import asyncio_atexit
-            import docker
-            from docker.errors import DockerException, ImageNotFound
+            from docker.errors import ImageNotFound
         except ImportError as e:
             raise RuntimeError(
                 "Missing dependecies for DockerCommandLineCodeExecutor."
             ) from e
 
         # Start a container from the image, read to exec commands later
-        try:
-            client = docker.from_env()
-        except DockerException as e:
-            if "FileNotFoundError" in str(e):
-                raise RuntimeError(
-                    "Failed to connect to Docker. Please ensure Docker is installed and running."
-                ) from e
-            raise
-        except Exception as e:
-            raise RuntimeError(
-                f"Unexpected error while connecting to Docker: {str(e)}"
-            ) from e
+        client = get_docker_client()
 
         # Check if the image exists
         try:
@@ -415,7 +536,8 @@ $functions"""
                 detach=True,
                 auto_remove=self._auto_remove,
                 volumes={
-                    str(self._bind_dir.resolve()): {"bind": "/code_files", "mode": "rw"}
+                    str(self._bind_dir.resolve()): {"bind": "/code_files", "mode": "rw"},
+                    **(self._dependency_cache.volume() if self._dependency_cache else {}),
                 },
                 working_dir="/code_files",
             )
@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import shutil
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional, Set, Union
+
+from .dependency_cache import DependencyCache
+from .docker_client import get_docker_client, wait_for_container_running
+
+logger = logging.getLogger(__name__)
+
+_RESET_SCRIPT = (
+    "kill -9 -1 2>/dev/null; "
+    "rm -rf /tmp/* /tmp/.[!.]* /var/tmp/* /var/tmp/.[!.]*; "
+    "find /code_files -mindepth 1 -delete"
+)
+
+@dataclass
+class PooledContainer:
+    """A warm container and the host directory bound to its /code_files"""
+
+    container: Any
+    name: str
+    work_dir: Path
+    uses: int = 0
+
+class DockerContainerPool:
+    """Keeps warm Docker sandbox containers ready to be leased by code executors.
+
+    Each container gets its own working directory, bound to /code_files, so
+    leases never see each other's files. A released container is reset by
+    killing the processes the lease left behind and wiping its working
+    directory and temporary directories, and goes back to the pool. It is
+    recycled instead (stopped and replaced by a fresh one) when it was marked
+    dirty, for example after packages were installed in it, when it has served
+    `max_uses` leases, when it stopped running, or when processes survived the
+    reset. The pool is refilled in the background.
+
+    Args:
+        image: Docker image of the containers.
+        size: Number of idle containers kept warm.
+        work_dir: Directory under which the per-container working directories are created.
+        max_uses: Number of leases after which a container is recycled.
+        lease_timeout: Seconds to wait for a container before giving up.
+        dependency_cache: Cache of installed package sets to mount in the containers.
+    """
+
+    def __init__(
+        self,
+        image: str = "python:3-slim",
+        size: int = 2,
+        work_dir: Union[Path, str] = Path("./code_files"),
+        max_uses: int = 20,
+        lease_timeout: float = 120.0,
+        dependency_cache: Optional[DependencyCache] = None,
+    ):
+        self._image = image
+        self._size = size
+        self._work_dir = Path(work_dir)
+        self._max_uses = max_uses
+        self._lease_timeout = lease_timeout
+        self._dependency_cache = dependency_cache
+
+        self._idle: asyncio.Queue[PooledContainer] = asyncio.Queue()
+        self._creating = 0
+        self._waiters = 0
+        self._background_tasks: Set[asyncio.Task] = set()
+        self._image_ready = False
+        self._closed = False
+
+        self._hits = 0
+        self._misses = 0
+        self._failures = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    @classmethod
+    def from_env(cls, dependency_cache: Optional[DependencyCache] = None) -> "DockerContainerPool":
+        return cls(
+            dependency_cache=dependency_cache,
+            image=os.getenv("AGENTIC_BENCH_DOCKER_IMAGE", "python:3-slim"),
+            size=int(os.getenv("AGENTIC_BENCH_DOCKER_POOL_SIZE", "2")),
+            max_uses=int(os.getenv("AGENTIC_BENCH_DOCKER_POOL_MAX_USES", "20")),
+            lease_timeout=float(os.getenv("AGENTIC_BENCH_DOCKER_POOL_LEASE_TIMEOUT", "120")),
+        )
+
+    async def _ensure_image(self, client: Any) -> None:
+        if self._image_ready:
+            return
+        from docker.errors import ImageNotFound
+
+        try:
+            await asyncio.to_thread(client.images.get, self._image)
+        except ImageNotFound:
+            logger.info(f"Pulling image {self._image}...")
+            await asyncio.to_thread(client.images.pull, self._image)
+        self._image_ready = True
+
+    async def _create(self) -> PooledContainer:
+        client = get_docker_client()
+        await self._ensure_image(client)
+
+        name = f"agentic-bench-code-exec-{uuid.uuid4()}"
+        work_dir = self._work_dir / name
+        work_dir.mkdir(parents=True, exist_ok=True)
+        container = None
+        try:
+            container = await asyncio.to_thread(
+                client.containers.create,
+                self._image,
+                name=name,
+                entrypoint="/bin/sh",
+                tty=True,
+                detach=True,
+                auto_remove=True,
+                volumes={
+                    str(work_dir.resolve()): {"bind": "/code_files", "mode": "rw"},
+                    **(self._dependency_cache.volume() if self._dependency_cache else {}),
+                },
+                working_dir="/code_files",
+            )
+            await asyncio.to_thread(container.start)
+            await wait_for_container_running(container)
+        except BaseException:
+            # A container that never ran is not removed automatically
+            await asyncio.shield(asyncio.to_thread(self._discard, name, container, work_dir))
+            raise
+        return PooledContainer(container=container, name=name, work_dir=work_dir)
+
+    @staticmethod
+    def _discard(name: str, container: Any, work_dir: Path) -> None:
+        """Remove a container that failed to start, and its working directory"""
+        if container is not None:
+            try:
+                container.remove(force=True)
+            except Exception as e:
+                logger.warning(f"Failed to remove container {name}: {e}")
+        shutil.rmtree(work_dir, True)
+
+    @property
+    def image(self) -> str:
+        return self._image
+
+    def _spawn(self, coroutine: Any) -> None:
+        task = asyncio.create_task(coroutine)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _create_into_pool(self) -> None:
+        try:
+            pooled = await self._create()
+        except Exception as e:
+            self._failures += 1
+            logger.error(f"Failed to create pooled container: {e}")
+            return
+        finally:
+            self._creating -= 1
+        if self._closed:
+            await self._destroy(pooled)
+        else:
+            self._idle.put_nowait(pooled)
+
+    def _replenish(self) -> None:
+        """Start creating containers until the pool and every waiting lease are covered"""
+        if self._closed:
+            return
+        missing = self._size + self._waiters - self._idle.qsize() - self._creating
+        for _ in range(max(missing, 0)):
+            self._creating += 1
+            self._spawn(self._create_into_pool())
+
+    async def start(self) -> None:
+        """Fill the pool in the background"""
+        self._replenish()
+
+    async def lease(self) -> PooledContainer:
+        """Take a warm container, waiting for one to be created if the pool is empty"""
+        if self._closed:
+            raise RuntimeError("The container pool is closed")
+        start_time = time.monotonic()
+        if not self._idle.empty():
+            pooled = self._idle.get_nowait()
+            self._hits += 1
+        else:
+            self._misses += 1
+            self._waiters += 1
+            try:
+                self._replenish()
+                pooled = await asyncio.wait_for(self._idle.get(), timeout=self._lease_timeout)
+            except asyncio.TimeoutError:
+                raise RuntimeError(
+                    f"No sandbox container became available within {self._lease_timeout} seconds"
+                )
+            finally:
+                self._waiters -= 1
+        wait_time = time.monotonic() - start_time
+        self._total_wait += wait_time
+        self._max_wait = max(self._max_wait, wait_time)
+        # Keep the pool topped up for the next lease
+        self._replenish()
+        return pooled
+
+    async def _reset(self, pooled: PooledContainer) -> bool:
+        """Stop what the last lease left running and wipe its files, returns False if the container is unusable"""
+        try:
+            await asyncio.to_thread(pooled.container.reload)
+            if pooled.container.status != "running":
+                return False
+
+            # Background processes of the last lease would otherwise run on in the next one. The kill spares
+            # PID 1 and the shell sending it. Wiped from inside the container, files written there may not be
+            # removable from the host.
+            result = await asyncio.to_thread(pooled.container.exec_run, ["sh", "-c", _RESET_SCRIPT])
+            if result.exit_code != 0:
+                return False
+
+            # Anything still there besides the init process, unkillable or not yet reaped, gets a fresh container
+            top = await asyncio.to_thread(pooled.container.top)
+            return len(top.get("Processes") or []) <= 1
+        except Exception as e:
+            logger.error(f"Failed to reset pooled container {pooled.name}: {e}")
+            return False
+
+    async def _destroy(self, pooled: PooledContainer) -> None:
+        try:
+            # Containers are created with auto_remove, stopping them removes them
+            await asyncio.to_thread(pooled.container.stop)
+        except Exception as e:
+            logger.warning(f"Failed to stop pooled container {pooled.name}: {e}")
+        await asyncio.to_thread(shutil.rmtree, pooled.work_dir, True)
+
+    async def release(self, pooled: PooledContainer, dirty: bool = False) -> None:
+        """Return a leased container, resetting or recycling it"""
+        pooled.uses += 1
+        reuse = (
+            not self._closed
+            and not dirty
+            and pooled.uses < self._max_uses
+            and self._idle.qsize() < self._size + self._waiters
+            and await self._reset(pooled)
+        )
+        if reuse:
+            self._idle.put_nowait(pooled)
+        else:
+            self._spawn(self._destroy(pooled))
+            self._replenish()
+
+    def stats(self) -> Dict[str, Any]:
+        leases = self._hits + self._misses
+        return {
+            "size": self._size,
+            "idle": self._idle.qsize(),
+            "creating": self._creating,
+            "leases": leases,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / leases if leases else 0.0,
+            "creation_failures": self._failures,
+            "avg_lease_wait_seconds": self._total_wait / leases if leases else 0.0,
+            "max_lease_wait_seconds": self._max_wait,
+        }
+
+    async def close(self) -> None:
+        """Stop every idle container. Leased containers are stopped when released"""
+        self._closed = True
+        while not self._idle.empty():
+            await self._destroy(self._idle.get_nowait())
+        tasks = list(self._background_tasks)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sys
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+
+# Runs the program as its only child and reports its CPU time and peak RSS, as
+# measured by wait4, to the file given as first argument. Exits like the program.
+_ACCOUNTING_WRAPPER = """
+import json, os, sys
+usage_file, argv = sys.argv[1], sys.argv[2:]
+pid = os.fork()
+if pid == 0:
+    try:
+        os.execvp(argv[0], argv)
+    finally:
+        os._exit(127)
+_, status, usage = os.wait4(pid, 0)
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+scale = 1 if sys.platform == "darwin" else 1024
+with open(usage_file, "w") as f:
+    json.dump({"cpu_time": usage.ru_utime + usage.ru_stime, "peak_rss_bytes": usage.ru_maxrss * scale}, f)
+sys.exit(os.waitstatus_to_exitcode(status) if os.WIFEXITED(status) else 128 + os.WTERMSIG(status))
+"""
+
+def _optional_int(name: str, default: str) -> Optional[int]:
+    value = int(os.getenv(name, default))
+    return value if value > 0 else None
+
+@dataclass
+class ResourceUsage:
+    wall_time: float
+    cpu_time: Optional[float] = None
+    peak_rss_bytes: Optional[int] = None
+
+@dataclass
+class ExecutionProfile:
+    """Resource limits applied to every program run by the local executor.
+
+    Limits are set with setrlimit in the child before the program starts.
+    When cgroup v2 is available and delegated to this process, each run also
+    gets its own cgroup with `memory.max` and `pids.max` set, which, unlike
+    rlimits, cover every process the program starts. The cgroup is skipped if
+    it cannot be created. A limit of None is not applied.
+
+    Args:
+        cpu_seconds: CPU time after which the program is killed (RLIMIT_CPU).
+        memory_bytes: Address space limit (RLIMIT_AS), also the cgroup memory.max.
+        file_size_bytes: Largest file the program may write (RLIMIT_FSIZE).
+        max_processes: Process limit of the cgroup (pids.max). Not applied as an rlimit,
+            RLIMIT_NPROC counts every process of the user.
+        use_cgroup: Whether to try running the program in a cgroup.
+    """
+
+    cpu_seconds: Optional[int] = 60
+    memory_bytes: Optional[int] = 4 * 1024 ** 3
+    file_size_bytes: Optional[int] = 256 * 1024 ** 2
+    max_processes: Optional[int] = 256
+    use_cgroup: bool = True
+
+    @classmethod
+    def from_env(cls) -> "ExecutionProfile":
+        return cls(
+            cpu_seconds=_optional_int("AGENTIC_BENCH_EXECUTOR_CPU_SECONDS", "60"),
+            memory_bytes=_optional_int("AGENTIC_BENCH_EXECUTOR_MEMORY_BYTES", str(4 * 1024 ** 3)),
+            file_size_bytes=_optional_int("AGENTIC_BENCH_EXECUTOR_FILE_SIZE_BYTES", str(256 * 1024 ** 2)),
+            max_processes=_optional_int("AGENTIC_BENCH_EXECUTOR_MAX_PROCESSES", "256"),
+            use_cgroup=os.getenv("AGENTIC_BENCH_EXECUTOR_CGROUP", "true").lower() == "true",
+        )
+
+    @property
+    def supported(self) -> bool:
+        return os.name == "posix"
+
+    def wrap_command(self, program: str, args: List[str], usage_file: Path) -> List[str]:
+        """The command running the program under the accounting wrapper"""
+        return [sys.executable, "-c", _ACCOUNTING_WRAPPER, str(usage_file), program, *args]
+
+    def preexec_fn(self, cgroup: Optional[Path], cpu_limit: bool = True) -> Callable[[], None]:
+        """Set the limits in the child, without RLIMIT_CPU if `cpu_limit` is False"""
+        import resource
+
+        limits = [
+            (resource.RLIMIT_CPU, self.cpu_seconds if cpu_limit else None),
+            (resource.RLIMIT_AS, self.memory_bytes),
+            (resource.RLIMIT_FSIZE, self.file_size_bytes),
+        ]
+
+        def apply() -> None:
+            # Runs in the child between fork and exec, keep it to system calls
+            if cgroup is not None:
+                with open(cgroup / "cgroup.procs", "w") as f:
+                    f.write(str(os.getpid()))
+            for limit, value in limits:
+                if value is not None:
+                    _, hard = resource.getrlimit(limit)
+                    if hard != resource.RLIM_INFINITY:
+                        value = min(value, hard)
+                    resource.setrlimit(limit, (value, hard))
+
+        return apply
+
+    def create_cgroup(self) -> Optional[Path]:
+        """Create a cgroup for one run, or return None if cgroups cannot be used"""
+        if not self.use_cgroup or not sys.platform.startswith("linux"):
+            return None
+        try:
+            own = Path((Path("/proc/self/cgroup").read_text().strip().split("::", 1)[1]).lstrip("/"))
+            cgroup = CGROUP_ROOT / own / f"agentic-bench-exec-{uuid.uuid4().hex}"
+            cgroup.mkdir()
+            try:
+                if self.memory_bytes is not None:
+                    (cgroup / "memory.max").write_text(str(self.memory_bytes))
+                if self.max_processes is not None:
+                    (cgroup / "pids.max").write_text(str(self.max_processes))
+            except OSError:
+                cgroup.rmdir()
+                raise
+            return cgroup
+        except (OSError, IndexError) as e:
+            logger.info(f"Running code without a cgroup: {e}")
+            # Not delegated to this process, do not try again
+            self.use_cgroup = False
+            return None
+
+    @staticmethod
+    def remove_cgroup(cgroup: Optional[Path]) -> None:
+        if cgroup is None:
+            return
+        try:
+            cgroup.rmdir()
+        except OSError as e:
+            logger.warning(f"Failed to remove cgroup {cgroup}: {e}")
+
+    @staticmethod
+    def read_usage(usage_file: Path, wall_time: float) -> ResourceUsage:
+        """Usage reported by the accounting wrapper, only the wall time if it was killed"""
+        try:
+            usage = json.loads(usage_file.read_text())
+            return ResourceUsage(wall_time=wall_time, cpu_time=usage["cpu_time"], peak_rss_bytes=usage["peak_rss_bytes"])
+        except (OSError, ValueError, KeyError):
+            return ResourceUsage(wall_time=wall_time)
+        finally:
+            usage_file.unlink(missing_ok=True)
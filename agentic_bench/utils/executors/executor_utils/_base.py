@@ -13,6 +13,8 @@ class CodeBlock:
     packages: List
     language: str
     human_input_or_command_line_args:str
+    # Declared by the coder: running the code again with the same input gives the same result
+    deterministic: bool = False
 
 @dataclass
 class CodeResult:
@@ -19,6 +19,12 @@ class CommandLineCodeResult(CodeResult):
     """A code result class for command line code executor."""
 
     code_file: Optional[str]
+    # Resources used by the run, when the executor measures them
+    wall_time: Optional[float] = None
+    cpu_time: Optional[float] = None
+    peak_rss_bytes: Optional[int] = None
+    # Whether the result was taken from the execution result cache instead of running the code
+    cached: bool = False
 
 T = TypeVar("T")
 P = ParamSpec("P")
@@ -0,0 +1,180 @@
+import asyncio
+import codecs
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Set
+
+DEFAULT_MAX_OUTPUT_BYTES = 1024 * 1024
+
+def max_output_bytes_from_env() -> int:
+    return int(os.getenv("AGENTIC_BENCH_EXECUTOR_MAX_OUTPUT_BYTES", str(DEFAULT_MAX_OUTPUT_BYTES)))
+
+class OutputBuffer:
+    """Bounded capture of a process output, keeping its beginning and its end.
+
+    The first half of `max_bytes` keeps the head of the output and the second
+    half is a ring buffer of its tail, so both the first messages and the
+    final errors of a long output survive. Everything in between is dropped
+    and counted.
+
+    Args:
+        max_bytes: Maximum bytes kept. Defaults to AGENTIC_BENCH_EXECUTOR_MAX_OUTPUT_BYTES or 1 MB.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes or max_output_bytes_from_env()
+        self._head_limit = self.max_bytes // 2
+        self._tail_limit = self.max_bytes - self._head_limit
+        self._head = bytearray()
+        self._tail: Deque[bytes] = deque()
+        self._tail_size = 0
+        self.truncated_bytes = 0
+
+    @property
+    def head_full(self) -> bool:
+        return len(self._head) >= self._head_limit
+
+    def write(self, data: bytes) -> bytes:
+        """Add a chunk, returns the part of it kept in the head"""
+        room = self._head_limit - len(self._head)
+        head_part = data[:max(room, 0)]
+        self._head += head_part
+        rest = data[len(head_part):]
+        if rest:
+            self._tail.append(rest)
+            self._tail_size += len(rest)
+            # Drop whole chunks from the front of the tail, then trim the first one
+            while self._tail_size - len(self._tail[0]) >= self._tail_limit:
+                dropped = self._tail.popleft()
+                self._tail_size -= len(dropped)
+                self.truncated_bytes += len(dropped)
+            excess = self._tail_size - self._tail_limit
+            if excess > 0:
+                self._tail[0] = self._tail[0][excess:]
+                self._tail_size -= excess
+                self.truncated_bytes += excess
+        return head_part
+
+    def getvalue(self) -> str:
+        """The kept output, with a marker where bytes were dropped"""
+        head = self._head.decode("utf-8", errors="replace")
+        tail = b"".join(self._tail).decode("utf-8", errors="replace")
+        if self.truncated_bytes:
+            return f"{head}\n... [{self.truncated_bytes} bytes of output truncated] ...\n{tail}"
+        return head + tail
+
+# Sends a chunk of text of the named stream ("stdout" or "stderr") to the client
+OutputSender = Callable[[str, str], Awaitable[None]]
+
+class OutputStreamer:
+    """Captures the output of a run in an OutputBuffer while streaming it to the client.
+
+    Output kept in the head of the buffer is sent as it arrives. Past the head,
+    the client still sees the run progress: the latest `tail_chars` characters
+    of each stream are sent at most once every `interval` seconds. Each stream
+    is decoded incrementally, so characters split across chunks are held back
+    until they are complete. Call `close` once the run is over to send what the
+    rate limit held back.
+
+    Args:
+        buffer: The buffer capturing the output.
+        send: Coroutine sending a chunk to the client, or None to only capture.
+        interval: Seconds between two chunks sent past the head.
+        tail_chars: Characters of each stream sent at most past the head, the older ones are skipped.
+    """
+
+    def __init__(
+        self,
+        buffer: OutputBuffer,
+        send: Optional[OutputSender],
+        interval: float = 1.0,
+        tail_chars: int = 4096,
+    ):
+        self.buffer = buffer
+        self._send = send
+        self._interval = interval
+        self._tail_chars = tail_chars
+        self._decoders: Dict[str, codecs.IncrementalDecoder] = {}
+        self._pending: Dict[str, str] = {}
+        self._skipped: Set[str] = set()
+        self._truncation_reported = False
+        self._last_sent = 0.0
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Future] = None
+
+    def _decode(self, stream: str, data: bytes, final: bool = False) -> str:
+        if stream not in self._decoders:
+            self._decoders[stream] = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        return self._decoders[stream].decode(data, final)
+
+    async def write(self, stream: str, data: bytes) -> None:
+        """Capture a chunk of the stream and send it, or its end, to the client"""
+        kept = self.buffer.write(data)
+        if self._send is None:
+            return
+        if kept:
+            await self._send(stream, self._decode(stream, kept))
+        rest = data[len(kept):]
+        if not rest:
+            return
+
+        if not self._truncation_reported:
+            self._truncation_reported = True
+            await self._send(stream, "\n... [output too long, only its end is kept] ...\n")
+        self._hold(stream, self._decode(stream, rest))
+        wait = self._last_sent + self._interval - time.monotonic()
+        if wait <= 0:
+            await self.flush()
+        elif self._timer is None:
+            # Sent later even if the run goes quiet in the meantime
+            self._timer = asyncio.get_running_loop().call_later(wait, self._flush_later)
+
+    def _hold(self, stream: str, text: str) -> None:
+        text = self._pending.get(stream, "") + text
+        if len(text) > self._tail_chars:
+            self._skipped.add(stream)
+            text = text[-self._tail_chars:]
+        self._pending[stream] = text
+
+    def _flush_later(self) -> None:
+        self._timer = None
+        self._flush_task = asyncio.ensure_future(self.flush())
+
+    async def flush(self) -> None:
+        """Send the output held back by the rate limit"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        async with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_sent = time.monotonic()
+            for stream, text in pending.items():
+                if stream in self._skipped:
+                    self._skipped.discard(stream)
+                    text = "\n...\n" + text
+                if text and self._send is not None:
+                    await self._send(stream, text)
+
+    def cancel(self) -> None:
+        """Drop the output held back, for a run that was cancelled"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+        self._pending.clear()
+
+    async def close(self) -> None:
+        """Send the rest of the output once the run is over"""
+        if self._flush_task is not None:
+            await self._flush_task
+        for stream in list(self._decoders):
+            text = self._decode(stream, b"", final=True)
+            if text and self._send is not None:
+                if self.buffer.head_full:
+                    self._hold(stream, text)
+                else:
+                    await self._send(stream, text)
+        await self.flush()
@@ -0,0 +1,312 @@
+import asyncio
+import json
+import os
+import signal
+import time
+import uuid
+from pathlib import Path
+from typing import Any, List, Optional
+
+from utils import CancellationToken
+from .execution_profile import ExecutionProfile, ResourceUsage
+from .executor_utils.output_buffer import OutputBuffer, OutputStreamer
+from .local_code_executor import LocalCommandLineCodeExecutor
+
+__all__ = ("LocalKernelCodeExecutor",)
+
+# The kernel reads one JSON request per line from stdin and runs the file it
+# names in a namespace kept across requests. After each request it writes
+# "\x1e<token>\x1e\n" to stderr and "\x1e<token><usage json>\x1e\n" to stdout,
+# so the executor knows where the output of the request ends.
+_KERNEL_SOURCE = r'''
+import io, json, math, os, sys, time, traceback
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# User code gets an empty stdin, so neither it nor its subprocesses can consume requests
+requests = os.fdopen(os.dup(0), "r")
+os.dup2(os.open(os.devnull, os.O_RDONLY), 0)
+namespace = {"__name__": "__main__", "__builtins__": __builtins__}
+
+for line in requests:
+    request = json.loads(line)
+    sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+    sys.stdin = io.StringIO(request["stdin"])
+    sys.argv = [request["file"], *request["args"]]
+    namespace["__file__"] = request["file"]
+    if resource is not None and request.get("cpu_seconds"):
+        # The CPU time limit counts from the start of each request, not of the kernel
+        used = resource.getrusage(resource.RUSAGE_SELF)
+        soft = math.ceil(used.ru_utime + used.ru_stime) + request["cpu_seconds"]
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+    start = time.process_time()
+    exit_code = 0
+    try:
+        with open(request["file"], encoding="utf-8") as f:
+            code = compile(f.read(), request["file"], "exec")
+        exec(code, namespace)
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            exit_code = e.code or 0
+        else:
+            print(e.code, file=sys.stderr)
+            exit_code = 1
+    except BaseException as e:
+        # Leave the kernel's own frame out of the traceback
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        exit_code = 130 if isinstance(e, KeyboardInterrupt) else 1
+    usage = {"exit_code": exit_code, "cpu_time": time.process_time() - start}
+    if resource is not None:
+        scale = 1 if sys.platform == "darwin" else 1024
+        usage["peak_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+    sys.stdout.flush()
+    sys.stderr.write("\x1e" + request["token"] + "\x1e\n")
+    sys.stderr.flush()
+    sys.stdout.write("\x1e" + request["token"] + json.dumps(usage) + "\x1e\n")
+    sys.stdout.flush()
+'''
+
+_TERMINATOR = b"\x1e\n"
+
+class LocalKernelCodeExecutor(LocalCommandLineCodeExecutor):
+    """A local executor running Python code blocks in a long-lived interpreter.
+
+    The first Python block starts a kernel process, and every later block runs
+    in the same namespace, so imports, loaded data and variables carry over
+    between blocks. Shell blocks run as separate processes, as in
+    LocalCommandLineCodeExecutor, whose package setup, virtual environment,
+    dependency cache and resource limits are reused. The CPU time limit applies
+    to each block, the other resource limits to the kernel as a whole.
+
+    A block running past the timeout, or cancelled, is interrupted with
+    SIGINT, which keeps the kernel and its state. The kernel is killed if it
+    does not stop within `interrupt_grace` seconds, and a new one is started
+    for the next block. `restart` starts over with an empty namespace.
+
+    Args:
+        interrupt_grace: Seconds to wait for an interrupted block to stop before killing the kernel.
+        **kwargs: Arguments of LocalCommandLineCodeExecutor.
+    """
+
+    def __init__(self, *args: Any, interrupt_grace: float = 5.0, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._interrupt_grace = interrupt_grace
+        self._kernel: Optional[asyncio.subprocess.Process] = None
+        self._kernel_program: Optional[str] = None
+        self._kernel_cgroup: Optional[Path] = None
+        # Blocks share the kernel, they run one at a time
+        self._kernel_lock = asyncio.Lock()
+
+    @property
+    def result_cache_scope(self) -> Optional[str]:
+        # Results depend on the state left by earlier blocks
+        return None
+
+    async def _start_kernel(self, program: str, env: dict) -> asyncio.subprocess.Process:
+        await self._stop_kernel()
+        profile = self._execution_profile
+        preexec_fn = None
+        if profile is not None:
+            self._kernel_cgroup = profile.create_cgroup()
+            # The kernel raises its own CPU time limit before each block
+            preexec_fn = profile.preexec_fn(self._kernel_cgroup, cpu_limit=False)
+        self._kernel = await asyncio.create_subprocess_exec(
+            program, "-u", "-c", _KERNEL_SOURCE,
+            cwd=self._work_dir,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env=env,
+            preexec_fn=preexec_fn,
+            start_new_session=os.name == "posix",
+            limit=1024 * 1024,
+        )
+        self._kernel_program = program
+        if self.stream_output and self.websocket:
+            await self.stream_output.add_step(self.websocket, "Started a Python kernel for the code execution")
+        return self._kernel
+
+    def _kill_kernel(self) -> None:
+        kernel = self._kernel
+        if kernel is None or kernel.returncode is not None:
+            return
+        if os.name == "posix":
+            try:
+                os.killpg(kernel.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        else:
+            kernel.kill()
+
+    def _interrupt_kernel(self) -> None:
+        kernel = self._kernel
+        if kernel is not None and kernel.returncode is None:
+            kernel.send_signal(signal.SIGINT)
+
+    async def _stop_kernel(self) -> None:
+        kernel, self._kernel = self._kernel, None
+        if kernel is not None and kernel.returncode is None:
+            kernel.stdin.close()
+            try:
+                await asyncio.wait_for(kernel.wait(), 2)
+            except asyncio.TimeoutError:
+                self._kernel = kernel
+                self._kill_kernel()
+                self._kernel = None
+                await kernel.wait()
+        ExecutionProfile.remove_cgroup(self._kernel_cgroup)
+        self._kernel_cgroup = None
+
+    async def _read_until_sentinel(
+        self, reader: asyncio.StreamReader, stream: str, token: str, streamer: OutputStreamer
+    ) -> Optional[bytes]:
+        """Capture output up to the sentinel of the request, returns its payload or None if the kernel died"""
+        sentinel = b"\x1e" + token.encode()
+        pending = b""
+        while True:
+            chunk = await reader.read(65536)
+            if not chunk:
+                await streamer.write(stream, pending)
+                return None
+            pending += chunk
+            index = pending.find(sentinel)
+            if index != -1:
+                await streamer.write(stream, pending[:index])
+                rest = pending[index + len(sentinel):]
+                while _TERMINATOR not in rest:
+                    more = await reader.read(65536)
+                    if not more:
+                        return None
+                    rest += more
+                return rest.split(_TERMINATOR, 1)[0]
+            # Hold back what could be the start of a sentinel split across chunks
+            cut = pending.rfind(b"\x1e", max(len(pending) - len(sentinel) + 1, 0))
+            if cut == -1:
+                cut = len(pending)
+            await streamer.write(stream, pending[:cut])
+            pending = pending[cut:]
+
+    async def _run_code_file(
+        self,
+        lang: str,
+        program: str,
+        code_file: Path,
+        command_line_args: List[str],
+        env: dict,
+        cancellation_token: CancellationToken,
+    ) -> tuple[int, str, ResourceUsage]:
+        if lang != "python":
+            return await super()._run_code_file(lang, program, code_file, command_line_args, env, cancellation_token)
+
+        async with self._kernel_lock:
+            return await self._run_in_kernel(program, code_file, command_line_args, env, cancellation_token)
+
+    async def _run_in_kernel(
+        self,
+        program: str,
+        code_file: Path,
+        command_line_args: List[str],
+        env: dict,
+        cancellation_token: CancellationToken,
+    ) -> tuple[int, str, ResourceUsage]:
+        kernel = self._kernel
+        if kernel is None or kernel.returncode is not None or self._kernel_program != program:
+            kernel = await self._start_kernel(program, env)
+
+        token = uuid.uuid4().hex
+        # Same stdin as the process executor gives a script
+        if len(command_line_args) == 1:
+            stdin = command_line_args[0]
+        else:
+            stdin = "".join(f"{arg}\n" for arg in command_line_args)
+        request = {
+            "token": token,
+            "file": str(code_file),
+            "args": command_line_args,
+            "stdin": stdin,
+            "cpu_seconds": self._execution_profile.cpu_seconds if self._execution_profile is not None else None,
+        }
+
+        streamer = self._output_streamer(OutputBuffer())
+        running = True
+        cancelled = False
+
+        def cancel() -> None:
+            nonlocal cancelled
+            if running:
+                cancelled = True
+                self._interrupt_kernel()
+
+        timed_out = False
+        start_time = time.monotonic()
+        readers = [
+            asyncio.ensure_future(self._read_until_sentinel(kernel.stdout, "stdout", token, streamer)),
+            asyncio.ensure_future(self._read_until_sentinel(kernel.stderr, "stderr", token, streamer)),
+        ]
+        try:
+            kernel.stdin.write((json.dumps(request) + "\n").encode())
+            await kernel.stdin.drain()
+            cancellation_token.add_callback(cancel)
+
+            _, pending = await asyncio.wait(readers, timeout=self._timeout)
+            if pending:
+                timed_out = True
+                self._interrupt_kernel()
+                _, pending = await asyncio.wait(readers, timeout=self._interrupt_grace)
+            if pending:
+                # The block ignored the interrupt, the kernel and its state are lost
+                self._kill_kernel()
+                await asyncio.wait(readers)
+        except (asyncio.CancelledError, BrokenPipeError, ConnectionResetError) as e:
+            self._kill_kernel()
+            for reader in readers:
+                reader.cancel()
+            if isinstance(e, asyncio.CancelledError):
+                streamer.cancel()
+                raise
+        finally:
+            running = False
+            cancellation_token.remove_callback(cancel)
+        wall_time = time.monotonic() - start_time
+        await streamer.close()
+
+        payload = readers[0].result() if readers[0].done() and not readers[0].cancelled() else None
+        suffix = ""
+        if payload is None:
+            # The kernel died or was killed, start a new one for the next block
+            await kernel.wait()
+            await self._stop_kernel()
+            suffix = "\n The Python kernel stopped, variables from earlier code blocks are lost."
+            usage = ResourceUsage(wall_time=wall_time)
+            exitcode = kernel.returncode or 1
+        else:
+            result = json.loads(payload)
+            usage = ResourceUsage(
+                wall_time=wall_time, cpu_time=result.get("cpu_time"), peak_rss_bytes=result.get("peak_rss_bytes")
+            )
+            exitcode = result["exit_code"]
+
+        if cancelled:
+            suffix += "\n Cancelled"
+            exitcode = 125  # Exit code for operation canceled
+        elif timed_out:
+            suffix += "\n Timeout"
+            exitcode = 124  # Exit code for timeout
+        return exitcode, streamer.buffer.getvalue() + suffix, usage
+
+    async def restart(self) -> None:
+        """Start over with a new kernel, dropping the state of earlier code blocks"""
+        async with self._kernel_lock:
+            await self._stop_kernel()
+
+    async def stop(self) -> None:
+        """Shut the kernel down and release the executor's environments"""
+        async with self._kernel_lock:
+            await self._stop_kernel()
+        await super().stop()
@@ -1,8 +1,13 @@
 import asyncio
 import logging
 import os
+import platform
+import signal
 import sys
+import time
+import uuid
 import warnings
+from functools import partial
 from hashlib import sha256
 from pathlib import Path
 from string import Template
@@ -10,6 +15,9 @@ from types import SimpleNamespace
 from typing import Any, Callable, ClassVar, List, Optional, Sequence, Union
 import venv
 from utils import CancellationToken
+from .dependency_cache import DependencyCache, local_environment_builder
+from .execution_profile import ExecutionProfile, ResourceUsage
+from .venv_template import VenvTemplate
 from .executor_utils import (
     CodeBlock,
     CodeExecutor,
@@ -17,10 +25,9 @@ from .executor_utils import (
     FunctionWithRequirementsStr,
 )
 from typing_extensions import ParamSpec
-from dataclasses import asdict
-import json
 from utils.stream_response_format import StreamResponse
 from fastapi import WebSocket
+from .executor_utils.output_buffer import OutputBuffer, OutputStreamer
 from .executor_utils._common import (
     PYTHON_VARIANTS,
     CommandLineCodeResult,
@@ -63,6 +70,13 @@ class LocalCommandLineCodeExecutor(CodeExecutor):
         functions (List[Union[FunctionWithRequirements[Any, A], Callable[..., Any]]]): A list of functions that are available to the code executor. Default is an empty list.
         functions_module (str, optional): The name of the module that will be created to store the functions. Defaults to "functions".
         virtual_env_context (Optional[SimpleNamespace], optional): The virtual environment context. Defaults to None.
+        dependency_cache (Optional[DependencyCache], optional): Cache of installed package sets. When given, the
+            required packages are taken from it and added to PYTHONPATH instead of being installed in a new
+            virtual environment. Defaults to None.
+        venv_template (Optional[VenvTemplate], optional): Template the virtual environment is cloned from, instead
+            of creating one from scratch, when packages are required. Defaults to None.
+        execution_profile (Optional[ExecutionProfile], optional): Resource limits applied to every program run,
+            which also enables CPU time and peak memory accounting. Defaults to None.
 
     Example:
 
@@ -128,6 +142,9 @@ $functions"""
         ] = [],
         functions_module: str = "functions",
         virtual_env_context: Optional[SimpleNamespace] = None,
+        dependency_cache: Optional[DependencyCache] = None,
+        venv_template: Optional[VenvTemplate] = None,
+        execution_profile: Optional[ExecutionProfile] = None,
     ):
         if timeout < 1:
             raise ValueError("Timeout must be greater than or equal to 1.")
@@ -157,6 +174,13 @@ $functions"""
         self._virtual_env_context: Optional[SimpleNamespace] = virtual_env_context
         self.websocket:Optional[WebSocket]= None
         self.stream_output:Optional[StreamResponse] = None
+        self._dependency_cache = dependency_cache
+        # Leased environment of the required packages, added to PYTHONPATH
+        self._dependency_env: Optional[Path] = None
+        self._venv_template = venv_template
+        # Virtual environment cloned from the template for this executor, removed on stop
+        self._cloned_venv_dir: Optional[Path] = None
+        self._execution_profile = execution_profile if execution_profile and execution_profile.supported else None
 
     def format_functions_for_prompt(
         self, prompt_template: str = FUNCTION_PROMPT_TEMPLATE
@@ -201,15 +225,23 @@ $functions"""
 
     async def create_venv(self, work_dir):
         if self.stream_output and self.websocket:
-            self.stream_output.steps.append(
-                "Creating a secure environment for the code to be executed"
-            )
-            await self.websocket.send_text(
-                json.dumps(asdict(self.stream_output))
+            await self.stream_output.add_step(
+                self.websocket, "Creating a secure environment for the code to be executed"
             )
+        if self._venv_template is not None:
+            # Executors share the working directory, so each clone gets its own
+            self._cloned_venv_dir = work_dir / f".venv-{uuid.uuid4().hex}"
+            try:
+                return await self._venv_template.clone(self._cloned_venv_dir)
+            except Exception as e:
+                logging.warning(f"Failed to clone the venv template, creating a new environment: {e}")
+                await self._venv_template.remove_clone(self._cloned_venv_dir)
+                self._cloned_venv_dir = None
+
         venv_dir = work_dir / ".venv"
         venv_builder = venv.EnvBuilder(with_pip=True)
-        venv_builder.create(venv_dir)
+        # Creating the environment takes seconds, keep it off the event loop
+        await asyncio.to_thread(venv_builder.create, venv_dir)
         venv_context = venv_builder.ensure_directories(venv_dir)
         print("created venv")
         return venv_context
@@ -225,12 +257,15 @@ $functions"""
             log="Ensuring packages are installed in executor."
             logging.info(log)
             if self.stream_output and self.websocket:
-                self.stream_output.steps.append(
-                    log
-                )
-                await self.websocket.send_text(
-                    json.dumps(asdict(self.stream_output))
-                )
+                await self.stream_output.add_step(self.websocket, log)
+
+            if self._venv_template is not None and not self._virtual_env_context:
+                self._virtual_env_context = await self.create_venv(self.work_dir)
+
+            if self._dependency_cache is not None:
+                await self._acquire_dependency_env(required_packages)
+                self._setup_functions_complete = True
+                return
 
             cmd_args = ["-m", "pip", "install"]
             cmd_args.extend(required_packages)
@@ -260,11 +295,8 @@ $functions"""
             proc = None
             try:
                 if self.stream_output and self.websocket:
-                    self.stream_output.steps.append(
-                        "Installing the code dependencies in your local environment before the code execution"
-                    )
-                    await self.websocket.send_text(
-                        json.dumps(asdict(self.stream_output))
+                    await self.stream_output.add_step(
+                        self.websocket, "Installing the code dependencies in your local environment before the code execution"
                     )
                 proc = await task
                 stdout, stderr = await asyncio.wait_for(
@@ -295,6 +327,32 @@ $functions"""
 
         self._setup_functions_complete = True
 
+    async def _acquire_dependency_env(self, packages: List[str]) -> None:
+        python_executable = self._virtual_env_context.env_exe if self._virtual_env_context else sys.executable
+        # Environments are only shared between matching interpreters and platforms
+        tag = f"local-{sys.implementation.cache_tag}-{sys.platform}-{platform.machine()}"
+        if self.stream_output and self.websocket:
+            await self.stream_output.add_step(
+                self.websocket, "Loading the code dependencies from the dependency cache"
+            )
+        try:
+            self._dependency_env = await self._dependency_cache.acquire(
+                packages, tag, local_environment_builder(python_executable)
+            )
+        except asyncio.CancelledError as e:
+            raise ValueError("Pip install was cancelled") from e
+
+    async def stop(self) -> None:
+        """Release the leased dependency environment and remove the cloned virtual environment"""
+        if self._dependency_env is not None and self._dependency_cache is not None:
+            self._dependency_cache.release(self._dependency_env)
+            self._dependency_env = None
+        if self._cloned_venv_dir is not None:
+            await self._venv_template.remove_clone(self._cloned_venv_dir)
+            self._cloned_venv_dir = None
+            self._virtual_env_context = None
+            self._setup_functions_complete = False
+
     async def execute_code_blocks(
         self, code_blocks: List[CodeBlock],websocket:WebSocket,stream_output:StreamResponse, cancellation_token: CancellationToken
     ) -> CommandLineCodeResult:
@@ -320,6 +378,7 @@ $functions"""
         self, code_blocks: List[CodeBlock], cancellation_token: CancellationToken
     ) -> CommandLineCodeResult:
         logs_all: str = ""
+        usages: List[ResourceUsage] = []
         file_names: List[Path] = []
         exitcode = 0
         for code_block in code_blocks:
@@ -352,11 +411,8 @@ $functions"""
                     code_file=None,
                 )
             if self.stream_output and self.websocket:
-                self.stream_output.steps.append(
-                    f"Saving the code in a file under the directory: {self._work_dir}"
-                )
-                await self.websocket.send_text(
-                    json.dumps(asdict(self.stream_output))
+                await self.stream_output.add_step(
+                    self.websocket, f"Saving the code in a file under the directory: {self._work_dir}"
                 )
             if filename is None:
                 # create a file with an automatically generated name
@@ -372,6 +428,10 @@ $functions"""
             file_names.append(written_file)
 
             env = os.environ.copy()
+            if self._dependency_env is not None:
+                env["PYTHONPATH"] = os.pathsep.join(
+                    filter(None, [str(self._dependency_env.resolve()), env.get("PYTHONPATH")])
+                )
 
             if self._virtual_env_context:
                 virtual_env_exe_abs_path = os.path.abspath(
@@ -392,135 +452,181 @@ $functions"""
                     sys.executable if lang.startswith("python") else lang_to_cmd(lang)
                 )
 
-            # Wrap in a task to make it cancellable
-
-            # if(lang.startswith("python") and len(packages)!=0):
-            #     process=await asyncio.create_subprocess_exec('pip','install',*packages,stdout=asyncio.subprocess.PIPE,
-            #         stderr=asyncio.subprocess.PIPE)
-            #     stdout,stderr = await process.communicate()
-
-            #     if process.returncode==0:
-            #         print("packages installed successfully")
-            #     else:
-            #         print("error installing packages")
-            task = asyncio.create_task(
-                asyncio.create_subprocess_exec(
-                    program,
-                    str(written_file.absolute()),
-                    *command_line_args,
-                    cwd=self._work_dir,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE,
-                    stdin=asyncio.subprocess.PIPE,
-                    env=env,
-                )
-            )
-            cancellation_token.link_future(task)
             if self.stream_output and self.websocket:
-                self.stream_output.steps.append(
-                    "Executing the generated code in your safe environment"
-                )
-                await self.websocket.send_text(
-                    json.dumps(asdict(self.stream_output))
+                await self.stream_output.add_step(
+                    self.websocket, "Executing the generated code in your safe environment"
                 )
-            proc = await task
-
-            if(len(command_line_args) == 0):
-                try:
-                    stdout, stderr = await asyncio.wait_for(
-                        proc.communicate(b""), self._timeout
-                    )
-                    logs_all += stderr.decode()
-                    logs_all += stdout.decode()
-                except asyncio.TimeoutError:
-                    logs_all += "\n Timeout"
-                    exitcode = 124  # Exit code for timeout
-                except asyncio.CancelledError:
-                    logs_all += "\n Cancelled"
-                    exitcode = 125  # Exit code for operation canceled
-                except Exception as e:
-                    logs_all += f"\n Error: {e}"
-                    exitcode = 1  # Generic error code
-            elif(len(command_line_args) == 1):
-                try:
-                    stdout, stderr = await asyncio.wait_for(
-                        proc.communicate(command_line_args[0].encode()), self._timeout
-                    )
-                    logs_all += stderr.decode()
-                    logs_all += stdout.decode()
-                except asyncio.TimeoutError:
-                    logs_all += "\n Timeout"
-                    exitcode = 124  # Exit code for timeout
-                except asyncio.CancelledError:
-                    logs_all += "\n Cancelled"
-                    exitcode = 125  # Exit code for operation canceled
-                except Exception as e:
-                    logs_all += f"\n Error: {e}"
-                    exitcode = 1  # Generic error code
-            else:
-                for index, cmd_arg in enumerate(command_line_args):
-                    try:
-                        # Send the input to the subprocess
-                        proc.stdin.write(f"{cmd_arg}\n".encode())
-                        await proc.stdin.drain()  # Ensure the input is sent
-
-                        timeout = self._timeout
-                        if index != len(command_line_args) - 1:
-                            timeout = 5
-
-                        # Read the output (if any)
-                        stdout = await asyncio.wait_for(proc.stdout.readline(), timeout)
-                        stderr = await asyncio.wait_for(proc.stderr.readline(), timeout)
-
-                        logs_all += stderr.decode()
-                        logs_all += stdout.decode()
-                    except asyncio.TimeoutError:
-                        if(index == len(command_line_args) - 1):
-                            logs_all += "\n Timeout"
-                            exitcode = 124  # Exit code for timeout
-                            break
-                    except asyncio.CancelledError:
-                        logs_all += "\n Cancelled"
-                        exitcode = 125  # Exit code for operation canceled
-                        break
-                    except ConnectionResetError: # No human input needed, command line args were needed
-                        pass
-                    except Exception as e:
-                        logs_all += f"\n Error: {e}"
-                        exitcode = 1  # Generic error code
-                        break
-
-                try:
-                    stdout, stderr = await asyncio.wait_for(
-                        proc.communicate(b""), self._timeout
-                    )
-                    logs_all += stderr.decode()
-                    logs_all += stdout.decode()
-                except asyncio.TimeoutError:
-                    logs_all += "\n Timeout"
-                    exitcode = 124  # Exit code for timeout
-                except asyncio.CancelledError:
-                    logs_all += "\n Cancelled"
-                    exitcode = 125  # Exit code for operation canceled
-                except Exception as e:
-                    logs_all += f"\n Error: {e}"
-                    exitcode = 1  # Generic error code
-
+            exitcode, output, usage = await self._run_code_file(
+                lang, program, written_file.absolute(), command_line_args, env, cancellation_token
+            )
+            logs_all += output
+            usages.append(usage)
             print("exit code", exitcode)
             print("logs all", logs_all)
 
-            self._running_cmd_task = None
-            proc.stdin.close()
-            await proc.wait()
-            exitcode = proc.returncode or exitcode
-
             if exitcode != 0:
                 break
         code_file = str(file_names[0]) if len(file_names) > 0 else None
+        cpu_times = [usage.cpu_time for usage in usages if usage.cpu_time is not None]
+        peak_rss = [usage.peak_rss_bytes for usage in usages if usage.peak_rss_bytes is not None]
         return CommandLineCodeResult(
-            exit_code=exitcode, output=logs_all, code_file=code_file
+            exit_code=exitcode,
+            output=logs_all,
+            code_file=code_file,
+            wall_time=sum(usage.wall_time for usage in usages) if usages else None,
+            cpu_time=sum(cpu_times) if cpu_times else None,
+            peak_rss_bytes=max(peak_rss) if peak_rss else None,
         )
 
+    @property
+    def result_cache_scope(self) -> Optional[str]:
+        """What results of this executor depend on besides the code block, None if they cannot be cached"""
+        return f"local-{sys.implementation.cache_tag}-{sys.platform}-{platform.machine()}"
+
+    async def _run_code_file(
+        self,
+        lang: str,
+        program: str,
+        code_file: Path,
+        command_line_args: List[str],
+        env: dict,
+        cancellation_token: CancellationToken,
+    ) -> tuple[int, str, ResourceUsage]:
+        """Run a saved code block, returns the exit code, the output and the resources used"""
+        return await self._run_process(
+            program, [str(code_file), *command_line_args], env, command_line_args, cancellation_token
+        )
+
+    def _output_streamer(self, buffer: OutputBuffer) -> OutputStreamer:
+        """Capture output in the buffer, streaming it to the client if there is one"""
+        if not (self.stream_output and self.websocket):
+            return OutputStreamer(buffer, None)
+        return OutputStreamer(buffer, partial(self.stream_output.send_output_chunk, self.websocket))
+
+    async def _run_process(
+        self,
+        program: str,
+        args: List[str],
+        env: dict,
+        command_line_args: List[str],
+        cancellation_token: CancellationToken,
+    ) -> tuple[int, str, ResourceUsage]:
+        """Run a program, streaming its output as it is produced into a bounded buffer.
+
+        Command line arguments are also fed to stdin, for code reading them
+        with input(). Returns the exit code, 124 on timeout or 125 when
+        cancelled, the captured output and the resources used.
+        """
+        profile = self._execution_profile
+        command = [program, *args]
+        usage_file = None
+        cgroup = None
+        preexec_fn = None
+        if profile is not None:
+            usage_file = self._work_dir.resolve() / f".usage_{uuid.uuid4().hex}.json"
+            command = profile.wrap_command(program, args, usage_file)
+            cgroup = profile.create_cgroup()
+            preexec_fn = profile.preexec_fn(cgroup)
+
+        start_time = time.monotonic()
+        proc = await asyncio.create_subprocess_exec(
+            *command,
+            cwd=self._work_dir,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            stdin=asyncio.subprocess.PIPE,
+            env=env,
+            preexec_fn=preexec_fn,
+            # Own process group, so the processes the program starts are killed with it
+            start_new_session=os.name == "posix",
+        )
+        streamer = self._output_streamer(OutputBuffer())
+        cancelled = False
+
+        def kill_process_group() -> None:
+            if proc.returncode is not None:
+                return
+            if os.name == "posix":
+                try:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+            else:
+                proc.kill()
+
+        def kill() -> None:
+            nonlocal cancelled
+            cancelled = True
+            kill_process_group()
+
+        cancellation_token.add_callback(kill)
+        try:
+            async def read(reader: asyncio.StreamReader, stream: str) -> None:
+                while chunk := await reader.read(65536):
+                    await streamer.write(stream, chunk)
+
+            readers = [
+                asyncio.ensure_future(read(proc.stdout, "stdout")),
+                asyncio.ensure_future(read(proc.stderr, "stderr")),
+            ]
+            # A single argument is passed as is, several are answered one per line
+            if len(command_line_args) == 1:
+                stdin_data = command_line_args[0].encode()
+            else:
+                stdin_data = "".join(f"{arg}\n" for arg in command_line_args).encode()
+
+            async def feed_stdin() -> None:
+                try:
+                    if stdin_data:
+                        proc.stdin.write(stdin_data)
+                        await proc.stdin.drain()
+                    proc.stdin.close()
+                except (BrokenPipeError, ConnectionResetError):
+                    # The program ended or does not read stdin
+                    pass
+
+            exitcode = None
+            suffix = ""
+            try:
+                # Feeding stdin counts against the timeout, a program not reading it would block the drain
+                await asyncio.wait_for(asyncio.gather(feed_stdin(), proc.wait()), self._timeout)
+            except asyncio.TimeoutError:
+                kill_process_group()
+                await proc.wait()
+                suffix = "\n Timeout"
+                exitcode = 124  # Exit code for timeout
+            except asyncio.CancelledError:
+                kill_process_group()
+                for reader in readers:
+                    reader.cancel()
+                streamer.cancel()
+                ExecutionProfile.remove_cgroup(cgroup)
+                if usage_file is not None:
+                    usage_file.unlink(missing_ok=True)
+                raise
+            wall_time = time.monotonic() - start_time
+            try:
+                # Processes the program left behind may keep the pipes open
+                await asyncio.wait_for(asyncio.gather(*readers), 5)
+            except asyncio.TimeoutError:
+                for reader in readers:
+                    reader.cancel()
+            await streamer.close()
+
+            if cancelled:
+                suffix = "\n Cancelled"
+                exitcode = 125  # Exit code for operation canceled
+            if exitcode is None:
+                exitcode = proc.returncode
+            if profile is not None:
+                ExecutionProfile.remove_cgroup(cgroup)
+                usage = ExecutionProfile.read_usage(usage_file, wall_time)
+            else:
+                usage = ResourceUsage(wall_time=wall_time)
+            return exitcode, streamer.buffer.getvalue() + suffix, usage
+        finally:
+            cancellation_token.remove_callback(kill)
+
     async def restart(self) -> None:
         """(Experimental) Restart the code executor."""
         warnings.warn(
@@ -0,0 +1,102 @@
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from hashlib import sha256
+from typing import Any, Dict, Optional
+
+from .dependency_cache import normalize_packages
+from .executor_utils import CodeBlock
+from .executor_utils._common import CommandLineCodeResult
+
+@dataclass
+class _CachedResult:
+    result: CommandLineCodeResult
+    stored_at: float
+    size: int
+
+class ExecutionResultCache:
+    """Cache of the results of code blocks declared deterministic.
+
+    Results are keyed on the code, its language, its arguments or input, its
+    package set and the scope of the executor that ran it (for example the
+    Docker image), so a retry of identical code returns the earlier result
+    without running it. Entries expire after `ttl_seconds` and the least
+    recently used ones are evicted past `max_entries` or `max_bytes` of
+    output. Runs that timed out, were cancelled or killed by a signal are not
+    cached.
+
+    Args:
+        ttl_seconds: Seconds a result stays valid.
+        max_entries: Maximum number of cached results.
+        max_bytes: Maximum total size of the cached outputs.
+    """
+
+    def __init__(self, ttl_seconds: float = 3600, max_entries: int = 256, max_bytes: int = 16 * 1024 * 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, _CachedResult]" = OrderedDict()
+        self._total_bytes = 0
+        self._hits = 0
+        self._misses = 0
+
+    @classmethod
+    def from_env(cls) -> "ExecutionResultCache":
+        return cls(
+            ttl_seconds=float(os.getenv("AGENTIC_BENCH_RESULT_CACHE_TTL_SECONDS", "3600")),
+            max_entries=int(os.getenv("AGENTIC_BENCH_RESULT_CACHE_MAX_ENTRIES", "256")),
+            max_bytes=int(os.getenv("AGENTIC_BENCH_RESULT_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+        )
+
+    @staticmethod
+    def key(code_block: CodeBlock, scope: str) -> str:
+        parts = [
+            scope,
+            code_block.language.lower(),
+            sha256(code_block.code.encode("utf-8")).hexdigest(),
+            repr(code_block.human_input_or_command_line_args),
+            *normalize_packages(code_block.packages or []),
+        ]
+        return sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[CommandLineCodeResult]:
+        """The cached result marked as cached, or None if there is no valid one"""
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry.stored_at > self.ttl_seconds:
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        self._entries.move_to_end(key)
+        return replace(entry.result, cached=True)
+
+    def put(self, key: str, result: CommandLineCodeResult) -> None:
+        # 124 and 125 are timeouts and cancellations, above 128 the run was killed by a signal
+        if result.exit_code in (124, 125) or result.exit_code >= 128 or result.exit_code < 0:
+            return
+        size = len(result.output.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = _CachedResult(result=result, stored_at=time.monotonic(), size=size)
+        self._total_bytes += size
+        while len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._total_bytes -= entry.size
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import time
+import venv
+from pathlib import Path
+from types import SimpleNamespace
+from typing import IO, List, Optional, Sequence, Union
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from .dependency_cache import normalize_packages
+
+logger = logging.getLogger(__name__)
+
+# Written into the template once it is built, describing what it was built with
+_TEMPLATE_MARKER = ".template.json"
+
+def _link_or_copy(src: str, dst: str) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:
+        # Hardlinks fail across filesystems
+        shutil.copy2(src, dst)
+
+class VenvTemplate:
+    """A virtual environment built once and cloned for every executor that needs one.
+
+    The template is created with pip and the `base_packages` preinstalled,
+    and is rebuilt when the interpreter or the base packages change. Clones
+    hardlink the template's files, falling back to copies across
+    filesystems, so creating an environment for a task takes a fraction of
+    a second. Packages installed in a clone replace files rather than
+    modifying them, so the template is left untouched.
+
+    Args:
+        root: Directory of the template environment.
+        base_packages: Packages preinstalled in the template.
+    """
+
+    def __init__(self, root: Union[Path, str] = Path("./venv_template"), base_packages: Sequence[str] = ()):
+        self.root = Path(root)
+        self.base_packages: List[str] = normalize_packages(base_packages)
+        self._lock = asyncio.Lock()
+        self._ready = False
+        self._clone_verified = False
+
+    @classmethod
+    def from_env(cls) -> "VenvTemplate":
+        packages = os.getenv("AGENTIC_BENCH_VENV_BASE_PACKAGES", "")
+        return cls(
+            root=os.getenv("AGENTIC_BENCH_VENV_TEMPLATE_DIR", "./venv_template"),
+            base_packages=[package for package in packages.split(",") if package.strip()],
+        )
+
+    def _description(self) -> dict:
+        return {"python": sys.version, "executable": sys.executable, "packages": self.base_packages}
+
+    def _is_current(self) -> bool:
+        try:
+            return json.loads((self.root / _TEMPLATE_MARKER).read_text()) == self._description()
+        except (OSError, ValueError):
+            return False
+
+    async def ensure(self) -> None:
+        """Build the template unless an up to date one exists"""
+        if self._ready:
+            return
+        async with self._lock:
+            if self._ready:
+                return
+            if not await asyncio.to_thread(self._is_current):
+                await self._build()
+                self._clone_verified = False
+            self._ready = True
+
+    async def _build(self) -> None:
+        # Scripts in the environment embed its path, so it is built where it is used. The marker
+        # is written last and removed first, so a partial template is never taken for a current one.
+        start_time = time.monotonic()
+        with await asyncio.to_thread(self._build_lock):
+            if await asyncio.to_thread(self._is_current):
+                # Built by another process while this one waited
+                return
+            (self.root / _TEMPLATE_MARKER).unlink(missing_ok=True)
+            await asyncio.to_thread(shutil.rmtree, self.root, True)
+            try:
+                context = await asyncio.to_thread(self._create, self.root)
+                if self.base_packages:
+                    proc = await asyncio.create_subprocess_exec(
+                        context.env_exe, "-m", "pip", "install", "--quiet", *self.base_packages,
+                        stdout=asyncio.subprocess.PIPE,
+                        stderr=asyncio.subprocess.PIPE,
+                    )
+                    stdout, stderr = await proc.communicate()
+                    if proc.returncode != 0:
+                        raise ValueError(f"Pip install failed. {stdout.decode()}, {stderr.decode()}")
+                (self.root / _TEMPLATE_MARKER).write_text(json.dumps(self._description()))
+            except BaseException:
+                await asyncio.to_thread(shutil.rmtree, self.root, True)
+                raise
+        logger.info(
+            f"Built venv template with {self.base_packages} in {time.monotonic() - start_time:.1f} seconds"
+        )
+
+    def _build_lock(self) -> IO[str]:
+        """Open and lock the template's lock file, so processes sharing the template build it one at a time"""
+        self.root.parent.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.root.with_name(f"{self.root.name}.lock"), "w")
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    @staticmethod
+    def _create(env_dir: Path) -> SimpleNamespace:
+        builder = venv.EnvBuilder(with_pip=True, symlinks=os.name != "nt")
+        builder.create(env_dir)
+        return builder.ensure_directories(env_dir)
+
+    async def clone(self, env_dir: Path) -> SimpleNamespace:
+        """Create a virtual environment at `env_dir` from the template and return its context"""
+        await self.ensure()
+        return await asyncio.to_thread(self._clone, env_dir)
+
+    def _clone(self, env_dir: Path) -> SimpleNamespace:
+        shutil.rmtree(env_dir, ignore_errors=True)
+        shutil.copytree(
+            self.root,
+            env_dir,
+            symlinks=True,
+            copy_function=_link_or_copy,
+            ignore=shutil.ignore_patterns(_TEMPLATE_MARKER),
+        )
+        # Resolves the executable and script paths of the clone, the directories already exist
+        context = venv.EnvBuilder(with_pip=True).ensure_directories(env_dir)
+        self._relocate_scripts(Path(context.bin_path), self.root.resolve(), env_dir.resolve())
+        if not self._clone_verified:
+            self._verify_clone(Path(context.bin_path))
+            self._clone_verified = True
+        return context
+
+    @staticmethod
+    def _relocate_scripts(bin_dir: Path, template_dir: Path, env_dir: Path) -> None:
+        """Point the clone's console scripts and activation scripts at the clone instead of the template.
+
+        Their shebangs and VIRTUAL_ENV name the template, whose interpreter would install packages into
+        the template. Files are replaced rather than modified, they are hardlinks to the template's.
+        """
+        old, new = os.fsencode(template_dir), os.fsencode(env_dir)
+        for script in bin_dir.iterdir():
+            if script.is_symlink() or not script.is_file():
+                continue
+            content = script.read_bytes()
+            if old not in content:
+                continue
+            mode = script.stat().st_mode
+            script.unlink()
+            script.write_bytes(content.replace(old, new))
+            script.chmod(mode)
+
+    @staticmethod
+    def _verify_clone(bin_dir: Path) -> None:
+        """Check once that a clone's pip runs, so a broken template falls back to creating environments"""
+        pip = bin_dir / ("pip.exe" if os.name == "nt" else "pip")
+        result = subprocess.run([str(pip), "--version"], capture_output=True, text=True)
+        if result.returncode != 0:
+            raise ValueError(f"The cloned environment's pip does not run: {result.stderr}")
+
+    async def remove_clone(self, env_dir: Optional[Path]) -> None:
+        if env_dir is not None:
+            await asyncio.to_thread(shutil.rmtree, env_dir, True)
@@ -1,4 +1,7 @@
 from .abstract_markdown_browser import AbstractMarkdownBrowser
+from .async_requests_markdown_browser import AsyncRequestsMarkdownBrowser
+from .document_cache import DocumentCache
+from .http_cache import CachedPage, HttpCache
 from .markdown_search import AbstractMarkdownSearch, BingMarkdownSearch
 
 # TODO: Fix mdconvert
@@ -13,6 +16,10 @@ from .requests_markdown_browser import RequestsMarkdownBrowser
 __all__ = (
     "AbstractMarkdownBrowser",
     "RequestsMarkdownBrowser",
+    "AsyncRequestsMarkdownBrowser",
+    "HttpCache",
+    "CachedPage",
+    "DocumentCache",
     "AbstractMarkdownSearch",
     "BingMarkdownSearch",
     "MarkdownConverter",
@@ -0,0 +1,294 @@
+import asyncio
+import io
+import os
+import pathlib
+import time
+import traceback
+from concurrent.futures import Executor
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar, Union
+from urllib.parse import unquote, urljoin
+
+import httpx
+
+from .http_cache import HttpCache
+from .markdown_search import AbstractMarkdownSearch, BingMarkdownSearch
+from .requests_markdown_browser import RequestsMarkdownBrowser, ViewportPages
+
+# TODO: Fix unfollowed import
+from .mdconvert import FileConversionException, MarkdownConverter, UnsupportedFormatException  # type: ignore
+
+T = TypeVar("T")
+
+class AsyncRequestsMarkdownBrowser(RequestsMarkdownBrowser):
+    """
+    (In preview) A RequestsMarkdownBrowser that does not block the event loop.
+    Pages are fetched with a pooled httpx.AsyncClient, and the Markdown conversion, local file reads and web searches
+    run in a worker pool, so a slow page only holds up the task that requested it.
+
+    `set_address`, `visit_page` and `open_local_file` are coroutines. Paging and searching within the current page
+    work as in RequestsMarkdownBrowser. The constructor cannot await, so the start page is recorded in the history
+    but left blank, visit it with `visit_page` to fetch it.
+    """
+
+    def __init__(  # type: ignore
+        self,
+        start_page: Union[str, None] = None,
+        viewport_size: Union[int, None] = 1024 * 8,
+        downloads_folder: Union[str, None] = None,
+        search_engine: Union[AbstractMarkdownSearch, None] = None,
+        markdown_converter: Union[MarkdownConverter, None] = None,
+        http_client: Union[httpx.AsyncClient, None] = None,
+        http_get_kwargs: Union[Dict[str, Any], None] = None,
+        conversion_executor: Union[Executor, None] = None,
+        http_cache: Union[HttpCache, None] = None,
+    ):
+        """
+        Instantiate a new AsyncRequestsMarkdownBrowser.
+
+        Arguments:
+            start_page, viewport_size, downloads_folder, search_engine, markdown_converter: As in RequestsMarkdownBrowser.
+            http_client: The client from which to issue requests, shared to reuse its connections (default: a new `httpx.AsyncClient` following redirects)
+            http_get_kwargs: Extra parameters passed to every request made with the client.
+            conversion_executor: The worker pool running conversions, searches and file system calls (default: the event loop's default executor)
+            http_cache: As in RequestsMarkdownBrowser, its disk I/O runs in the worker pool.
+        """
+        self.start_page: str = start_page if start_page else "about:blank"
+        self.viewport_size = viewport_size  # Applies only to the standard uri types
+        self.downloads_folder = downloads_folder
+        self.history: List[Tuple[str, float]] = [(self.start_page, time.time())]
+        self.page_title: Optional[str] = None
+        self.viewport_current_page = 0
+        self.viewport_pages = ViewportPages("", viewport_size)
+        self._set_page_content("")
+
+        if search_engine is None:
+            self._search_engine: AbstractMarkdownSearch = BingMarkdownSearch()
+        else:
+            self._search_engine = search_engine
+
+        if markdown_converter is None:
+            self._markdown_converter = MarkdownConverter()
+        else:
+            self._markdown_converter = markdown_converter
+
+        if http_client is None:
+            self._http_client = httpx.AsyncClient(follow_redirects=True)
+        else:
+            self._http_client = http_client
+
+        if http_get_kwargs is None:
+            self._http_get_kwargs = {}
+        else:
+            self._http_get_kwargs = http_get_kwargs
+
+        self._conversion_executor = conversion_executor
+        self._http_cache = http_cache
+
+        self._find_on_page_query: Union[str, None] = None
+        self._find_on_page_last_result: Union[int, None] = (
+            None  # Location of the last result
+        )
+
+    async def _run_blocking(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run a blocking call in the worker pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._conversion_executor, partial(func, *args, **kwargs))
+
+    async def set_address(self, uri_or_path: str) -> None:  # type: ignore[override]
+        """Sets the address of the current page, fetching it via the async HTTP client.
+
+        Arguments:
+            uri_or_path: As in RequestsMarkdownBrowser.set_address.
+        """
+        # TODO: Handle anchors
+        self.history.append((uri_or_path, time.time()))
+
+        # Handle special URIs
+        if uri_or_path == "about:blank":
+            self._set_page_content("")
+        elif uri_or_path.startswith("search:"):
+            query = uri_or_path[len("search:") :].strip()
+            results = await self._run_blocking(self._search_engine.search, query)
+            self.page_title = f"{query} - Search"
+            self._set_page_content(results, split_pages=False)
+        else:
+            if (
+                not uri_or_path.startswith("http:")
+                and not uri_or_path.startswith("https:")
+                and not uri_or_path.startswith("file:")
+            ):
+                if len(self.history) > 1:
+                    prior_address = self.history[-2][0]
+                    uri_or_path = urljoin(prior_address, uri_or_path)
+                    # Update the address with the fully-qualified path
+                    self.history[-1] = (uri_or_path, self.history[-1][1])
+            await self._fetch_page(uri_or_path)
+
+        self.viewport_current_page = 0
+        self.find_on_page_query = None
+        self.find_on_page_viewport = None
+
+    async def visit_page(self, path_or_uri: str) -> str:  # type: ignore[override]
+        """Update the address, visit the page, and return the content of the viewport."""
+        await self.set_address(path_or_uri)
+        return self.viewport
+
+    async def open_local_file(self, local_path: str) -> str:  # type: ignore[override]
+        """Convert a local file path to a file:/// URI, update the address, visit the page, and return the contents of the viewport."""
+        full_path = os.path.abspath(os.path.expanduser(local_path))
+        await self.set_address(pathlib.Path(full_path).as_uri())
+        return self.viewport
+
+    async def _fetch_local(self, download_path: str) -> None:
+        if await self._run_blocking(os.path.isdir, download_path):
+            listing = await self._run_blocking(self._fetch_local_dir, download_path)
+            res = await self._run_blocking(
+                self._markdown_converter.convert_stream,
+                io.StringIO(listing),
+                file_extension=".html",
+            )
+            self.page_title = res.title
+            self._set_page_content(
+                res.text_content, split_pages=False
+            )  # Like search results, don't split directory listings
+        else:
+            res = await self._run_blocking(self._markdown_converter.convert_local, download_path)
+            self.page_title = res.title
+            self._set_page_content(res.text_content)
+
+    async def _fetch_page(  # type: ignore[override]
+        self,
+        url: str,
+        client: Optional[httpx.AsyncClient] = None,
+        http_get_kwargs: Union[Dict[str, Any], None] = None,
+    ) -> None:
+        """Fetch a page with the async HTTP client. Then convert it to Markdown in the worker pool, and set `page_content`.
+
+        Arguments:
+            url: The fully-qualified URL to fetch.
+            client: Used to override the client used for this request. If None, use `self._http_client` as usual.
+            http_get_kwargs: Extra arguments passed to `httpx.AsyncClient.stream`.
+        """
+        download_path: str = ""
+        try:
+            if url.startswith("file://"):
+                download_path = os.path.normcase(os.path.normpath(unquote(url[7:])))
+                await self._fetch_local(download_path)
+                return
+
+            if client is None:
+                client = self._http_client
+
+            _get_kwargs: Dict[str, Any] = {}
+            _get_kwargs.update(self._http_get_kwargs)
+            if http_get_kwargs is not None:
+                _get_kwargs.update(http_get_kwargs)
+
+            # A fresh cached copy needs no request, a stale one is revalidated
+            cached = None
+            if self._http_cache is not None:
+                cached = await self._run_blocking(self._http_cache.get, url)
+            if cached is not None:
+                if cached.is_fresh():
+                    self._show_cached_page(cached)
+                    return
+                _get_kwargs["headers"] = {
+                    **_get_kwargs.get("headers", {}),
+                    **cached.conditional_headers(),
+                }
+
+            local_uri: Optional[str] = None
+            async with client.stream("GET", url, **_get_kwargs) as response:
+                if cached is not None and response.status_code == 304:
+                    cached = await self._run_blocking(
+                        self._http_cache.revalidated, cached, response.headers  # type: ignore[union-attr]
+                    )
+                    self._show_cached_page(cached)
+                    return
+
+                if response.is_error:
+                    await self._render_error(response)
+                    return
+
+                content_type = response.headers.get("content-type", "")
+
+                # Text or HTML
+                if "text/" in content_type.lower():
+                    content = await response.aread()
+                    res = await self._run_blocking(
+                        self._markdown_converter.convert_content,
+                        content,
+                        response.headers,
+                        str(response.url),
+                    )
+                    if self._http_cache is not None:
+                        await self._run_blocking(
+                            self._http_cache.put,
+                            url,
+                            response.headers,
+                            content,
+                            res.title,
+                            res.text_content,
+                        )
+                    self.page_title = res.title
+                    self._set_page_content(res.text_content)
+                    return
+
+                # A download. Was a downloads folder configured?
+                if self.downloads_folder is None:
+                    self.page_title = "Error 400"
+                    self._set_page_content(
+                        "## Error 400\n\nClient does not support downloads"
+                    )
+                    return
+
+                download_path = await self._run_blocking(self._download_path, url, content_type)
+                # Written in the worker pool, a slow disk would otherwise stall every task on the loop
+                fh = await self._run_blocking(open, download_path, "wb")
+                try:
+                    async for chunk in response.aiter_bytes(chunk_size=64 * 1024):
+                        await self._run_blocking(fh.write, chunk)
+                finally:
+                    await self._run_blocking(fh.close)
+                local_uri = pathlib.Path(download_path).as_uri()
+
+            # Render it, once the connection is back in the pool
+            await self.set_address(local_uri)
+
+        except UnsupportedFormatException:
+            self.page_title = "Download complete."
+            self._set_page_content(
+                f"# Download complete\n\nSaved file to '{download_path}'"
+            )
+        except FileConversionException:
+            self.page_title = "Download complete."
+            self._set_page_content(
+                f"# Download complete\n\nSaved file to '{download_path}'"
+            )
+        except FileNotFoundError:
+            self.page_title = "Error 404"
+            self._set_page_content(f"## Error 404\n\nFile not found: {download_path}")
+        except httpx.HTTPError:
+            self.page_title = "Request Exception"
+            self._set_page_content(
+                "## Unhandled Request Exception:\n\n" + traceback.format_exc()
+            )
+
+    async def _render_error(self, response: httpx.Response) -> None:
+        """Render an error response, converting it if it is HTML."""
+        content = await response.aread()
+        self.page_title = f"Error {response.status_code}"
+
+        # If the error was rendered in HTML we might as well render it
+        content_type = response.headers.get("content-type", "")
+        if "text/html" in content_type.lower():
+            res = await self._run_blocking(
+                self._markdown_converter.convert_content,
+                content,
+                response.headers,
+                str(response.url),
+            )
+            self._set_page_content(f"## Error {response.status_code}\n\n{res.text_content}")
+        else:
+            self._set_page_content(f"## Error {response.status_code}\n\n{response.text}")
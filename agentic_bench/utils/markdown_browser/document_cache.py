@@ -0,0 +1,165 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from hashlib import sha256
+from importlib import metadata
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+# Bump when the conversion output changes, to stop serving results of the old converters
+DOCUMENT_CACHE_VERSION = "1"
+
+# Libraries whose version changes the conversion output
+_CONVERTER_DISTRIBUTIONS = ("markdownify", "mammoth", "pandas", "pdfminer.six", "python-pptx", "beautifulsoup4")
+
+def converter_version() -> str:
+    """The cache format version and the versions of the conversion libraries."""
+    versions = [DOCUMENT_CACHE_VERSION]
+    for distribution in _CONVERTER_DISTRIBUTIONS:
+        try:
+            versions.append(f"{distribution}=={metadata.version(distribution)}")
+        except metadata.PackageNotFoundError:
+            versions.append(f"{distribution}==none")
+    return ";".join(versions)
+
+class DocumentCache:
+    """
+    A content-addressed cache of document conversions, kept in a local directory.
+
+    Results are keyed on a hash of the file's bytes, the converter version and the conversion options, so reopening a
+    byte-identical file returns the earlier Markdown without running the converters again, whatever its path. The
+    digest of a local file is remembered while its size and modification time are unchanged, so reopening it does not
+    rehash it either. Once the results take more than `max_bytes`, the least recently used ones are evicted.
+
+    The cache does blocking file I/O and is safe to use from several threads.
+
+    Arguments:
+        root: Directory holding the results.
+        max_bytes: Disk space the results may take.
+    """
+
+    def __init__(self, root: Union[Path, str] = Path("./document_cache"), max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._max_bytes = max_bytes
+        self._version = converter_version()
+        self._lock = threading.Lock()
+        # Result key -> size in bytes, least recently used first
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        # (path, size, mtime, inode) -> digest of the file's bytes
+        self._digests: "OrderedDict[Tuple[str, int, int, int], str]" = OrderedDict()
+        self._load()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @classmethod
+    def from_env(cls) -> "DocumentCache":
+        return cls(
+            root=os.getenv("AGENTIC_BENCH_DOCUMENT_CACHE_DIR", "./document_cache"),
+            max_bytes=int(os.getenv("AGENTIC_BENCH_DOCUMENT_CACHE_MAX_BYTES", str(DEFAULT_MAX_BYTES))),
+        )
+
+    def _path(self, key: str) -> Path:
+        return self.root / f"{key}.json"
+
+    def _load(self) -> None:
+        """Index the results left by earlier runs, ordered by last use."""
+        entries = []
+        for path in self.root.glob("*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, path.stem, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def digest(self, local_path: str, remember: bool = False) -> str:
+        """Hash of the file's bytes. With `remember`, reused until the file changes."""
+        stat = os.stat(local_path)
+        identity = (os.path.realpath(local_path), stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        if remember:
+            with self._lock:
+                if identity in self._digests:
+                    self._digests.move_to_end(identity)
+                    return self._digests[identity]
+
+        hasher = sha256()
+        with open(local_path, "rb") as fh:
+            for block in iter(lambda: fh.read(1024 * 1024), b""):
+                hasher.update(block)
+        digest = hasher.hexdigest()
+
+        if remember:
+            with self._lock:
+                self._digests[identity] = digest
+                while len(self._digests) > 4096:
+                    self._digests.popitem(last=False)
+        return digest
+
+    def key(self, digest: str, options: Dict[str, Any]) -> str:
+        content = json.dumps([digest, self._version, options], sort_keys=True, default=repr)
+        return sha256(content.encode("utf-8")).hexdigest()[:32]
+
+    def get(self, key: str) -> Optional[Tuple[Optional[str], str]]:
+        """Return the cached (title, text_content), or None."""
+        path = self._path(key)
+        try:
+            result = json.loads(path.read_text())
+        except (OSError, ValueError):
+            with self._lock:
+                self._misses += 1
+            return None
+        # The file's modification time orders results for eviction across restarts
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self._hits += 1
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return result["title"], result["text_content"]
+
+    def put(self, key: str, title: Optional[str], text_content: str) -> None:
+        path = self._path(key)
+        # Written to a temporary file and renamed, so readers never see a partial result
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_text(json.dumps({"title": title, "text_content": text_content}))
+        os.replace(tmp_path, path)
+        size = path.stat().st_size
+
+        with self._lock:
+            self._total_bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            evicted = []
+            while self._total_bytes > self._max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._total_bytes -= old_size
+                self._evictions += 1
+                evicted.append(old_key)
+        for old_key in evicted:
+            self._path(old_key).unlink(missing_ok=True)
+            logger.info(f"Evicted cached document conversion {old_key}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+            }
@@ -0,0 +1,253 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from email.utils import parsedate_to_datetime
+from hashlib import sha256
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Heuristic freshness for responses with only a Last-Modified date (RFC 9111, 4.2.2)
+_HEURISTIC_FRACTION = 0.1
+_MAX_HEURISTIC_LIFETIME = 24 * 3600
+
+# Headers describing the body, which a 304 response does not replace
+_BODY_HEADERS = {"content-length", "content-encoding", "transfer-encoding", "content-range"}
+
+def parse_cache_control(value: str) -> Dict[str, Optional[str]]:
+    """Parse a Cache-Control header into lowercase directives and their values."""
+    directives: Dict[str, Optional[str]] = {}
+    for part in value.split(","):
+        name, _, argument = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') if argument else None
+    return directives
+
+def _http_date(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+@dataclass
+class CachedPage:
+    """A cached response: its headers, its converted Markdown and where its raw body is stored."""
+
+    url: str
+    headers: Dict[str, str]
+    stored_at: float
+    title: Optional[str]
+    text_content: str
+    body_path: str
+
+    def freshness_lifetime(self) -> float:
+        """Seconds the response may be reused without revalidation, from Cache-Control, Expires or Last-Modified."""
+        directives = parse_cache_control(self.headers.get("cache-control", ""))
+        if "no-cache" in directives:
+            return 0.0
+        if directives.get("max-age"):
+            try:
+                return float(directives["max-age"])
+            except ValueError:
+                return 0.0
+        date = _http_date(self.headers.get("date")) or self.stored_at
+        expires = _http_date(self.headers.get("expires"))
+        if "expires" in self.headers:
+            # An invalid Expires, such as "0", means already expired
+            return max(expires - date, 0.0) if expires is not None else 0.0
+        last_modified = _http_date(self.headers.get("last-modified"))
+        if last_modified is not None:
+            return min(max(date - last_modified, 0.0) * _HEURISTIC_FRACTION, _MAX_HEURISTIC_LIFETIME)
+        return 0.0
+
+    def is_fresh(self, now: Optional[float] = None) -> bool:
+        now = time.time() if now is None else now
+        try:
+            age = float(self.headers.get("age", 0))
+        except ValueError:
+            age = 0.0
+        return age + now - self.stored_at < self.freshness_lifetime()
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """Request headers asking the server to answer 304 if the cached response is still valid."""
+        headers = {}
+        if "etag" in self.headers:
+            headers["If-None-Match"] = self.headers["etag"]
+        if "last-modified" in self.headers:
+            headers["If-Modified-Since"] = self.headers["last-modified"]
+        return headers
+
+class HttpCache:
+    """
+    A disk-backed cache of the pages fetched by the markdown browsers, shared across browsers and tasks.
+
+    Each entry holds the raw response body next to its Markdown conversion, so a fresh entry costs neither a request
+    nor a conversion. Freshness follows Cache-Control, Expires and Last-Modified. A stale entry with an ETag or a
+    Last-Modified date is revalidated with a conditional request, and a 304 answer reuses the stored conversion.
+    Responses marked no-store, or varying on every header, are not cached. Once the entries take more than
+    `max_bytes`, the least recently used ones are evicted.
+
+    The cache does blocking file I/O and is safe to use from several threads.
+
+    Arguments:
+        root: Directory holding the entries.
+        max_bytes: Disk space the entries may take.
+    """
+
+    def __init__(self, root: Union[Path, str] = Path("./http_cache"), max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Entry key -> size in bytes, least recently used first
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._load()
+
+        self._hits = 0
+        self._stale = 0
+        self._revalidations = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @classmethod
+    def from_env(cls) -> "HttpCache":
+        return cls(
+            root=os.getenv("AGENTIC_BENCH_BROWSER_HTTP_CACHE_DIR", "./http_cache"),
+            max_bytes=int(os.getenv("AGENTIC_BENCH_BROWSER_HTTP_CACHE_MAX_BYTES", str(DEFAULT_MAX_BYTES))),
+        )
+
+    @staticmethod
+    def key(url: str) -> str:
+        return sha256(url.encode("utf-8")).hexdigest()[:32]
+
+    def _meta_path(self, key: str) -> Path:
+        return self.root / f"{key}.json"
+
+    def _body_path(self, key: str) -> Path:
+        return self.root / f"{key}.body"
+
+    def _load(self) -> None:
+        """Index the entries left by earlier runs, ordered by last use."""
+        entries = []
+        for meta_path in self.root.glob("*.json"):
+            key = meta_path.stem
+            try:
+                size = meta_path.stat().st_size + self._body_path(key).stat().st_size
+                entries.append((meta_path.stat().st_mtime, key, size))
+            except OSError:
+                continue
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        """Return the cached page for `url`, fresh or not, or None."""
+        key = self.key(url)
+        try:
+            page = CachedPage(**json.loads(self._meta_path(key).read_text()))
+        except (OSError, ValueError, TypeError):
+            with self._lock:
+                self._misses += 1
+            return None
+        # The metadata's modification time orders entries for eviction across restarts
+        try:
+            os.utime(self._meta_path(key))
+        except OSError:
+            pass
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            if page.is_fresh():
+                self._hits += 1
+            else:
+                self._stale += 1
+        return page
+
+    def put(
+        self, url: str, headers: Mapping[str, str], body: bytes, title: Optional[str], text_content: str
+    ) -> Optional[CachedPage]:
+        """Store a successful response with its conversion, returns None if the response may not be cached."""
+        headers = {name.lower(): value for name, value in headers.items()}
+        directives = parse_cache_control(headers.get("cache-control", ""))
+        if "no-store" in directives or headers.get("vary", "").strip() == "*":
+            return None
+
+        key = self.key(url)
+        page = CachedPage(
+            url=url,
+            headers=headers,
+            stored_at=time.time(),
+            title=title,
+            text_content=text_content,
+            body_path=str(self._body_path(key)),
+        )
+        # Without validators or a freshness lifetime the entry could never be reused
+        if not page.conditional_headers() and page.freshness_lifetime() <= 0:
+            return None
+
+        self._write(key, page, body)
+        return page
+
+    def revalidated(self, page: CachedPage, headers: Mapping[str, str]) -> CachedPage:
+        """Update a cached page with the headers of a 304 response and return it."""
+        page.headers.update(
+            {name.lower(): value for name, value in headers.items() if name.lower() not in _BODY_HEADERS}
+        )
+        page.stored_at = time.time()
+        with self._lock:
+            self._revalidations += 1
+        self._write(self.key(page.url), page, None)
+        return page
+
+    def _write(self, key: str, page: CachedPage, body: Optional[bytes]) -> None:
+        # Written to temporary files and renamed, so readers never see a partial entry
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        if body is not None:
+            body_tmp = self._body_path(key).with_name(self._body_path(key).name + suffix)
+            body_tmp.write_bytes(body)
+            os.replace(body_tmp, self._body_path(key))
+        meta_tmp = self._meta_path(key).with_name(self._meta_path(key).name + suffix)
+        meta_tmp.write_text(json.dumps(asdict(page)))
+        os.replace(meta_tmp, self._meta_path(key))
+
+        try:
+            size = self._meta_path(key).stat().st_size + self._body_path(key).stat().st_size
+        except OSError:
+            return
+        with self._lock:
+            self._total_bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            evicted = []
+            while self._total_bytes > self._max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._total_bytes -= old_size
+                self._evictions += 1
+                evicted.append(old_key)
+        for old_key in evicted:
+            self._meta_path(old_key).unlink(missing_ok=True)
+            self._body_path(old_key).unlink(missing_ok=True)
+            logger.info(f"Evicted cached page {old_key}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._stale + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "hits": self._hits,
+                "stale": self._stale,
+                "revalidations": self._revalidations,
+                "misses": self._misses,
+                "hit_rate": (self._hits + self._revalidations) / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+            }
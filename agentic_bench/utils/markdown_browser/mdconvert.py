@@ -11,7 +11,7 @@ import shutil
 import subprocess
 import sys
 import tempfile
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Mapping, Optional, Union
 from urllib.parse import parse_qs, quote, unquote, urlparse, urlunparse
 
 import mammoth
@@ -26,6 +26,8 @@ import puremagic
 import requests
 from bs4 import BeautifulSoup
 
+from .document_cache import DocumentCache
+
 # Optional Transcription support
 try:
     import pydub
@@ -834,6 +836,7 @@ class MarkdownConverter:
         requests_session: Optional[requests.Session] = None,
         mlm_client: Optional[Any] = None,
         mlm_model: Optional[Any] = None,
+        document_cache: Optional[DocumentCache] = None,
     ):
         if requests_session is None:
             self._requests_session = requests.Session()
@@ -842,6 +845,7 @@ class MarkdownConverter:
 
         self._mlm_client = mlm_client
         self._mlm_model = mlm_model
+        self._document_cache = document_cache
 
         self._page_converters: List[DocumentConverter] = []
 
@@ -897,7 +901,7 @@ class MarkdownConverter:
         self._append_ext(extensions, self._guess_ext_magic(path))
 
         # Convert
-        return self._convert(path, extensions, **kwargs)
+        return self._convert(path, extensions, remember_digest=True, **kwargs)
     # TODO what should stream's type be?
     def convert_stream(
         self, stream: Any, **kwargs: Any
@@ -945,24 +949,9 @@ class MarkdownConverter:
     def convert_response(
         self, response: requests.Response, **kwargs: Any
     ) -> DocumentConverterResult:  # TODO fix kwargs type
-        # Prepare a list of extensions to try (in order of priority)
-        ext = kwargs.get("file_extension")
-        extensions = [ext] if ext is not None else []
-
-        # Guess from the mimetype
-        content_type = response.headers.get("content-type", "").split(";")[0]
-        self._append_ext(extensions, mimetypes.guess_extension(content_type))
-
-        # Read the content disposition if there is one
-        content_disposition = response.headers.get("content-disposition", "")
-        m = re.search(r"filename=([^;]+)", content_disposition)
-        if m:
-            base, ext = os.path.splitext(m.group(1).strip("\"'"))
-            self._append_ext(extensions, ext)
-
-        # Read from the extension from the path
-        base, ext = os.path.splitext(urlparse(response.url).path)
-        self._append_ext(extensions, ext)
+        extensions = self._response_extensions(
+            response.headers, response.url, kwargs.get("file_extension")
+        )
 
         # Save the file locally to a temporary file. It will be deleted before this method exits
         handle, temp_path = tempfile.mkstemp()
@@ -989,7 +978,90 @@ class MarkdownConverter:
 
         return result
 
+    def convert_content(
+        self, content: bytes, headers: Mapping[str, str], url: str, **kwargs: Any
+    ) -> DocumentConverterResult:
+        """Convert a response body that was already read, such as one fetched by an async HTTP client."""
+        extensions = self._response_extensions(
+            headers, url, kwargs.get("file_extension")
+        )
+
+        # Save the file locally to a temporary file. It will be deleted before this method exits
+        handle, temp_path = tempfile.mkstemp()
+        try:
+            with os.fdopen(handle, "wb") as fh:
+                fh.write(content)
+
+            # Use puremagic to check for more extension options
+            self._append_ext(extensions, self._guess_ext_magic(temp_path))
+
+            return self._convert(temp_path, extensions, url=url)
+        finally:
+            os.unlink(temp_path)
+
+    def _response_extensions(
+        self, headers: Mapping[str, str], url: str, file_extension: Optional[str]
+    ) -> List[Union[str, None]]:
+        """Extensions to try for a HTTP response, in order of priority."""
+        extensions = [file_extension] if file_extension is not None else []
+
+        # Guess from the mimetype
+        content_type = headers.get("content-type", "").split(";")[0]
+        self._append_ext(extensions, mimetypes.guess_extension(content_type))
+
+        # Read the content disposition if there is one
+        content_disposition = headers.get("content-disposition", "")
+        m = re.search(r"filename=([^;]+)", content_disposition)
+        if m:
+            base, ext = os.path.splitext(m.group(1).strip("\"'"))
+            self._append_ext(extensions, ext)
+
+        # Read from the extension from the path
+        base, ext = os.path.splitext(urlparse(str(url)).path)
+        self._append_ext(extensions, ext)
+        return extensions
+
     def _convert(
+        self,
+        local_path: str,
+        extensions: List[Union[str, None]],
+        remember_digest: bool = False,
+        **kwargs,
+    ) -> DocumentConverterResult:
+        if self._document_cache is None:
+            return self._run_converters(local_path, extensions, **kwargs)
+
+        # Temporary files are rehashed, a later file may reuse their path
+        digest = self._document_cache.digest(local_path, remember=remember_digest)
+        key = self._document_cache.key(digest, self._conversion_options(extensions, kwargs))
+        cached = self._document_cache.get(key)
+        if cached is not None:
+            title, text_content = cached
+            return DocumentConverterResult(title=title, text_content=text_content)
+
+        res = self._run_converters(local_path, extensions, **kwargs)
+        self._document_cache.put(key, res.title, res.text_content)
+        return res
+
+    def _conversion_options(
+        self, extensions: List[Union[str, None]], kwargs: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Everything besides the file's bytes that the conversion result depends on."""
+        # The converters are tried with each of the extensions, replacing any file_extension option
+        options = {
+            name: value
+            for name, value in kwargs.items()
+            if name not in ("mlm_client", "file_extension")
+        }
+        options["extensions"] = extensions
+        options["converters"] = [type(converter).__name__ for converter in self._page_converters]
+        if "mlm_model" not in options and self._mlm_model is not None:
+            options["mlm_model"] = self._mlm_model
+        # Image and audio descriptions depend on whether a model was available
+        options["mlm_client"] = "mlm_client" in kwargs or self._mlm_client is not None
+        return options
+
+    def _run_converters(
         self, local_path: str, extensions: List[Union[str, None]], **kwargs
     ) -> DocumentConverterResult:
         error_trace = ""
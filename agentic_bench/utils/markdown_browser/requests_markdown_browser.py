@@ -1,5 +1,6 @@
 # ruff: noqa: E722
 import datetime
+import functools
 import html
 import io
 import mimetypes
@@ -9,18 +10,139 @@ import re
 import time
 import traceback
 import uuid
-from typing import Any, Dict, List, Optional, Tuple, Union
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 from urllib.parse import unquote, urljoin, urlparse
 
 import pathvalidate
 import requests
 
 from .abstract_markdown_browser import AbstractMarkdownBrowser
+from .http_cache import CachedPage, HttpCache
 from .markdown_search import AbstractMarkdownSearch, BingMarkdownSearch
 
 # TODO: Fix unfollowed import
 from .mdconvert import FileConversionException, MarkdownConverter, UnsupportedFormatException  # type: ignore
 
+# Characters a viewport may end on, so words are not broken
+_PAGE_BREAK = re.compile(r"[ \t\r\n]")
+
+class ViewportPages(Sequence[Tuple[int, int]]):
+    """
+    The (start, end) bounds of the viewports of a page, computed only as far as they are read.
+    Each viewport is at least `viewport_size` characters long, extended up to the next whitespace so words are not
+    broken. The last viewport ends with the content. If `viewport_size` is None, the whole content is one viewport.
+    """
+
+    def __init__(self, content: str, viewport_size: Union[int, None]):
+        self._content = content
+        self._viewport_size = viewport_size
+        self._bounds: List[Tuple[int, int]] = []
+        if len(content) == 0 or viewport_size is None:
+            self._bounds.append((0, len(content)))
+
+    @property
+    def _complete(self) -> bool:
+        return len(self._bounds) > 0 and self._bounds[-1][1] >= len(self._content)
+
+    def _compute(self, count: Union[int, None] = None) -> None:
+        """Compute the bounds of the first `count` viewports, or of all of them."""
+        content = self._content
+        while not self._complete and (count is None or len(self._bounds) < count):
+            start_idx = self._bounds[-1][1] if self._bounds else 0
+            end_idx = min(start_idx + self._viewport_size, len(content))  # type: ignore[operator]
+            if end_idx < len(content):
+                # Adjust to end on a space
+                match = _PAGE_BREAK.search(content, end_idx - 1)
+                end_idx = match.end() if match else len(content)
+            self._bounds.append((start_idx, end_idx))
+
+    def has_page(self, index: int) -> bool:
+        """Whether viewport `index` exists, computing no further than it."""
+        if index < 0:
+            return False
+        self._compute(index + 1)
+        return index < len(self._bounds)
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, slice) or index < 0:
+            self._compute()
+        else:
+            self._compute(index + 1)
+        return self._bounds[index]
+
+    def __len__(self) -> int:
+        self._compute()
+        return len(self._bounds)
+
+def _normalize_text(text: str) -> str:
+    """Words of the text, lowercased and separated by single spaces, with a space at either end."""
+    # TODO: Remove markdown links and images
+    return " " + (" ".join(re.split(r"\W+", text))).strip().lower() + " "
+
+@functools.lru_cache(maxsize=64)
+def _query_pattern(query: str) -> Optional["re.Pattern[str]"]:
+    """The regular expression matching the query in normalized text, None if the query has no words."""
+    # Normalize the query, and convert to a regular expression
+    nquery = re.sub(r"\*", "__STAR__", query)
+    nquery = " " + (" ".join(re.split(r"\W+", nquery))).strip() + " "
+    nquery = nquery.replace(
+        " __STAR__ ", "__STAR__ "
+    )  # Merge isolated stars with prior word
+    nquery = nquery.replace("__STAR__", ".*").lower()
+
+    if nquery.strip() == "":
+        return None
+    return re.compile(nquery)
+
+class PageSearchIndex:
+    """
+    The normalized text of every viewport of a page, for find-on-page searches.
+    Viewports are normalized once and joined with newlines, which no query pattern can match, so a match never spans
+    two viewports. A query is run in one pass over the whole page, and the viewports it matches are kept for the
+    following searches of the same query.
+    """
+
+    def __init__(self, content: str, viewport_pages: Sequence[Tuple[int, int]]):
+        parts: List[str] = []
+        # Offset of each viewport's normalized text in `self._text`
+        self._starts: List[int] = []
+        offset = 0
+        for start, end in viewport_pages:
+            normalized = _normalize_text(content[start:end])
+            self._starts.append(offset)
+            parts.append(normalized)
+            offset += len(normalized) + 1
+        self._text = "\n".join(parts)
+        self._matches: Dict[str, List[int]] = {}
+
+    def matching_viewports(self, query: str) -> List[int]:
+        """All viewports matching the query, in order."""
+        if query not in self._matches:
+            pattern = _query_pattern(query)
+            viewports: List[int] = []
+            pos = 0
+            while pattern is not None:
+                match = pattern.search(self._text, pos)
+                if match is None:
+                    break
+                viewport = bisect_right(self._starts, match.start()) - 1
+                viewports.append(viewport)
+                if viewport + 1 >= len(self._starts):
+                    break
+                # Skip the rest of the matched viewport
+                pos = self._starts[viewport + 1]
+            self._matches[query] = viewports
+        return self._matches[query]
+
+    def find(self, query: str, starting_viewport: int) -> Union[int, None]:
+        """The first viewport matching the query from `starting_viewport`, looping back to the start."""
+        viewports = self.matching_viewports(query)
+        if not viewports:
+            return None
+        index = bisect_left(viewports, starting_viewport)
+        return viewports[index] if index < len(viewports) else viewports[0]
+
 class RequestsMarkdownBrowser(AbstractMarkdownBrowser):
     """
     (In preview) An extremely simple Python requests-powered Markdown web browser.
@@ -38,6 +160,7 @@ class RequestsMarkdownBrowser(AbstractMarkdownBrowser):
         markdown_converter: Union[MarkdownConverter, None] = None,
         requests_session: Union[requests.Session, None] = None,
         requests_get_kwargs: Union[Dict[str, Any], None] = None,
+        http_cache: Union[HttpCache, None] = None,
     ):
         """
         Instantiate a new RequestsMarkdownBrowser.
@@ -50,6 +173,7 @@ class RequestsMarkdownBrowser(AbstractMarkdownBrowser):
             markdown_converted: An instance of a MarkdownConverter used to convert HTML pages and downloads to Markdown (default: a new `MarkdownConerter()` with default parameters)
             request_session: The session from which to issue requests (default: a new `requests.Session()` instance with default parameters)
             request_get_kwargs: Extra parameters passed to evert `.get()` call made to requests.
+            http_cache: A cache of fetched pages and their conversions, revalidated with conditional requests. If None, every visit fetches and converts the page. (default: None)
         """
         self.start_page: str = start_page if start_page else "about:blank"
         self.viewport_size = viewport_size  # Applies only to the standard uri types
@@ -57,7 +181,7 @@ class RequestsMarkdownBrowser(AbstractMarkdownBrowser):
         self.history: List[Tuple[str, float]] = list()
         self.page_title: Optional[str] = None
         self.viewport_current_page = 0
-        self.viewport_pages: List[Tuple[int, int]] = list()
+        self.viewport_pages = ViewportPages("", viewport_size)
         self.set_address(self.start_page)
         self._page_content: str = ""
 
@@ -81,6 +205,8 @@ class RequestsMarkdownBrowser(AbstractMarkdownBrowser):
         else:
             self._requests_get_kwargs = requests_get_kwargs
 
+        self._http_cache = http_cache
+
         self._find_on_page_query: Union[str, None] = None
         self._find_on_page_last_result: Union[int, None] = (
             None  # Location of the last result
@@ -140,20 +266,21 @@ class RequestsMarkdownBrowser(AbstractMarkdownBrowser):
     def _set_page_content(self, content: str, split_pages: bool = True) -> None:
         """Sets the text content of the current page."""
         self._page_content = content
+        # Built by the first search of the page
+        self._page_search_index: Optional[PageSearchIndex] = None
 
         if split_pages:
             self._split_pages()
         else:
-            self.viewport_pages = [(0, len(self._page_content))]
+            self.viewport_pages = ViewportPages(self._page_content, None)
 
-        if self.viewport_current_page >= len(self.viewport_pages):
+        if not self.viewport_pages.has_page(self.viewport_current_page):
             self.viewport_current_page = len(self.viewport_pages) - 1
 
     def page_down(self) -> None:
         """Move the viewport down one page, if possible."""
-        self.viewport_current_page = min(
-            self.viewport_current_page + 1, len(self.viewport_pages) - 1
-        )
+        if self.viewport_pages.has_page(self.viewport_current_page + 1):
+            self.viewport_current_page += 1
 
     def page_up(self) -> None:
         """Move the viewport up one page, if possible."""
@@ -214,31 +341,9 @@ class RequestsMarkdownBrowser(AbstractMarkdownBrowser):
         if query is None:
             return None
 
-        # Normalize the query, and convert to a regular expression
-        nquery = re.sub(r"\*", "__STAR__", query)
-        nquery = " " + (" ".join(re.split(r"\W+", nquery))).strip() + " "
-        nquery = nquery.replace(
-            " __STAR__ ", "__STAR__ "
-        )  # Merge isolated stars with prior word
-        nquery = nquery.replace("__STAR__", ".*").lower()
-
-        if nquery.strip() == "":
-            return None
-
-        idxs: List[int] = list()
-        idxs.extend(range(starting_viewport, len(self.viewport_pages)))
-        idxs.extend(range(0, starting_viewport))
-
-        for i in idxs:
-            bounds = self.viewport_pages[i]
-            content = self.page_content[bounds[0] : bounds[1]]
-
-            # TODO: Remove markdown links and images
-            ncontent = " " + (" ".join(re.split(r"\W+", content))).strip().lower() + " "
-            if re.search(nquery, ncontent):
-                return i
-
-        return None
+        if self._page_search_index is None:
+            self._page_search_index = PageSearchIndex(self._page_content, self.viewport_pages)
+        return self._page_search_index.find(query, starting_viewport)
 
     def visit_page(self, path_or_uri: str) -> str:
         """Update the address, visit the page, and return the content of the viewport."""
@@ -252,24 +357,9 @@ class RequestsMarkdownBrowser(AbstractMarkdownBrowser):
         return self.viewport
 
     def _split_pages(self) -> None:
-        """Split the page contents into pages that are approximately the viewport size. Small deviations are permitted to ensure words are not broken."""
-        # Handle empty pages
-        if len(self._page_content) == 0:
-            self.viewport_pages = [(0, 0)]
-            return
-
-        # Break the viewport into pages
-        self.viewport_pages = []
-        start_idx = 0
-        while start_idx < len(self._page_content):
-            end_idx = min(start_idx + self.viewport_size, len(self._page_content))  # type: ignore[operator]
-            # Adjust to end on a space
-            while end_idx < len(self._page_content) and self._page_content[
-                end_idx - 1
-            ] not in [" ", "\t", "\r", "\n"]:
-                end_idx += 1
-            self.viewport_pages.append((start_idx, end_idx))
-            start_idx = end_idx
+        """Split the page contents into pages that are approximately the viewport size. Small deviations are permitted to ensure words are not broken.
+        Pages are computed lazily, as they are read."""
+        self.viewport_pages = ViewportPages(self._page_content, self.viewport_size)
 
     def _fetch_page(
         self,
@@ -313,7 +403,21 @@ class RequestsMarkdownBrowser(AbstractMarkdownBrowser):
                     _get_kwargs.update(requests_get_kwargs)
                 _get_kwargs["stream"] = True
 
+                # A fresh cached copy needs no request, a stale one is revalidated
+                cached = self._http_cache.get(url) if self._http_cache is not None else None
+                if cached is not None:
+                    if cached.is_fresh():
+                        self._show_cached_page(cached)
+                        return
+                    _get_kwargs["headers"] = {
+                        **_get_kwargs.get("headers", {}),
+                        **cached.conditional_headers(),
+                    }
+
                 response = session.get(url, **_get_kwargs)
+                if cached is not None and response.status_code == 304:
+                    self._show_cached_page(self._http_cache.revalidated(cached, response.headers))  # type: ignore[union-attr]
+                    return
                 response.raise_for_status()
 
                 # If the HTTP request was successful
@@ -321,7 +425,16 @@ class RequestsMarkdownBrowser(AbstractMarkdownBrowser):
 
                 # Text or HTML
                 if "text/" in content_type.lower():
-                    res = self._markdown_converter.convert_response(response)
+                    if self._http_cache is None:
+                        res = self._markdown_converter.convert_response(response)
+                    else:
+                        body = response.content
+                        res = self._markdown_converter.convert_content(
+                            body, response.headers, response.url
+                        )
+                        self._http_cache.put(
+                            url, response.headers, body, res.title, res.text_content
+                        )
                     self.page_title = res.title
                     self._set_page_content(res.text_content)
                 # A download
@@ -336,37 +449,7 @@ class RequestsMarkdownBrowser(AbstractMarkdownBrowser):
 
                     assert self.downloads_folder is not None
 
-                    # Try producing a safe filename
-                    fname: str = ""
-                    try:
-                        fname = pathvalidate.sanitize_filename(
-                            os.path.basename(urlparse(url).path)
-                        ).strip()
-                        download_path = os.path.abspath(
-                            os.path.join(self.downloads_folder, fname)
-                        )
-
-                        suffix = 0
-                        while os.path.exists(download_path) and suffix < 1000:
-                            suffix += 1
-                            base, ext = os.path.splitext(fname)
-                            new_fname = f"{base}__{suffix}{ext}"
-                            download_path = os.path.abspath(
-                                os.path.join(self.downloads_folder, new_fname)
-                            )
-
-                    except NameError:
-                        pass
-
-                    # No suitable name, so make one
-                    if fname == "":
-                        extension = mimetypes.guess_extension(content_type)
-                        if extension is None:
-                            extension = ".download"
-                        fname = str(uuid.uuid4()) + extension
-                        download_path = os.path.abspath(
-                            os.path.join(self.downloads_folder, fname)
-                        )
+                    download_path = self._download_path(url, content_type)
 
                     # Open a file for writing
                     with open(download_path, "wb") as fh:
@@ -416,6 +499,46 @@ class RequestsMarkdownBrowser(AbstractMarkdownBrowser):
                     self.page_title = f"Error {response.status_code}"
                     self._set_page_content(f"## Error {response.status_code}\n\n{text}")
 
+    def _show_cached_page(self, page: CachedPage) -> None:
+        """Show a page from the HTTP cache, reusing its stored conversion."""
+        self.page_title = page.title
+        self._set_page_content(page.text_content)
+
+    def _download_path(self, url: str, content_type: str) -> str:
+        """A path in the downloads folder for the file at `url`, not colliding with earlier downloads."""
+        assert self.downloads_folder is not None
+
+        # Try producing a safe filename
+        fname: str = ""
+        download_path: str = ""
+        try:
+            fname = pathvalidate.sanitize_filename(
+                os.path.basename(urlparse(url).path)
+            ).strip()
+            download_path = os.path.abspath(os.path.join(self.downloads_folder, fname))
+
+            suffix = 0
+            while os.path.exists(download_path) and suffix < 1000:
+                suffix += 1
+                base, ext = os.path.splitext(fname)
+                new_fname = f"{base}__{suffix}{ext}"
+                download_path = os.path.abspath(
+                    os.path.join(self.downloads_folder, new_fname)
+                )
+
+        except NameError:
+            pass
+
+        # No suitable name, so make one
+        if fname == "":
+            extension = mimetypes.guess_extension(content_type)
+            if extension is None:
+                extension = ".download"
+            fname = str(uuid.uuid4()) + extension
+            download_path = os.path.abspath(os.path.join(self.downloads_folder, fname))
+
+        return download_path
+
     def _fetch_local_dir(self, local_path: str) -> str:
         """Render a local directory listing in HTML to assist with local file browsing via the "file://" protocol.
         Through rendered in HTML, later parts of the pipeline will convert the listing to Markdown.
@@ -1,16 +1,168 @@
 from pydantic_ai.models.openai import OpenAIModel
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+import asyncio
+import importlib.util
+import logging
 import os
+import threading
+from typing import Callable, Dict, Optional
+import httpx
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def get_client():
-    api_key = os.getenv("AGENTIC_BENCH_MODEL_API_KEY")
-    base_url = os.getenv("AGENTIC_BENCH_MODEL_BASE_URL")
+logger = logging.getLogger(__name__)
 
-    client = AsyncOpenAI(api_key=api_key, 
-                         base_url=base_url,
-                         max_retries=3,
-                         timeout=10000)
-    return client
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body stream that frees its concurrency slot once the body is closed"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+class _HostConcurrencyLimitedTransport(httpx.AsyncBaseTransport):
+    """Caps the number of in-flight requests per host.
+
+    A request holds its slot until its response body has been closed, so
+    streamed completions count against the limit for their whole duration.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, max_concurrency_per_host: int):
+        self._transport = transport
+        self._max_concurrency_per_host = max_concurrency_per_host
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        semaphore = self._semaphores.get(request.url.host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self._max_concurrency_per_host)
+            self._semaphores[request.url.host] = semaphore
+
+        await semaphore.acquire()
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                semaphore.release()
+
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+        response.stream = _ReleasingStream(response.stream, release)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+class ModelClientManager:
+    """Owns the process-wide AsyncOpenAI client and its pooled HTTP connections.
+
+    Every agent shares the same client, so connections (and their TLS sessions)
+    are kept alive and reused across tasks instead of being re-established per task.
+
+    Args:
+        api_key: API key of the model endpoint.
+        base_url: Base URL of the model endpoint.
+        max_connections: Maximum number of open connections in the pool.
+        max_keepalive_connections: Maximum number of idle connections kept alive.
+        keepalive_expiry: Seconds an idle connection is kept alive.
+        max_concurrency_per_host: Maximum number of in-flight requests per host. 0 disables the limit.
+        http2: Use HTTP/2 when the `h2` package is installed.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        max_concurrency_per_host: int = 32,
+        http2: bool = True,
+    ):
+        self._api_key = api_key
+        self._base_url = base_url
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._max_concurrency_per_host = max_concurrency_per_host
+        self._http2 = http2
+        self._client: Optional[AsyncOpenAI] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ModelClientManager":
+        return cls(
+            api_key=os.getenv("AGENTIC_BENCH_MODEL_API_KEY"),
+            base_url=os.getenv("AGENTIC_BENCH_MODEL_BASE_URL"),
+            max_connections=int(os.getenv("AGENTIC_BENCH_MODEL_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("AGENTIC_BENCH_MODEL_MAX_KEEPALIVE_CONNECTIONS", "20")),
+            keepalive_expiry=float(os.getenv("AGENTIC_BENCH_MODEL_KEEPALIVE_EXPIRY", "30")),
+            max_concurrency_per_host=int(os.getenv("AGENTIC_BENCH_MODEL_MAX_CONCURRENCY_PER_HOST", "32")),
+            http2=os.getenv("AGENTIC_BENCH_MODEL_HTTP2", "true").lower() == "true",
+        )
+
+    def _build_http_client(self) -> httpx.AsyncClient:
+        http2 = self._http2
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("HTTP/2 requested for the model client but the 'h2' package is not installed. Falling back to HTTP/1.1.")
+            http2 = False
+
+        transport: httpx.AsyncBaseTransport = httpx.AsyncHTTPTransport(
+            http2=http2, limits=self._limits
+        )
+        if self._max_concurrency_per_host > 0:
+            transport = _HostConcurrencyLimitedTransport(transport, self._max_concurrency_per_host)
+        return DefaultAsyncHttpxClient(transport=transport)
+
+    def get_client(self) -> AsyncOpenAI:
+        """Return the shared client, creating it on first use"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = AsyncOpenAI(api_key=self._api_key,
+                                               base_url=self._base_url,
+                                               max_retries=3,
+                                               timeout=10000,
+                                               http_client=self._build_http_client())
+        return self._client
+
+    async def aclose(self) -> None:
+        """Close the shared client and its connection pool"""
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            await client.close()
+
+_client_manager: Optional[ModelClientManager] = None
+_client_manager_lock = threading.Lock()
+
+def get_client_manager() -> ModelClientManager:
+    global _client_manager
+    if _client_manager is None:
+        with _client_manager_lock:
+            if _client_manager is None:
+                _client_manager = ModelClientManager.from_env()
+    return _client_manager
+
+def get_client() -> AsyncOpenAI:
+    return get_client_manager().get_client()
+
+async def close_client() -> None:
+    await get_client_manager().aclose()
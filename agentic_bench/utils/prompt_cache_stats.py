@@ -0,0 +1,42 @@
+import threading
+from dataclasses import asdict, dataclass
+from typing import Dict
+
+from pydantic_ai.result import Usage
+
+@dataclass
+class PromptCacheCounters:
+    runs: int = 0
+    requests: int = 0
+    hits: int = 0
+    misses: int = 0
+    input_tokens: int = 0
+    cached_input_tokens: int = 0
+
+class PromptCacheStats:
+    """Prompt cache hit/miss counters per agent.
+
+    A run counts as a hit when the provider served part of its input from its
+    prompt cache, as reported in the `cached_tokens` usage detail.
+    """
+
+    def __init__(self):
+        self._counters: Dict[str, PromptCacheCounters] = {}
+        self._lock = threading.Lock()
+
+    def record(self, agent_name: str, usage: Usage) -> None:
+        cached_tokens = (usage.details or {}).get("cached_tokens", 0)
+        with self._lock:
+            counters = self._counters.setdefault(agent_name, PromptCacheCounters())
+            counters.runs += 1
+            counters.requests += usage.requests
+            counters.input_tokens += usage.request_tokens or 0
+            counters.cached_input_tokens += cached_tokens
+            if cached_tokens > 0:
+                counters.hits += 1
+            else:
+                counters.misses += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {name: asdict(counters) for name, counters in self._counters.items()}
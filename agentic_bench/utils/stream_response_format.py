@@ -1,5 +1,21 @@
-from dataclasses import dataclass
-from typing import List
+import json
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+from fastapi import WebSocket
+
+# Version of the delta streaming protocol. Every message sent over the
+# websocket carries it, along with the stream it belongs to and a per-stream
+# sequence number (and the task id when the connection runs several tasks):
+#   snapshot     - the full StreamResponse ("data"); sent first and, with
+#                  "final": true, once the stream is complete
+#   append_step  - steps appended since the last message, starting at "index"
+#   update       - scalar fields that changed since the last message
+#   output_chunk - raw "stdout" or "stderr" "text" of running code, streamed
+#                  as it is produced; not part of the snapshot
+STREAM_PROTOCOL_VERSION = 1
+
+_SCALAR_FIELDS = ("agent_name", "instructions", "status_code", "output")
 
 @dataclass
 class StreamResponse:
@@ -8,3 +24,72 @@ class StreamResponse:
     steps: List[str]
     status_code: int
     output: str
+
+    def __post_init__(self) -> None:
+        # Protocol bookkeeping is kept off the dataclass fields so asdict() stays unchanged
+        self.stream_id: str = uuid.uuid4().hex
+        self._seq: int = 0
+        self._sent_steps: int = 0
+        self._sent_fields: Optional[Dict[str, Any]] = None
+
+    def _message(self, event: str, **payload: Any) -> Dict[str, Any]:
+        message = {
+            "protocol": STREAM_PROTOCOL_VERSION,
+            "event": event,
+            "stream_id": self.stream_id,
+            "seq": self._seq,
+            **payload,
+        }
+        self._seq += 1
+        return message
+
+    def pending_messages(self, final: bool = False) -> List[Dict[str, Any]]:
+        """Return the protocol messages describing changes since the last call"""
+        if final or self._sent_fields is None or len(self.steps) < self._sent_steps:
+            messages = [self._message("snapshot", data=asdict(self), final=final)]
+        else:
+            messages = []
+            new_steps = self.steps[self._sent_steps:]
+            if new_steps:
+                messages.append(
+                    self._message("append_step", index=self._sent_steps, steps=new_steps)
+                )
+            changed = {
+                name: getattr(self, name)
+                for name in _SCALAR_FIELDS
+                if getattr(self, name) != self._sent_fields[name]
+            }
+            if changed:
+                messages.append(self._message("update", fields=changed))
+
+        self._sent_steps = len(self.steps)
+        self._sent_fields = {name: getattr(self, name) for name in _SCALAR_FIELDS}
+        return messages
+
+    async def send(self, websocket: Optional[WebSocket], final: bool = False) -> None:
+        """Send what changed since the last send, or a full snapshot if `final` is set"""
+        if websocket is None:
+            return
+        # Connections running several tasks hand each task a channel carrying its id
+        task_id = getattr(websocket, "task_id", None)
+        for message in self.pending_messages(final):
+            if task_id is not None:
+                message["task_id"] = task_id
+            await websocket.send_text(json.dumps(message))
+
+    async def send_output_chunk(self, websocket: Optional[WebSocket], stream: str, text: str) -> None:
+        """Stream a chunk of the output of running code"""
+        if websocket is None or not text:
+            return
+        # Pending step and field changes go first so the chunk lands after them
+        await self.send(websocket)
+        message = self._message("output_chunk", stream=stream, text=text)
+        task_id = getattr(websocket, "task_id", None)
+        if task_id is not None:
+            message["task_id"] = task_id
+        await websocket.send_text(json.dumps(message))
+
+    async def add_step(self, websocket: Optional[WebSocket], step: str) -> None:
+        """Append a step and stream it"""
+        self.steps.append(step)
+        await self.send(websocket)
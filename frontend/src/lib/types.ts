@@ -1,4 +1,5 @@
 export interface SystemMessage {
+  stream_id?: string;
   agent_name: string;
   instructions: string;
   steps: string[];
@@ -6,6 +7,34 @@ export interface SystemMessage {
   status_code: number;
 }
 
+// Delta streaming protocol, see agentic_bench/utils/stream_response_format.py
+interface StreamEventBase {
+  protocol: number;
+  stream_id: string;
+  seq: number;
+}
+
+export type StreamEvent =
+  | (StreamEventBase & {
+      event: "snapshot";
+      data: SystemMessage;
+      final: boolean;
+    })
+  | (StreamEventBase & {
+      event: "append_step";
+      index: number;
+      steps: string[];
+    })
+  | (StreamEventBase & {
+      event: "update";
+      fields: Partial<SystemMessage>;
+    })
+  | (StreamEventBase & {
+      event: "output_chunk";
+      stream: "stdout" | "stderr";
+      text: string;
+    });
+
 export interface Message {
   role: string;
   prompt?: string;
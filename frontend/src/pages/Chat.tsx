@@ -3,7 +3,7 @@ import {PromptInput} from "@/components/customUI/PromptInput";
 import {TerminalBlock} from "@/components/customUI/TerminalBlock";
 import {Card} from "@/components/ui/card";
 import {ScrollArea} from "@/components/ui/scroll-area";
-import {Message, SystemMessage} from "@/lib/types";
+import {Message, StreamEvent, SystemMessage} from "@/lib/types";
 import {BrainElectricity, Pin, User} from "iconoir-react";
 import {useEffect, useRef, useState} from "react";
 
@@ -40,6 +40,41 @@ const OrchestratorHeader = () => {
   );
 };
 
+// Apply one streaming protocol event to the agent streams of a system message.
+// Returns the updated stream, or undefined if the event refers to an unknown stream.
+const applyStreamEvent = (
+  data: SystemMessage[],
+  event: StreamEvent
+): SystemMessage | undefined => {
+  const index = data.findIndex((item) => item.stream_id === event.stream_id);
+
+  if (event.event === "snapshot") {
+    const snapshot = {...event.data, stream_id: event.stream_id};
+    if (index === -1) {
+      data.push(snapshot);
+    } else {
+      data[index] = snapshot;
+    }
+    return snapshot;
+  }
+
+  if (index === -1) return undefined;
+
+  if (event.event === "append_step") {
+    const steps = [...data[index].steps];
+    event.steps.forEach((step, i) => {
+      steps[event.index + i] = step;
+    });
+    data[index] = {...data[index], steps};
+  } else if (event.event === "update") {
+    data[index] = {...data[index], ...event.fields};
+  } else if (event.event === "output_chunk") {
+    // Live output of running code, replaced by the final output once the stream completes
+    data[index] = {...data[index], output: data[index].output + event.text};
+  }
+  return data[index];
+};
+
 export const Chat = ({
   messages,
   setMessages,
@@ -79,7 +114,7 @@ export const Chat = ({
 
   useEffect(() => {
     // call this function when the data is received from the API. It will stream the data to the chat UI
-    // const handleDataReceivedFromAPI = (item: SystemMessage) => {
+    // Each message is a delta of one agent's stream, applied to the latest system message
 
     setMessages((prev) => {
       console.log(lastJsonMessage);
@@ -89,37 +124,21 @@ export const Chat = ({
         setLoading(true);
 
         const lastMessageData = lastMessage.data || [];
-        const {agent_name, instructions, steps, output, status_code} =
-          lastJsonMessage as SystemMessage;
-        // find the agent name in the last message data and update the fields
-        const agentIndex = lastMessageData.findIndex(
-          (agent) => agent.agent_name === agent_name
+        const updated = applyStreamEvent(
+          lastMessageData,
+          lastJsonMessage as StreamEvent
         );
-        if (agentIndex !== -1) {
-          lastMessageData[agentIndex] = {
-            agent_name,
-            instructions,
-            steps,
-            output,
-            status_code,
-          };
-        } else {
-          lastMessageData.push({
-            agent_name,
-            instructions,
-            steps,
-            output,
-            status_code,
-          });
-        }
+        lastMessage.data = lastMessageData;
 
-        if (agent_name === "Orchestrator" && output.length > 0) {
+        if (
+          updated?.agent_name === "Orchestrator" &&
+          updated.output.length > 0
+        ) {
           setLoading(false);
         }
       }
       return [...prev];
     });
-    // };
   }, [lastJsonMessage, setMessages]);
 
   const addUserChat = () => {